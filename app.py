@@ -3,25 +3,32 @@ Main application script.
 """
 
 import base64
-import io
+import re
 
 # 3rd-party
-import json
 from datetime import date
+from functools import lru_cache
 
 import dash
 import dash_bootstrap_components as dbc
 import dash_core_components as dcc
 import dash_html_components as html
 import numpy as np
-import pandas as pd
-import plotly.graph_objs as go
 from dash.dependencies import ALL, Input, Output, State
-from plotly.subplots import make_subplots
-from scipy.integrate import solve_ivp
+from dash.exceptions import PreventUpdate
 
 # Local Library
-import sample
+from seiqhcdro import observed, responses
+from seiqhcdro.api import api
+from seiqhcdro.batch import TrajectoryCache
+from seiqhcdro.downsample import lttb, visible
+from seiqhcdro.presets import WARM, get_registry
+from seiqhcdro.profiling import Stages, profiled
+from seiqhcdro.scenario import Scenario
+from seiqhcdro.simulate import SolveCache, simulate
+
+# pandas, plotly and scipy are only needed once a callback runs, so they are
+# imported there to keep worker boot fast.
 
 # Header
 external_stylesheets = [
@@ -33,9 +40,33 @@ app = dash.Dash(
     external_stylesheets=external_stylesheets,
     title="COVID-19 Modelling with SEIQHCDRO",
     suppress_callback_exceptions=True,
+    # Compression is done by the response layer below
+    compress=False,
 )
 server = app.server
 
+# Recent solutions, so that stage edits only re-solve from the changed stage
+solve_cache = SolveCache()
+overlay_cache = TrajectoryCache()
+
+# Preset regions, solved in the background so that picking one is a lookup
+presets = get_registry()
+if WARM:
+    presets.warm()
+
+# Points drawn inside a zoomed-in window, on top of the daily samples
+ZOOM_POINTS = 500
+
+# Most points drawn per trace, about the width of a plot in pixels
+PLOT_POINTS = 800
+
+# JSON API, then the response layer: compress responses, keep static files in
+# browser caches, and answer repeated plotting requests from a cache
+server.register_blueprint(api)
+response_cache = responses.install(
+    server, cached=("overall-plot.figure", "page-content.children")
+)
+
 # Some frequently used CSS across different HTML elements
 styles = {"pre": {"border": "thin lightgrey solid", "overflowX": "scroll"}}
 
@@ -117,265 +148,258 @@ app.layout = html.Div(
     ]
 )
 
+
 # About page
-about_page = html.Div(
-    [
-        dcc.Markdown(
-            """
-                        #### SEIQHCDRO COVID-19 <br> INTERACTIVE MODELLING TOOL
-                        
-                        # Introduction
-                        
-                        In the past outbreaks, Vietnam has successfully controlled the COVID-19 pandemic by simultaneously applying numerous strategies,
-                        including aggressive contact tracing, mandatory quarantine, routine testing, etc. To quantify the effectiveness of these measures,
-                        we developed a multi-compartment model that integrates all of these practices to estimate impacts of possible mitigation scenarios
-                        on the COVID-19 outbreak. To do that, we extended the traditional SEIR model into a 9-compartment model SEIQHCDRO with 
-                        S (Susceptible), E (Exposed), I (Infected), Q (Quarantined), H (Hospitalized), C (Critical), D (Death), R (Recovered) 
-                        and O (Other - Recovered). 
-                        
-                        Moreover, in order to turn our research 
-                        into an open-source project so that everyone can have access to, while creating a tool so that policy makers/public health specialists have a
-                        tool to facilitate their policy advocate/policy making process, we decided to create this tool, alongside with publicizing all associated
-                        source code.
-                        
-                        # Formation of the model 
-                        
-                        ## Model Flowchart
-                        
-                        As an multi-compartment epidemiological model, there must exist specific relations between each and every single compartment. 
-                        Such relations are expressed though the model flowchart below
-                        
-                        
-                        """,
-            dangerously_allow_html=True,
-        ),
-        html.Div(
-            [
-                html.Img(
-                    src="https://drive.google.com/uc?export=view&id=1nb9DFzmOBdlbp8eSaMUsKA45owrYauf_",
-                    style={"width": "50%", "fill": "#000"},
-                )
-            ],
-            style={"width": "100%", "text-align": "center"},
-        ),
-        dcc.Markdown(
-            """
-                        ## Formula
-    
-                        From this, we develop a system of differential equations to simulate the relationship between these compartments. The system reads:
-                        """
-        ),
-        html.Div(
-            [
-                html.Img(
-                    src="https://drive.google.com/uc?export=view&id=1I6YFfapQGGgh7Cdq_AST_fmCWVaGWTZk",
-                    style={"width": "40%", "fill": "#000"},
-                )
-            ],
-            style={"width": "100%", "text-align": "center"},
-        ),
-        dcc.Markdown(
-            """
-                 with two main types of hyper-parameters
-                 * Proportion-related hyper-parameters `p`;
-                 * Time interval related hyperparameters `T`.
+@lru_cache(maxsize=None)
+def about_page():
+    r"""
+    Build the about page, once per process and only when first requested.
 
-                 To obtain the result, this system of ordinary differential equations (ODEs) will be solved using the `solve_ivp` command within the `SciPy` package
-                 in Python. To prevent any stiffness of the system, the `Radau` method, i.e the implicit Runge-Kutta method of the Radau IIA family of order 5.
+    Returns
+    -------
+    page : `dash_html_components.Div`
+        A Div of HTML Elements for the about page.
+    """
+    return html.Div(
+        [
+            dcc.Markdown(
+                """
+                            #### SEIQHCDRO COVID-19 <br> INTERACTIVE MODELLING TOOL
+                            
+                            # Introduction
+                            
+                            In the past outbreaks, Vietnam has successfully controlled the COVID-19 pandemic by simultaneously applying numerous strategies,
+                            including aggressive contact tracing, mandatory quarantine, routine testing, etc. To quantify the effectiveness of these measures,
+                            we developed a multi-compartment model that integrates all of these practices to estimate impacts of possible mitigation scenarios
+                            on the COVID-19 outbreak. To do that, we extended the traditional SEIR model into a 9-compartment model SEIQHCDRO with 
+                            S (Susceptible), E (Exposed), I (Infected), Q (Quarantined), H (Hospitalized), C (Critical), D (Death), R (Recovered) 
+                            and O (Other - Recovered). 
+                            
+                            Moreover, in order to turn our research 
+                            into an open-source project so that everyone can have access to, while creating a tool so that policy makers/public health specialists have a
+                            tool to facilitate their policy advocate/policy making process, we decided to create this tool, alongside with publicizing all associated
+                            source code.
+                            
+                            # Formation of the model 
+                            
+                            ## Model Flowchart
+                            
+                            As an multi-compartment epidemiological model, there must exist specific relations between each and every single compartment. 
+                            Such relations are expressed though the model flowchart below
+                            
+                            
+                            """,
+                dangerously_allow_html=True,
+            ),
+            html.Div(
+                [
+                    html.Img(
+                        src="https://drive.google.com/uc?export=view&id=1nb9DFzmOBdlbp8eSaMUsKA45owrYauf_",
+                        style={"width": "50%", "fill": "#000"},
+                    )
+                ],
+                style={"width": "100%", "text-align": "center"},
+            ),
+            dcc.Markdown("""
+                            ## Formula
+        
+                            From this, we develop a system of differential equations to simulate the relationship between these compartments. The system reads:
+                            """),
+            html.Div(
+                [
+                    html.Img(
+                        src="https://drive.google.com/uc?export=view&id=1I6YFfapQGGgh7Cdq_AST_fmCWVaGWTZk",
+                        style={"width": "40%", "fill": "#000"},
+                    )
+                ],
+                style={"width": "100%", "text-align": "center"},
+            ),
+            dcc.Markdown("""
+                     with two main types of hyper-parameters
+                     * Proportion-related hyper-parameters `p`;
+                     * Time interval related hyperparameters `T`.
 
-                 ## Formulation of the basic reproduction number `R_0`
+                     To obtain the result, this system of ordinary differential equations (ODEs) will be solved using the `solve_ivp` command within the `SciPy` package
+                     in Python. To prevent any stiffness of the system, the `Radau` method, i.e the implicit Runge-Kutta method of the Radau IIA family of order 5.
 
-                 One of the most important aspects of this model is the ability to capture different levels of social distancing/lockdown to the spread
-                 of the disease. As such, we have integrated these impacts onto the function representing the effective reproduction number `R_t` (i.e the basic reproduction
-                 number `R_0` with respect to time).
-                 """
-        ),
-        html.Div(
-            [
-                html.Img(
-                    src="https://drive.google.com/uc?export=view&id=1r76mV3WO22H-Xm5wT_uDU4lHMpaKQxJh",
-                    style={"width": "15%", "fill": "#000"},
-                )
-            ],
-            style={"width": "100%", "text-align": "center"},
-        ),
-        dcc.Markdown(
-            """
-                 Assume that there exists two consecutive time intervals separated by a policy scheme change at time `T`. Before time `T`, the population
-                 inherits a scheme with change of the basic reproduction number `delta R_0`, contact rate reduction `p_cont` and contact rate reduction due
-                 to journalism `p_jrnl`. After time `T`, the population now inherits a new scheme with a new set of parameters, `delta R'_0`, `p'_cont` and 
-                 `p'_jrnl`, respectively.
+                     ## Formulation of the basic reproduction number `R_0`
 
-                 There are two cases that would happen:
+                     One of the most important aspects of this model is the ability to capture different levels of social distancing/lockdown to the spread
+                     of the disease. As such, we have integrated these impacts onto the function representing the effective reproduction number `R_t` (i.e the basic reproduction
+                     number `R_0` with respect to time).
+                     """),
+            html.Div(
+                [
+                    html.Img(
+                        src="https://drive.google.com/uc?export=view&id=1r76mV3WO22H-Xm5wT_uDU4lHMpaKQxJh",
+                        style={"width": "15%", "fill": "#000"},
+                    )
+                ],
+                style={"width": "100%", "text-align": "center"},
+            ),
+            dcc.Markdown("""
+                     Assume that there exists two consecutive time intervals separated by a policy scheme change at time `T`. Before time `T`, the population
+                     inherits a scheme with change of the basic reproduction number `delta R_0`, contact rate reduction `p_cont` and contact rate reduction due
+                     to journalism `p_jrnl`. After time `T`, the population now inherits a new scheme with a new set of parameters, `delta R'_0`, `p'_cont` and 
+                     `p'_jrnl`, respectively.
 
-                 * When `p'_cont >= p_cont` (i.e. the social distancing/lockdown measure tightens), the new function is:
-                 """
-        ),
-        html.Div(
-            [
-                html.Img(
-                    src="https://drive.google.com/uc?export=view&id=1PyMewJ3MVu30Ot5Qg-EvqmTm6GqtGLE9",
-                    style={"width": "40%", "fill": "#000"},
-                )
-            ],
-            style={"width": "100%", "text-align": "center"},
-        ),
-        dcc.Markdown(
-            """
-                 * When `p'_cont < p_cont` (i.e. the social distancing/lockdown measure loosens), the function now becomes:
-                 """
-        ),
-        html.Div(
-            [
-                html.Img(
-                    src="https://drive.google.com/uc?export=view&id=1IBcmRAffnW26DYXZtCqby9U-w0qpn9eF",
-                    style={"width": "40%", "fill": "#000"},
-                )
-            ],
-            style={"width": "100%", "text-align": "center"},
-        ),
-        dcc.Markdown(
-            """
-                        # Tool features
+                     There are two cases that would happen:
+
+                     * When `p'_cont >= p_cont` (i.e. the social distancing/lockdown measure tightens), the new function is:
+                     """),
+            html.Div(
+                [
+                    html.Img(
+                        src="https://drive.google.com/uc?export=view&id=1PyMewJ3MVu30Ot5Qg-EvqmTm6GqtGLE9",
+                        style={"width": "40%", "fill": "#000"},
+                    )
+                ],
+                style={"width": "100%", "text-align": "center"},
+            ),
+            dcc.Markdown("""
+                     * When `p'_cont < p_cont` (i.e. the social distancing/lockdown measure loosens), the function now becomes:
+                     """),
+            html.Div(
+                [
+                    html.Img(
+                        src="https://drive.google.com/uc?export=view&id=1IBcmRAffnW26DYXZtCqby9U-w0qpn9eF",
+                        style={"width": "40%", "fill": "#000"},
+                    )
+                ],
+                style={"width": "100%", "text-align": "center"},
+            ),
+            dcc.Markdown("""
+                            # Tool features
+                            
+                            ## Modelling features
+                            
+                            In order to create the most interactive and convenient tool possible for COVID-19 modelling, we have decided to opt for 
+                            a number of features that makes it more comfortable for users to interact with this web application, including
+                            * The ability to capture 30 different policy schemes in place, corresponding to 30 consecutive time intervals. This would
+                            be helpful for policy advocates to simulate effects of different policy making processes.
+                            * 3 pairs of plots representing different aspect of the outbreak with built-in gadgets of `Plotly` for generated plots, including:
+                                - **Overall trend of infection**: Incidence and cumulative number of hospitalized/infected COVID-19 cases,
+                                - **Critical and fatal cases**: Number of active critical cases daily and cumulative number of deceased cases,
+                                - **Spread and containment**: Effective reproduction number (Basic reproduction number by day) and total number of quarantined individuals.  
+                            * Ability to export all statistical data of a newly calibrated model in a personalized file name, including
+                                - Information summary of the model (in either a .txt file or a .json file for further uploading and re-calibration); 
+                                - Total hospitalized/infected/critical/fatal cases in a single CSV file.
+                            * Comparision with the current capacity for the number of quarantined/hospitalized cases
+                            
+                            ## Cross-checking and testing features
+                            
+                            To facilitate the validation and cross-checking of models between users, we provide the following additional features:
+                            * Samples .json files of the previous outbreaks in Vietnam, including the outbreaks in 
+                                - Danang (07-08/2020);
+                                - Hai Duong (01-03/2021); 
+                                - Bac Giang (05-07/2021); and 
+                                - Ho Chi Minh (05/2021 onwards) with 3 scenarios: best, moderate and worst.
+                            * Import (Upload) a .json file that includes all information of the previously calibrated model to continue further moedification 
+                                without having to restart the whole process from the beginning;
+                            * Upload a csv file of the actual situation and illustrate it alongside with the prediction model. The uploaded csv file can include 
+                                up to 5 following fields:   
+                                - Number of new (incidence) cases per day (`daily_infected`);
+                                - Total (cumulative) number of cases (`cumulative_infected`);
+                                - Number of active critical cases (`active_critical`);
+                                - Total (cumulative) number of deaths (`cumulative_deaths`);
+                                - Number of active quarantined individuals (`active_quarantined`). 
+                                
+                            """),
+            dcc.Markdown("""
+                        # Mentions
                         
-                        ## Modelling features
+                        Up until now, our research project has been featured at two major conferences in lung health, public health and epidemiology, including:
+                        - [The 52nd World Union Conference on Lung Health](https://theunion.org/our-work/conferences/52nd-union-world-conference-on-lung-health?fbclid=IwAR3DAw1R3eA8L0Jv0cr0aUtoqFJwESIHNvdGCyBKzkPF5KFbsUcXTOOK-ZM);
+                        - [8th Vietnam Lung Association (VILA) Scientific Conference 2021](https://drive.google.com/file/d/10uBQJATgEIVgIAbQdp9n4oWGGYqOiKf-/view?fbclid=IwAR3bNTaz_4UKZxa2TaN5ge6FSJL88vURX7xzFURjkE0J-B4hxuKT_3ZZ3vQ).
                         
-                        In order to create the most interactive and convenient tool possible for COVID-19 modelling, we have decided to opt for 
-                        a number of features that makes it more comfortable for users to interact with this web application, including
-                        * The ability to capture 30 different policy schemes in place, corresponding to 30 consecutive time intervals. This would
-                        be helpful for policy advocates to simulate effects of different policy making processes.
-                        * 3 pairs of plots representing different aspect of the outbreak with built-in gadgets of `Plotly` for generated plots, including:
-                            - **Overall trend of infection**: Incidence and cumulative number of hospitalized/infected COVID-19 cases,
-                            - **Critical and fatal cases**: Number of active critical cases daily and cumulative number of deceased cases,
-                            - **Spread and containment**: Effective reproduction number (Basic reproduction number by day) and total number of quarantined individuals.  
-                        * Ability to export all statistical data of a newly calibrated model in a personalized file name, including
-                            - Information summary of the model (in either a .txt file or a .json file for further uploading and re-calibration); 
-                            - Total hospitalized/infected/critical/fatal cases in a single CSV file.
-                        * Comparision with the current capacity for the number of quarantined/hospitalized cases
+                        Moreover, we also have a Markdown version ready for submission to Journal of Open Source Software. This can be found at the associated 
+                        [paper.md](https://github.com/tuankhoin/SEIQHCDRO-Interactive-Model/blob/main/paper.md) file within this repository.
                         
-                        ## Cross-checking and testing features
+                        Besides, our research has also been featured on a lot of renowned newspapers in Vietnam, including Tuoi tre, VNExpress, Soha, Viet Nam News, etc. as a major tool 
+                        for our policy advocates to fight against the COVID-19 pandemic in Vietnam.
                         
-                        To facilitate the validation and cross-checking of models between users, we provide the following additional features:
-                        * Samples .json files of the previous outbreaks in Vietnam, including the outbreaks in 
-                            - Danang (07-08/2020);
-                            - Hai Duong (01-03/2021); 
-                            - Bac Giang (05-07/2021); and 
-                            - Ho Chi Minh (05/2021 onwards) with 3 scenarios: best, moderate and worst.
-                        * Import (Upload) a .json file that includes all information of the previously calibrated model to continue further moedification 
-                            without having to restart the whole process from the beginning;
-                        * Upload a csv file of the actual situation and illustrate it alongside with the prediction model. The uploaded csv file can include 
-                            up to 5 following fields:   
-                            - Number of new (incidence) cases per day (`daily_infected`);
-                            - Total (cumulative) number of cases (`cumulative_infected`);
-                            - Number of active critical cases (`active_critical`);
-                            - Total (cumulative) number of deaths (`cumulative_deaths`);
-                            - Number of active quarantined individuals (`active_quarantined`). 
-                            
-                        """
-        ),
-        dcc.Markdown(
-            """
-                    # Mentions
-                    
-                    Up until now, our research project has been featured at two major conferences in lung health, public health and epidemiology, including:
-                    - [The 52nd World Union Conference on Lung Health](https://theunion.org/our-work/conferences/52nd-union-world-conference-on-lung-health?fbclid=IwAR3DAw1R3eA8L0Jv0cr0aUtoqFJwESIHNvdGCyBKzkPF5KFbsUcXTOOK-ZM);
-                    - [8th Vietnam Lung Association (VILA) Scientific Conference 2021](https://drive.google.com/file/d/10uBQJATgEIVgIAbQdp9n4oWGGYqOiKf-/view?fbclid=IwAR3bNTaz_4UKZxa2TaN5ge6FSJL88vURX7xzFURjkE0J-B4hxuKT_3ZZ3vQ).
-                    
-                    Moreover, we also have a Markdown version ready for submission to Journal of Open Source Software. This can be found at the associated 
-                    [paper.md](https://github.com/tuankhoin/SEIQHCDRO-Interactive-Model/blob/main/paper.md) file within this repository.
+                        # Citation
+
+                        If SEIQHCDRO multi-compartment model in general or the interactive modelling website has been useful for your research and policy advocacy, and you would like to cite it in an scientific publication, please refer to our presentation at the **52nd Union World Conference on Lung Health** as follows:
+                        """),
+            dcc.Markdown(
+                """
+                        ```bibtex
+                        @inproceedings{seiqhcdro-2021,
+                          author = {Hoang Anh NGO and Tuan-Khoi NGUYEN and Thu-Anh NGUYEN},
+                          title = {A novel compartment model for analyzing and predicting COVID-19 outbreaks in Vietnam},
+                          booktitle = {Abstract Book, 52nd Union World Conference on Lung Health of the International Union Against Tuberculosis and Lung Disease (The Union)},
+                          year = {2021},
+                          month = {October},
+                          date = {19--22},
+                          pages = {S78--S78},
+                          url = {https://theunion.org/sites/default/files/2021-10/UNION2021_Abstracts_High.pdf},
+                          address = {Virtual}
+                        }
+                        ```
+                        """,
+            ),
+            dcc.Markdown("""
+                            # About the authors
                     
-                    Besides, our research has also been featured on a lot of renowned newspapers in Vietnam, including Tuoi tre, VNExpress, Soha, Viet Nam News, etc. as a major tool 
-                    for our policy advocates to fight against the COVID-19 pandemic in Vietnam.
+                            * [**Hoang Anh NGO**](https://orcid.org/0000-0002-7583-753X) is the main author of the SEIQHCDRO model. He finished his undergraduate study at École Polytechnique with 
+                            a double major in Mathematics and Economics, minor in Computational Economics and is currently pursuing a Master of Science in Epidemiology at The University of Edinburgh. 
+                            He is also currently a Research Contractor at Woolcock Institute of Medical Research Vietnam and Department of Information and Network (INFRES, Télécom Paris). His research 
+                            interests focus on Epidemiology, (Online) Machine Learning and its applications in Medicine.
+                            * [**Tuan-Khoi Nguyen**](https://tkhoinguyen.netlify.app/) is the data engineer and tool developer of this project. He is currently in his first year of Masters of Science 
+                            in Mechatronics at The University of Melbourne with a Bachelor of Science in Mechatronics, after finishing the BSc. within the same field. His research interest focuses on 
+                            Machine Learning and its autonomous applications in Robotics and real life problems.
+                            * Dr [**Nguyen Thu Anh**](https://www.researchgate.net/profile/Nguyen-Anh-50) is an epidemiologist and a social scientist by training, with more than 20 years of experience. 
+                            She holds an honorary position as Senior Clinical Lecturer at University of Sydney, and the head of the 
+                            Woolcock Institute of Medical Research in Vietnam.
                     
-                    # Citation
-
-                    If SEIQHCDRO multi-compartment model in general or the interactive modelling website has been useful for your research and policy advocacy, and you would like to cite it in an scientific publication, please refer to our presentation at the **52nd Union World Conference on Lung Health** as follows:
-                    """
-        ),
-        dcc.Markdown(
-            """
-                    ```bibtex
-                    @inproceedings{seiqhcdro-2021,
-                      author = {Hoang Anh NGO and Tuan-Khoi NGUYEN and Thu-Anh NGUYEN},
-                      title = {A novel compartment model for analyzing and predicting COVID-19 outbreaks in Vietnam},
-                      booktitle = {Abstract Book, 52nd Union World Conference on Lung Health of the International Union Against Tuberculosis and Lung Disease (The Union)},
-                      year = {2021},
-                      month = {October},
-                      date = {19--22},
-                      pages = {S78--S78},
-                      url = {https://theunion.org/sites/default/files/2021-10/UNION2021_Abstracts_High.pdf},
-                      address = {Virtual}
-                    }
-                    ```
-                    """,
-        ),
-        dcc.Markdown(
-            """
-                        # About the authors
-                
-                        * [**Hoang Anh NGO**](https://orcid.org/0000-0002-7583-753X) is the main author of the SEIQHCDRO model. He finished his undergraduate study at École Polytechnique with 
-                        a double major in Mathematics and Economics, minor in Computational Economics and is currently pursuing a Master of Science in Epidemiology at The University of Edinburgh. 
-                        He is also currently a Research Contractor at Woolcock Institute of Medical Research Vietnam and Department of Information and Network (INFRES, Télécom Paris). His research 
-                        interests focus on Epidemiology, (Online) Machine Learning and its applications in Medicine.
-                        * [**Tuan-Khoi Nguyen**](https://tkhoinguyen.netlify.app/) is the data engineer and tool developer of this project. He is currently in his first year of Masters of Science 
-                        in Mechatronics at The University of Melbourne with a Bachelor of Science in Mechatronics, after finishing the BSc. within the same field. His research interest focuses on 
-                        Machine Learning and its autonomous applications in Robotics and real life problems.
-                        * Dr [**Nguyen Thu Anh**](https://www.researchgate.net/profile/Nguyen-Anh-50) is an epidemiologist and a social scientist by training, with more than 20 years of experience. 
-                        She holds an honorary position as Senior Clinical Lecturer at University of Sydney, and the head of the 
-                        Woolcock Institute of Medical Research in Vietnam.
-                
-                        """
-        ),
-        dcc.Markdown(
-            """
-                        # Acknowledgement
-                        
-                        We would like to send our sincerest gratitude towards all team members of [5F Team](https://5fteam.com/) for contributing 
-                        valuable insights and data to help us complete out model:
-                        
-                        * BPharm. Duyen T. Duong, Woolcock Institute of Medical Research Vietnam
-                        * MS. Thao Huong Nguyen, Independent Social Researcher
-                        * Kim Anh Le, MD PhD, Hanoi University of Public Health
-                        * Cuong Quoc Nguyen, MD PhD, Independent Epidemiologist
-                        * Phuc Phan, MD PhD, Vietnam National Hospital of Pediatrics 
-                        * Nguyen Huyen Nguyen, MD, National Hospital of Tropical Diseases (NHTD)
-                        
-                        Moreover, we also want to send our warmest thanks to our fellow 
-                        colleagues and readers for their thoughtful and scholarly evaluation of the model. 
-                        All comments are hugely appreciated.
-                        
-                        """
-        ),
-        dcc.Markdown(
-            """
-                        # License 
-                        SEIQHCDRO COVID-19 Interactive Modelling Tool is a free and open-source web application/software licensed under the 
-                        [3-clause BSD license](https://github.com/tuankhoin/SEIQHCDRO-Interactive-Model/blob/main/LICENSE).
-                        
-                        # Authorship & Contribution
-                        
-                        * Based on the license, this is a free software/web application released by the authors. There is no relation between the application and authors' affiliations.
-                        * Source code is stored as open source on [GitHub](https://github.com/tuankhoin/SEIQHCDRO-Interactive-Model) and [Zenodo](https://doi.org/10.5281/zenodo.5136441).
-                        * For support, please write an issue in the [issue tracker of this project](https://github.com/tuankhoin/SEIQHCDRO-Interactive-Model/issues).
-                        * For contribution, please fork and make a pull request.
+                            """),
+            dcc.Markdown("""
+                            # Acknowledgement
                             
-                        # Website legal disclaimer
-                        The information contained in this website is for convenience or reference only. The content cannot be considered to be medical advice and is not intended 
-                        to be a substitute for professional medical counselling, diagnosis or treatment. For any concern please consult a trusted specialist in the field.
-
-                        Whilst we endeavor to keep the information up to date and correct, we make no representations or warranties of any kind, express or implied, 
-                        about the completeness, accuracy, timeliness, reliability, suitability or availability with respect to the website or the information, 
-                        products, services, or related graphics, images, text and all other materials contained on the website for any purpose. 
-                        It is not meant to be applicable to any specific individual’s medical condition and any reliance you place on such information is therefore 
-                        strictly at your own risk.
-
-                        In no event will we be liable for any loss or damage including without limitation, indirect or consequential loss or damage, or any loss or damage whatsoever 
-                        arising from loss of data or profits arising out of, or in connection with, the use of this website.
-                        """
-        ),
-    ],
-    style={"margin": "5%"},
-)
+                            We would like to send our sincerest gratitude towards all team members of [5F Team](https://5fteam.com/) for contributing 
+                            valuable insights and data to help us complete out model:
+                            
+                            * BPharm. Duyen T. Duong, Woolcock Institute of Medical Research Vietnam
+                            * MS. Thao Huong Nguyen, Independent Social Researcher
+                            * Kim Anh Le, MD PhD, Hanoi University of Public Health
+                            * Cuong Quoc Nguyen, MD PhD, Independent Epidemiologist
+                            * Phuc Phan, MD PhD, Vietnam National Hospital of Pediatrics 
+                            * Nguyen Huyen Nguyen, MD, National Hospital of Tropical Diseases (NHTD)
+                            
+                            Moreover, we also want to send our warmest thanks to our fellow 
+                            colleagues and readers for their thoughtful and scholarly evaluation of the model. 
+                            All comments are hugely appreciated.
+                            
+                            """),
+            dcc.Markdown("""
+                            # License 
+                            SEIQHCDRO COVID-19 Interactive Modelling Tool is a free and open-source web application/software licensed under the 
+                            [3-clause BSD license](https://github.com/tuankhoin/SEIQHCDRO-Interactive-Model/blob/main/LICENSE).
+                            
+                            # Authorship & Contribution
+                            
+                            * Based on the license, this is a free software/web application released by the authors. There is no relation between the application and authors' affiliations.
+                            * Source code is stored as open source on [GitHub](https://github.com/tuankhoin/SEIQHCDRO-Interactive-Model) and [Zenodo](https://doi.org/10.5281/zenodo.5136441).
+                            * For support, please write an issue in the [issue tracker of this project](https://github.com/tuankhoin/SEIQHCDRO-Interactive-Model/issues).
+                            * For contribution, please fork and make a pull request.
+                                
+                            # Website legal disclaimer
+                            The information contained in this website is for convenience or reference only. The content cannot be considered to be medical advice and is not intended 
+                            to be a substitute for professional medical counselling, diagnosis or treatment. For any concern please consult a trusted specialist in the field.
+
+                            Whilst we endeavor to keep the information up to date and correct, we make no representations or warranties of any kind, express or implied, 
+                            about the completeness, accuracy, timeliness, reliability, suitability or availability with respect to the website or the information, 
+                            products, services, or related graphics, images, text and all other materials contained on the website for any purpose. 
+                            It is not meant to be applicable to any specific individual’s medical condition and any reliance you place on such information is therefore 
+                            strictly at your own risk.
+
+                            In no event will we be liable for any loss or damage including without limitation, indirect or consequential loss or damage, or any loss or damage whatsoever 
+                            arising from loss of data or profits arising out of, or in connection with, the use of this website.
+                            """),
+        ],
+        style={"margin": "5%"},
+    )
 
 
 def generate_inputs():
@@ -399,8 +423,8 @@ def generate_inputs():
                 dcc.Input(
                     id="num",
                     min=0,
-                    max=30,
-                    value=3,
+                    max=MAX_STAGES,
+                    value=DEFAULT_STAGES,
                     step=1,
                     type="number",  # tooltip={'always_visible': True}
                 ),
@@ -411,7 +435,27 @@ def generate_inputs():
 
     text_boxes = [
         html.H3("Stage Inputs"),
-        html.Div(id="in-r0"),
+        # Every stage is in the page from the start, hidden beyond the number
+        # of stages, so that changing it only shows or hides rows
+        html.Div(
+            [
+                stage_input(
+                    i,
+                    DEFAULT_DAY[i],
+                    DEFAULT_DELTA_R0[i],
+                    DEFAULT_PCONT[i],
+                    visible=i < DEFAULT_STAGES,
+                )
+                for i in range(MAX_STAGES)
+            ],
+            id="in-r0",
+        ),
+        dcc.Store(
+            id="stages",
+            data=stage_data(
+                DEFAULT_STAGES, DEFAULT_DAY, DEFAULT_DELTA_R0, DEFAULT_PCONT
+            ),
+        ),
         dbc.Tooltip(
             html.Ul(
                 [
@@ -431,7 +475,24 @@ def generate_inputs():
         ),
     ]
 
-    input_list = [num_slider, text_boxes]
+    optimizer = [
+        html.Button(
+            ["\f Optimise stages for capacity"],
+            id="btn_opt",
+            style={"color": "white", "margin": "2% 0", "width": "100%"},
+        ),
+        dbc.Tooltip(
+            "Search the least restrictive stage schedule that keeps hospitalised and quarantined cases within capacity, then pick one to load it into the stage inputs",
+            target="btn_opt",
+            placement="right",
+        ),
+        dcc.Loading(
+            dcc.Dropdown(id="opt-pick", placeholder="Pick an optimised schedule")
+        ),
+        dcc.Store(id="opt-store"),
+    ]
+
+    input_list = [num_slider, text_boxes, optimizer]
     widgets = list()
     for sublist in input_list:
         sublist.append(html.H1(""))
@@ -441,929 +502,1039 @@ def generate_inputs():
     return widgets
 
 
+def overlay_options(uploaded):
+    r"""
+    Choices of scenarios to overlay: the sample regions, then uploaded inputs.
+
+    Parameters
+    ----------
+    uploaded : `dict`
+        Uploaded scenarios, by file name.
+
+    Returns
+    -------
+    options : :class:`list`
+        Dropdown options.
+    """
+    return [{"label": p.name, "value": p.key} for p in presets] + [
+        {"label": f, "value": "upload:" + f} for f in uploaded
+    ]
+
+
+def zoom_window(relayout, start, ndate):
+    r"""
+    Range of days shown after zooming into a figure.
+
+    Parameters
+    ----------
+    relayout : `dict`
+        Relayout data of the figure.
+    start : `str`
+        Start date of the outbreak, used when the figure is shown by date.
+    ndate : `int`
+        Number of days.
+
+    Returns
+    -------
+    window : `tuple`
+        First and last visible day, or `None` when the figure is not zoomed in.
+    """
+    import pandas as pd
+
+    ends = []
+    for k, v in (relayout or {}).items():
+        if re.fullmatch(r"xaxis\d*\.range\[[01]\]", k):
+            ends.append(v)
+        elif re.fullmatch(r"xaxis\d*\.range", k):
+            ends.extend(v)
+    if not ends:
+        return None
+    days = [
+        (
+            (pd.Timestamp(v) - pd.Timestamp(start)) / pd.Timedelta(days=1)
+            if isinstance(v, str)
+            else float(v)
+        )
+        for v in ends
+    ]
+    lo, hi = max(min(days), 0), min(max(days), ndate)
+    return (lo, hi) if lo < hi else None
+
+
+def thin_figure(fig, start, window=None, points=PLOT_POINTS):
+    r"""
+    Reduce the traces of a figure to what can be seen, keeping their peaks.
+
+    Parameters
+    ----------
+    fig : `plotly.graph_objects.Figure`
+        Figure, modified in place.
+    start : `str`
+        Start date of the outbreak, used when the figure is shown by date.
+    window : `tuple`
+        Visible range of days, see :func:`zoom_window`. Only the points inside
+        are kept, so zooming in shows the full resolution.
+    points : `int`
+        Largest number of points per trace.
+    """
+    import pandas as pd
+
+    for trace in fig.data:
+        if trace.x is None or trace.y is None:
+            continue
+        x = np.asarray(trace.x)
+        y = np.asarray(trace.y, dtype=float)
+        if x.dtype.kind in "OM":
+            t = (pd.to_datetime(x) - pd.Timestamp(start)) / pd.Timedelta(days=1)
+            t = np.asarray(t, dtype=float)
+        else:
+            t = x.astype(float)
+        index = np.arange(len(t)) if window is None else visible(t, *window)
+        index = index[lttb(t[index], y[index], points)]
+        if len(index) < len(t):
+            trace.x, trace.y = x[index], y[index]
+
+
 # Main page
-main_page = html.Div(
-    [
-        html.Div(
-            [
-                html.Div(
-                    [html.H1("COVID-19 Multi-compartment Modelling Result".upper())],
-                    style={"width": "100%", "text-align": "center", "padding": "1%"},
-                ),
-                # Inputs
-                html.Div(
-                    [
-                        # Basic inputs
-                        dbc.Button(
-                            html.H2("Basic Inputs"),
-                            id="collapse-button",
-                            className="mb-3",
-                            color="primary",
-                            style={"width": "100%"},
-                        ),
-                        dbc.Collapse(
-                            [
-                                html.Div(
-                                    [
-                                        html.H3("Population"),
-                                        dbc.Tooltip(
-                                            "Population taken into account",
-                                            target="div-N",
-                                            placement="right",
-                                        ),
-                                        dcc.Slider(
-                                            id="slider-N",
-                                            min=100000,
-                                            max=100000000,
-                                            value=11000000,
-                                            step=1000,
-                                            tooltip={
-                                                "always_visible": True,
-                                                "placement": "top",
-                                            },
-                                            marks={
-                                                i: str(i)
-                                                for i in [100000, 50000000, 100000000]
+@lru_cache(maxsize=None)
+def main_page():
+    r"""
+    Build the main page, once per process and only when first requested.
+
+    Returns
+    -------
+    page : `dash_html_components.Div`
+        A Div of HTML Elements for the main page.
+    """
+    return html.Div(
+        [
+            html.Div(
+                [
+                    html.Div(
+                        [
+                            html.H1(
+                                "COVID-19 Multi-compartment Modelling Result".upper()
+                            )
+                        ],
+                        style={
+                            "width": "100%",
+                            "text-align": "center",
+                            "padding": "1%",
+                        },
+                    ),
+                    # Inputs
+                    html.Div(
+                        [
+                            # Basic inputs
+                            dbc.Button(
+                                html.H2("Basic Inputs"),
+                                id="collapse-button",
+                                className="mb-3",
+                                color="primary",
+                                style={"width": "100%"},
+                            ),
+                            dbc.Collapse(
+                                [
+                                    html.Div(
+                                        [
+                                            html.H3("Population"),
+                                            dbc.Tooltip(
+                                                "Population taken into account",
+                                                target="div-N",
+                                                placement="right",
+                                            ),
+                                            dcc.Slider(
+                                                id="slider-N",
+                                                min=100000,
+                                                max=100000000,
+                                                value=11000000,
+                                                step=1000,
+                                                tooltip={
+                                                    "always_visible": True,
+                                                    "placement": "top",
+                                                },
+                                                marks={
+                                                    i: str(i)
+                                                    for i in [
+                                                        100000,
+                                                        50000000,
+                                                        100000000,
+                                                    ]
+                                                },
+                                            ),
+                                        ],
+                                        id="div-N",
+                                    ),
+                                    html.Div(
+                                        [
+                                            html.H3("Outbreak Date"),
+                                            dbc.Tooltip(
+                                                "Assumed first day of outbreak",
+                                                target="div-date",
+                                                placement="right",
+                                            ),
+                                            dcc.DatePickerSingle(
+                                                id="date",
+                                                min_date_allowed=date(2020, 1, 1),
+                                                max_date_allowed=date(2030, 12, 31),
+                                                initial_visible_month=date(2021, 5, 1),
+                                                date=date(2021, 5, 1),
+                                                display_format="DD/MM/YYYY",
+                                            ),
+                                        ],
+                                        id="div-date",
+                                    ),
+                                    html.Div(
+                                        [
+                                            html.H3("Number of Days"),
+                                            dbc.Tooltip(
+                                                "Length of outbreak",
+                                                target="div-ndate",
+                                                placement="right",
+                                            ),
+                                            dcc.Input(
+                                                id="ndate",
+                                                value=300,
+                                                min=10,
+                                                max=1000,
+                                                type="number",
+                                            ),
+                                        ],
+                                        id="div-ndate",
+                                    ),
+                                    html.Div(
+                                        [
+                                            html.H3("Hospital Capacity: "),
+                                            dbc.Tooltip(
+                                                "Hospital Capacity",
+                                                target="div-hcap",
+                                                placement="right",
+                                            ),
+                                            dcc.Input(
+                                                id="hcap", value=100000, type="number"
+                                            ),
+                                        ],
+                                        style={"margin": "4% 0%"},
+                                        id="div-hcap",
+                                    ),
+                                    html.Div(
+                                        [
+                                            html.H3("Quarantine Capacity: "),
+                                            dbc.Tooltip(
+                                                "Quarantine Capacity",
+                                                target="div-qar",
+                                                placement="right",
+                                            ),
+                                            dcc.Input(
+                                                id="hqar", value=10000, type="number"
+                                            ),
+                                        ],
+                                        style={"margin": "4% 0%"},
+                                        id="div-qar",
+                                    ),
+                                    html.Div(
+                                        [
+                                            html.H3(
+                                                "Initial basic reproduction number (R0):"
+                                            ),
+                                            dbc.Tooltip(
+                                                "Initial basic reproduction number at first day of outbreak",
+                                                target="div-r0",
+                                                placement="right",
+                                            ),
+                                            dcc.Input(
+                                                id="slider-r0",
+                                                min=0,
+                                                max=20,
+                                                value=4.1,
+                                                step=0.001,
+                                                type="number",  # tooltip={'always_visible': True}
+                                            ),
+                                        ],
+                                        id="div-r0",
+                                    ),
+                                    html.Div(generate_inputs()),
+                                ],
+                                id="collapse",
+                                style=tab,
+                            ),
+                            # Proportional inputs
+                            dbc.Button(
+                                html.H2("Proportion Inputs"),
+                                id="collapse-button-p",
+                                className="mb-3",
+                                color="info",
+                                style={"width": "100%"},
+                            ),
+                            dbc.Collapse(
+                                [
+                                    html.Div(
+                                        [
+                                            html.H6("Hospitalisation"),
+                                            dbc.Tooltip(
+                                                "Proportion of infected people getting hospitalized (For example, if 100 positive cases exist in the community, this proportion of them would be directly sent to a hospital).",
+                                                target="div-ph",
+                                                placement="right",
+                                            ),
+                                            dcc.Slider(
+                                                id="slider-ph",
+                                                min=0,
+                                                max=1,
+                                                value=0.85,
+                                                step=0.01,
+                                                tooltip={"always_visible": True},
+                                            ),
+                                        ],
+                                        id="div-ph",
+                                    ),
+                                    html.Div(
+                                        [
+                                            html.H6("Critical"),
+                                            dbc.Tooltip(
+                                                "Proportion of COVID-19 positive hospitalized patients turning critical.",
+                                                target="div-pc",
+                                                placement="right",
+                                            ),
+                                            dcc.Slider(
+                                                id="slider-pc",
+                                                min=0,
+                                                max=1,
+                                                value=0.04,
+                                                step=0.01,
+                                                tooltip={"always_visible": True},
+                                            ),
+                                        ],
+                                        id="div-pc",
+                                    ),
+                                    html.Div(
+                                        [
+                                            html.H6("Deceased"),
+                                            dbc.Tooltip(
+                                                "Proportion of COVID-19 positive critical patients deceased.",
+                                                target="div-pf",
+                                                placement="right",
+                                            ),
+                                            dcc.Slider(
+                                                id="slider-pf",
+                                                min=0,
+                                                max=1,
+                                                value=0.25,
+                                                step=0.01,
+                                                tooltip={"always_visible": True},
+                                            ),
+                                        ],
+                                        id="div-pf",
+                                    ),
+                                    html.Div(
+                                        [
+                                            html.H6("Media Impact"),
+                                            dbc.Tooltip(
+                                                "Media Impact as a contact reduction rate on the reproduction number.",
+                                                target="div-pj",
+                                                placement="right",
+                                            ),
+                                            dcc.Slider(
+                                                id="slider-pj",
+                                                min=0,
+                                                max=1,
+                                                value=0.12,
+                                                step=0.01,
+                                                tooltip={"always_visible": True},
+                                            ),
+                                        ],
+                                        id="div-pj",
+                                    ),
+                                    html.Div(
+                                        [
+                                            html.H6("Quarantined"),
+                                            dbc.Tooltip(
+                                                "Proportion of contact cases who requires quarantined actually get quarantined upon contact tracing (For example, if 100 contact cases need quarantine, this proportion of them would get quarantined immediately).",
+                                                target="div-pquar",
+                                                placement="right",
+                                            ),
+                                            dcc.Slider(
+                                                id="slider-pquar",
+                                                min=0,
+                                                max=1,
+                                                value=0.8,
+                                                step=0.01,
+                                                tooltip={"always_visible": True},
+                                            ),
+                                        ],
+                                        id="div-pquar",
+                                    ),
+                                    html.Div(
+                                        [
+                                            html.H6("Quarantined, then Hospitalised"),
+                                            dbc.Tooltip(
+                                                "Proportion of individuals quarantined for a long duration of time before getting positive result and hospitalized.",
+                                                target="div-pqhsp",
+                                                placement="right",
+                                            ),
+                                            dcc.Slider(
+                                                id="slider-pqhsp",
+                                                min=0,
+                                                max=1,
+                                                value=0.1,
+                                                step=0.01,
+                                                tooltip={"always_visible": True},
+                                            ),
+                                        ],
+                                        id="div-pqhsp",
+                                    ),
+                                    html.Div(
+                                        [
+                                            html.H6("Cross-Contamination"),
+                                            dbc.Tooltip(
+                                                "Cross-contamination rate in quarantine facilities.",
+                                                target="div-pcross",
+                                                placement="right",
+                                            ),
+                                            dcc.Slider(
+                                                id="slider-pcross",
+                                                min=0,
+                                                max=1,
+                                                value=0.01,
+                                                step=0.01,
+                                                tooltip={"always_visible": True},
+                                            ),
+                                        ],
+                                        id="div-pcross",
+                                    ),
+                                ],
+                                id="collapse-p",
+                                style=tab,
+                            ),
+                            # Timing inputs
+                            dbc.Button(
+                                html.H2("Time Inputs"),
+                                id="collapse-button-t",
+                                className="mb-3",
+                                color="danger",
+                                style={"width": "100%"},
+                            ),
+                            dbc.Collapse(
+                                [
+                                    html.Div(
+                                        [
+                                            html.H6("Incubation"),
+                                            dbc.Tooltip(
+                                                "Incubation period.",
+                                                target="div-tinc",
+                                                placement="right",
+                                            ),
+                                            dcc.Slider(
+                                                id="slider-tinc",
+                                                min=2.5,
+                                                max=7,
+                                                value=4.5,
+                                                step=0.1,
+                                                tooltip={"always_visible": True},
+                                            ),
+                                        ],
+                                        id="div-tinc",
+                                    ),
+                                    html.Div(
+                                        [
+                                            html.H6("Infectious"),
+                                            dbc.Tooltip(
+                                                "Infectious period.",
+                                                target="div-tinf",
+                                                placement="right",
+                                            ),
+                                            dcc.Slider(
+                                                id="slider-tinf",
+                                                min=1.0,
+                                                max=7,
+                                                value=2.9,
+                                                step=0.1,
+                                                tooltip={"always_visible": True},
+                                            ),
+                                        ],
+                                        id="div-tinf",
+                                    ),
+                                    html.Div(
+                                        [
+                                            html.H6("Intensive Care"),
+                                            dbc.Tooltip(
+                                                "Time spent within the ICU.",
+                                                target="div-ticu",
+                                                placement="right",
+                                            ),
+                                            dcc.Slider(
+                                                id="slider-ticu",
+                                                min=10.0,
+                                                max=14,
+                                                value=11,
+                                                step=0.1,
+                                                tooltip={"always_visible": True},
+                                            ),
+                                        ],
+                                        id="div-ticu",
+                                    ),
+                                    html.Div(
+                                        [
+                                            html.H6("Hospitalised"),
+                                            dbc.Tooltip(
+                                                "Time spent hospitalised for non-critical patients.",
+                                                target="div-thsp",
+                                                placement="right",
+                                            ),
+                                            dcc.Slider(
+                                                id="slider-thsp",
+                                                min=7,
+                                                max=21,
+                                                value=21,
+                                                step=0.1,
+                                                tooltip={"always_visible": True},
+                                            ),
+                                        ],
+                                        id="div-thsp",
+                                    ),
+                                    html.Div(
+                                        [
+                                            html.H6("Critical"),
+                                            dbc.Tooltip(
+                                                "Time spent hospitalized before turning critical.",
+                                                target="div-tcrt",
+                                                placement="right",
+                                            ),
+                                            dcc.Slider(
+                                                id="slider-tcrt",
+                                                min=1,
+                                                max=14,
+                                                value=7,
+                                                step=0.1,
+                                                tooltip={"always_visible": True},
+                                            ),
+                                        ],
+                                        id="div-tcrt",
+                                    ),
+                                    html.Div(
+                                        [
+                                            html.H6("Self-Recovery"),
+                                            dbc.Tooltip(
+                                                "Self-Recovery time for non-disclosed cases.",
+                                                target="div-trec",
+                                                placement="right",
+                                            ),
+                                            dcc.Slider(
+                                                id="slider-trec",
+                                                min=7,
+                                                max=21,
+                                                value=21,
+                                                step=0.1,
+                                                tooltip={"always_visible": True},
+                                            ),
+                                        ],
+                                        id="div-trec",
+                                    ),
+                                    html.Div(
+                                        [
+                                            html.H6("Quarantine"),
+                                            dbc.Tooltip(
+                                                "Quarantine time under regulation.",
+                                                target="div-tqar",
+                                                placement="right",
+                                            ),
+                                            dcc.Slider(
+                                                id="slider-tqar",
+                                                min=4,
+                                                max=21,
+                                                value=21,
+                                                step=0.1,
+                                                tooltip={"always_visible": True},
+                                            ),
+                                        ],
+                                        id="div-tqar",
+                                    ),
+                                    html.Div(
+                                        [
+                                            html.H6("Quarantined, then Hospitalised"),
+                                            dbc.Tooltip(
+                                                "Time interval between the last COVID-19 positive result until getting hospitalized.",
+                                                target="div-tqah",
+                                                placement="right",
+                                            ),
+                                            dcc.Slider(
+                                                id="slider-tqah",
+                                                min=0,
+                                                max=5,
+                                                value=2,
+                                                step=0.1,
+                                                tooltip={"always_visible": True},
+                                            ),
+                                        ],
+                                        id="div-tqah",
+                                    ),
+                                ],
+                                id="collapse-t",
+                                style=tab,
+                            ),
+                            # Input uploader
+                            html.Div(
+                                [
+                                    dcc.Upload(
+                                        html.Button(
+                                            ["\f Upload custom .json input file"],
+                                            style={
+                                                "color": "white",
+                                                "margin": "2% 0",
+                                                "width": "100%",
                                             },
                                         ),
-                                    ],
-                                    id="div-N",
-                                ),
-                                html.Div(
-                                    [
-                                        html.H3("Outbreak Date"),
-                                        dbc.Tooltip(
-                                            "Assumed first day of outbreak",
-                                            target="div-date",
-                                            placement="right",
-                                        ),
-                                        dcc.DatePickerSingle(
-                                            id="date",
-                                            min_date_allowed=date(2020, 1, 1),
-                                            max_date_allowed=date(2030, 12, 31),
-                                            initial_visible_month=date(2021, 5, 1),
-                                            date=date(2021, 5, 1),
-                                            display_format="DD/MM/YYYY",
-                                        ),
-                                    ],
-                                    id="div-date",
-                                ),
-                                html.Div(
-                                    [
-                                        html.H3("Number of Days"),
-                                        dbc.Tooltip(
-                                            "Length of outbreak",
-                                            target="div-ndate",
-                                            placement="right",
-                                        ),
-                                        dcc.Input(
-                                            id="ndate",
-                                            value=300,
-                                            min=10,
-                                            max=1000,
-                                            type="number",
-                                        ),
-                                    ],
-                                    id="div-ndate",
-                                ),
-                                html.Div(
-                                    [
-                                        html.H3("Hospital Capacity: "),
-                                        dbc.Tooltip(
-                                            "Hospital Capacity",
-                                            target="div-hcap",
-                                            placement="right",
-                                        ),
-                                        dcc.Input(
-                                            id="hcap", value=100000, type="number"
-                                        ),
-                                    ],
-                                    style={"margin": "4% 0%"},
-                                    id="div-hcap",
-                                ),
-                                html.Div(
-                                    [
-                                        html.H3("Quarantine Capacity: "),
-                                        dbc.Tooltip(
-                                            "Quarantine Capacity",
-                                            target="div-qar",
-                                            placement="right",
-                                        ),
-                                        dcc.Input(
-                                            id="hqar", value=10000, type="number"
-                                        ),
-                                    ],
-                                    style={"margin": "4% 0%"},
-                                    id="div-qar",
-                                ),
-                                html.Div(
-                                    [
-                                        html.H3(
-                                            "Initial basic reproduction number (R0):"
-                                        ),
-                                        dbc.Tooltip(
-                                            "Initial basic reproduction number at first day of outbreak",
-                                            target="div-r0",
-                                            placement="right",
-                                        ),
-                                        dcc.Input(
-                                            id="slider-r0",
-                                            min=0,
-                                            max=20,
-                                            value=4.1,
-                                            step=0.001,
-                                            type="number",  # tooltip={'always_visible': True}
-                                        ),
-                                    ],
-                                    id="div-r0",
-                                ),
-                                html.Div(generate_inputs()),
-                            ],
-                            id="collapse",
-                            style=tab,
-                        ),
-                        # Proportional inputs
-                        dbc.Button(
-                            html.H2("Proportion Inputs"),
-                            id="collapse-button-p",
-                            className="mb-3",
-                            color="info",
-                            style={"width": "100%"},
-                        ),
-                        dbc.Collapse(
-                            [
-                                html.Div(
-                                    [
-                                        html.H6("Hospitalisation"),
-                                        dbc.Tooltip(
-                                            "Proportion of infected people getting hospitalized (For example, if 100 positive cases exist in the community, this proportion of them would be directly sent to a hospital).",
-                                            target="div-ph",
-                                            placement="right",
-                                        ),
-                                        dcc.Slider(
-                                            id="slider-ph",
-                                            min=0,
-                                            max=1,
-                                            value=0.85,
-                                            step=0.01,
-                                            tooltip={"always_visible": True},
-                                        ),
-                                    ],
-                                    id="div-ph",
-                                ),
-                                html.Div(
-                                    [
-                                        html.H6("Critical"),
-                                        dbc.Tooltip(
-                                            "Proportion of COVID-19 positive hospitalized patients turning critical.",
-                                            target="div-pc",
-                                            placement="right",
-                                        ),
-                                        dcc.Slider(
-                                            id="slider-pc",
-                                            min=0,
-                                            max=1,
-                                            value=0.04,
-                                            step=0.01,
-                                            tooltip={"always_visible": True},
-                                        ),
-                                    ],
-                                    id="div-pc",
-                                ),
-                                html.Div(
-                                    [
-                                        html.H6("Deceased"),
-                                        dbc.Tooltip(
-                                            "Proportion of COVID-19 positive critical patients deceased.",
-                                            target="div-pf",
-                                            placement="right",
-                                        ),
-                                        dcc.Slider(
-                                            id="slider-pf",
-                                            min=0,
-                                            max=1,
-                                            value=0.25,
-                                            step=0.01,
-                                            tooltip={"always_visible": True},
-                                        ),
-                                    ],
-                                    id="div-pf",
-                                ),
-                                html.Div(
-                                    [
-                                        html.H6("Media Impact"),
-                                        dbc.Tooltip(
-                                            "Media Impact as a contact reduction rate on the reproduction number.",
-                                            target="div-pj",
-                                            placement="right",
-                                        ),
-                                        dcc.Slider(
-                                            id="slider-pj",
-                                            min=0,
-                                            max=1,
-                                            value=0.12,
-                                            step=0.01,
-                                            tooltip={"always_visible": True},
-                                        ),
-                                    ],
-                                    id="div-pj",
-                                ),
-                                html.Div(
-                                    [
-                                        html.H6("Quarantined"),
-                                        dbc.Tooltip(
-                                            "Proportion of contact cases who requires quarantined actually get quarantined upon contact tracing (For example, if 100 contact cases need quarantine, this proportion of them would get quarantined immediately).",
-                                            target="div-pquar",
-                                            placement="right",
-                                        ),
-                                        dcc.Slider(
-                                            id="slider-pquar",
-                                            min=0,
-                                            max=1,
-                                            value=0.8,
-                                            step=0.01,
-                                            tooltip={"always_visible": True},
-                                        ),
-                                    ],
-                                    id="div-pquar",
-                                ),
-                                html.Div(
-                                    [
-                                        html.H6("Quarantined, then Hospitalised"),
-                                        dbc.Tooltip(
-                                            "Proportion of individuals quarantined for a long duration of time before getting positive result and hospitalized.",
-                                            target="div-pqhsp",
-                                            placement="right",
-                                        ),
-                                        dcc.Slider(
-                                            id="slider-pqhsp",
-                                            min=0,
-                                            max=1,
-                                            value=0.1,
-                                            step=0.01,
-                                            tooltip={"always_visible": True},
-                                        ),
-                                    ],
-                                    id="div-pqhsp",
-                                ),
-                                html.Div(
-                                    [
-                                        html.H6("Cross-Contamination"),
-                                        dbc.Tooltip(
-                                            "Cross-contamination rate in quarantine facilities.",
-                                            target="div-pcross",
-                                            placement="right",
-                                        ),
-                                        dcc.Slider(
-                                            id="slider-pcross",
-                                            min=0,
-                                            max=1,
-                                            value=0.01,
-                                            step=0.01,
-                                            tooltip={"always_visible": True},
-                                        ),
-                                    ],
-                                    id="div-pcross",
-                                ),
-                            ],
-                            id="collapse-p",
-                            style=tab,
-                        ),
-                        # Timing inputs
-                        dbc.Button(
-                            html.H2("Time Inputs"),
-                            id="collapse-button-t",
-                            className="mb-3",
-                            color="danger",
-                            style={"width": "100%"},
-                        ),
-                        dbc.Collapse(
-                            [
-                                html.Div(
-                                    [
-                                        html.H6("Incubation"),
-                                        dbc.Tooltip(
-                                            "Incubation period.",
-                                            target="div-tinc",
-                                            placement="right",
-                                        ),
-                                        dcc.Slider(
-                                            id="slider-tinc",
-                                            min=2.5,
-                                            max=7,
-                                            value=4.5,
-                                            step=0.1,
-                                            tooltip={"always_visible": True},
-                                        ),
-                                    ],
-                                    id="div-tinc",
-                                ),
-                                html.Div(
-                                    [
-                                        html.H6("Infectious"),
-                                        dbc.Tooltip(
-                                            "Infectious period.",
-                                            target="div-tinf",
-                                            placement="right",
-                                        ),
-                                        dcc.Slider(
-                                            id="slider-tinf",
-                                            min=1.0,
-                                            max=7,
-                                            value=2.9,
-                                            step=0.1,
-                                            tooltip={"always_visible": True},
-                                        ),
-                                    ],
-                                    id="div-tinf",
-                                ),
-                                html.Div(
-                                    [
-                                        html.H6("Intensive Care"),
-                                        dbc.Tooltip(
-                                            "Time spent within the ICU.",
-                                            target="div-ticu",
-                                            placement="right",
-                                        ),
-                                        dcc.Slider(
-                                            id="slider-ticu",
-                                            min=10.0,
-                                            max=14,
-                                            value=11,
-                                            step=0.1,
-                                            tooltip={"always_visible": True},
-                                        ),
-                                    ],
-                                    id="div-ticu",
-                                ),
-                                html.Div(
-                                    [
-                                        html.H6("Hospitalised"),
-                                        dbc.Tooltip(
-                                            "Time spent hospitalised for non-critical patients.",
-                                            target="div-thsp",
-                                            placement="right",
-                                        ),
-                                        dcc.Slider(
-                                            id="slider-thsp",
-                                            min=7,
-                                            max=21,
-                                            value=21,
-                                            step=0.1,
-                                            tooltip={"always_visible": True},
-                                        ),
-                                    ],
-                                    id="div-thsp",
-                                ),
-                                html.Div(
-                                    [
-                                        html.H6("Critical"),
-                                        dbc.Tooltip(
-                                            "Time spent hospitalized before turning critical.",
-                                            target="div-tcrt",
-                                            placement="right",
-                                        ),
-                                        dcc.Slider(
-                                            id="slider-tcrt",
-                                            min=1,
-                                            max=14,
-                                            value=7,
-                                            step=0.1,
-                                            tooltip={"always_visible": True},
-                                        ),
-                                    ],
-                                    id="div-tcrt",
-                                ),
-                                html.Div(
-                                    [
-                                        html.H6("Self-Recovery"),
-                                        dbc.Tooltip(
-                                            "Self-Recovery time for non-disclosed cases.",
-                                            target="div-trec",
-                                            placement="right",
-                                        ),
-                                        dcc.Slider(
-                                            id="slider-trec",
-                                            min=7,
-                                            max=21,
-                                            value=21,
-                                            step=0.1,
-                                            tooltip={"always_visible": True},
-                                        ),
-                                    ],
-                                    id="div-trec",
-                                ),
-                                html.Div(
-                                    [
-                                        html.H6("Quarantine"),
-                                        dbc.Tooltip(
-                                            "Quarantine time under regulation.",
-                                            target="div-tqar",
-                                            placement="right",
-                                        ),
-                                        dcc.Slider(
-                                            id="slider-tqar",
-                                            min=4,
-                                            max=21,
-                                            value=21,
-                                            step=0.1,
-                                            tooltip={"always_visible": True},
-                                        ),
-                                    ],
-                                    id="div-tqar",
-                                ),
-                                html.Div(
-                                    [
-                                        html.H6("Quarantined, then Hospitalised"),
-                                        dbc.Tooltip(
-                                            "Time interval between the last COVID-19 positive result until getting hospitalized.",
-                                            target="div-tqah",
-                                            placement="right",
+                                        id="up",
+                                        style={"padding": "2% 0", "font-style": "bold"},
+                                    ),
+                                    dbc.Tooltip(
+                                        "You can import your json file that you have exported previously, rather than having to readjust inputs all over again",
+                                        target="div-up",
+                                        placement="right",
+                                    ),
+                                ],
+                                id="div-up",
+                            ),
+                            html.Div(
+                                [
+                                    dcc.Upload(
+                                        html.Button(
+                                            ["\f Upload .csv stats for comparing"],
+                                            style={
+                                                "color": "white",
+                                                "margin": "2% 0",
+                                                "width": "100%",
+                                            },
                                         ),
-                                        dcc.Slider(
-                                            id="slider-tqah",
-                                            min=0,
-                                            max=5,
-                                            value=2,
-                                            step=0.1,
-                                            tooltip={"always_visible": True},
+                                        id="up_stat",
+                                        style={"padding": "0% 0", "font-style": "bold"},
+                                    ),
+                                    dbc.Tooltip(
+                                        html.Ul(
+                                            [
+                                                html.H6(
+                                                    'You can upload a csv file of real statistics to compare. The device will find any matching columns and add them to the plot for comparison. With a "date" column, rows are placed on the calendar (rows of the same date of different regions are added up, unless a region is picked below; weekly "daily_infected" counts are spread over their days, and the other columns are interpolated between rows); otherwise the 1st row is the 1st day of outbreak. The following column names can be selected:'
+                                                ),
+                                                html.Li("infected"),
+                                                html.Li("daily_infected"),
+                                                html.Li("active_critical"),
+                                                html.Li("active_quarantined"),
+                                                html.Li("deaths"),
+                                            ],
+                                            style={"text-align": "left"},
                                         ),
-                                    ],
-                                    id="div-tqah",
-                                ),
-                            ],
-                            id="collapse-t",
-                            style=tab,
-                        ),
-                        # Input uploader
-                        html.Div(
-                            [
-                                dcc.Upload(
-                                    html.Button(
-                                        ["\f Upload custom .json input file"],
-                                        style={
-                                            "color": "white",
-                                            "margin": "2% 0",
-                                            "width": "100%",
-                                        },
+                                        target="div-up-stat",
+                                        placement="right",
+                                    ),
+                                    html.P(id="err", style={"color": "red"}),
+                                    dcc.Store(id="stat-key"),
+                                    dcc.Dropdown(
+                                        options=[],
+                                        placeholder="All regions of the statistics",
+                                        id="stat-region",
+                                    ),
+                                ],
+                                id="div-up-stat",
+                            ),
+                        ],
+                        style={
+                            "width": "33%",
+                            "display": "inline-block",
+                            "vertical-align": "top",
+                            "padding": "2%",
+                        },
+                    ),
+                    # Output
+                    html.Div(
+                        [
+                            # Modes and sample picker
+                            html.Div(
+                                [
+                                    dcc.Checklist(
+                                        options=[
+                                            {
+                                                "label": "Show Hospital Capacity",
+                                                "value": 1,
+                                            },
+                                            {
+                                                "label": "Show Quarantine Capacity",
+                                                "value": 3,
+                                            },
+                                            {"label": "Show by Date", "value": 2},
+                                        ],
+                                        value=[],
+                                        labelStyle={"display": "block"},
+                                        id="mods",
+                                    )
+                                ],
+                                style={
+                                    "padding": "0% 3%",
+                                    "display": "inline-block",
+                                    "width": "35%",
+                                },
+                            ),
+                            html.Div(
+                                [
+                                    dcc.Dropdown(
+                                        options=[
+                                            {"label": p.name, "value": p.key}
+                                            for p in presets
+                                        ],
+                                        placeholder="Select an example region",
+                                        id="init",
+                                    )
+                                ],
+                                style={
+                                    "padding": "0% 3%",
+                                    "display": "inline-block",
+                                    "width": "55%",
+                                },
+                            ),
+                            # Other scenarios to overlay
+                            html.Div(
+                                [
+                                    dcc.Dropdown(
+                                        options=overlay_options({}),
+                                        value=[],
+                                        multi=True,
+                                        placeholder="Overlay other scenarios for comparison",
+                                        id="overlay",
                                     ),
-                                    id="up",
-                                    style={"padding": "2% 0", "font-style": "bold"},
-                                ),
-                                dbc.Tooltip(
-                                    "You can import your json file that you have exported previously, rather than having to readjust inputs all over again",
-                                    target="div-up",
-                                    placement="right",
-                                ),
-                            ],
-                            id="div-up",
-                        ),
-                        html.Div(
-                            [
-                                dcc.Upload(
-                                    html.Button(
-                                        ["\f Upload .csv stats for comparing"],
-                                        style={
-                                            "color": "white",
-                                            "margin": "2% 0",
-                                            "width": "100%",
-                                        },
+                                    dcc.Upload(
+                                        html.Button(
+                                            ["\f Upload .json inputs to overlay"],
+                                            style={
+                                                "color": "white",
+                                                "margin": "2% 0",
+                                                "width": "100%",
+                                            },
+                                        ),
+                                        id="up_overlay",
+                                        multiple=True,
                                     ),
-                                    id="up_stat",
-                                    style={"padding": "0% 0", "font-style": "bold"},
-                                ),
-                                dbc.Tooltip(
-                                    html.Ul(
+                                    dcc.Store(id="overlay-store", data={}),
+                                ],
+                                style={"padding": "1% 3%"},
+                            ),
+                            # Plots
+                            html.Div(
+                                [
+                                    dcc.Graph(id="overall-plot"),
+                                ],
+                                style={
+                                    "vertical-align": "top",
+                                    "border-style": "outset",
+                                    "margin": "1% 0%",
+                                },
+                            ),
+                            html.Div(
+                                [
+                                    dcc.Graph(id="fatal-plot"),
+                                ],
+                                style={
+                                    "vertical-align": "top",
+                                    "border-style": "outset",
+                                    "margin": "1% 0%",
+                                },
+                            ),
+                            html.Div(
+                                [
+                                    dcc.Graph(id="r0-plot"),
+                                ],
+                                style={
+                                    "vertical-align": "top",
+                                    "border-style": "outset",
+                                    "margin": "1% 0%",
+                                },
+                            ),
+                            # File downloader
+                            html.Div(
+                                [
+                                    html.Div(
                                         [
-                                            html.H6(
-                                                "You can upload a csv file of real statistics to compare. The device will find any matching columns and add them to the plot for comparison (assuming 1st row is 1st day of outbreak). The following column names can be selected:"
+                                            html.H2("Download Statistics"),
+                                            dcc.Input(
+                                                id="file",
+                                                value="",
+                                                type="text",
+                                                placeholder="Specify exported file name (default: "
+                                                "exported_stats"
+                                                ")",
+                                                style={"width": "100%"},
+                                            ),
+                                            html.Button(
+                                                "Statistics Data (.csv)",
+                                                id="btn_csv",
+                                                style={
+                                                    "color": "white",
+                                                    "margin": "2%",
+                                                },
                                             ),
-                                            html.Li("infected"),
-                                            html.Li("daily_infected"),
-                                            html.Li("active_critical"),
-                                            html.Li("active_quarantined"),
-                                            html.Li("deaths"),
+                                            dcc.Download(id="download-dataframe-csv"),
+                                            html.Button(
+                                                "Information Summary (.txt)",
+                                                id="btn_sum",
+                                                style={
+                                                    "color": "white",
+                                                    "margin": "2%",
+                                                },
+                                            ),
+                                            dcc.Download(id="download-sum"),
+                                            html.Button(
+                                                "Export Inputs (.json)",
+                                                id="btn_ipt",
+                                                style={
+                                                    "color": "white",
+                                                    "margin": "2%",
+                                                },
+                                            ),
+                                            dcc.Download(id="download-ipt"),
                                         ],
-                                        style={"text-align": "left"},
-                                    ),
-                                    target="div-up-stat",
-                                    placement="right",
-                                ),
-                                html.P(id="err", style={"color": "red"}),
-                            ],
-                            id="div-up-stat",
-                        ),
-                    ],
-                    style={
-                        "width": "33%",
-                        "display": "inline-block",
-                        "vertical-align": "top",
-                        "padding": "2%",
-                    },
-                ),
-                # Output
-                html.Div(
-                    [
-                        # Modes and sample picker
-                        html.Div(
-                            [
-                                dcc.Checklist(
-                                    options=[
-                                        {"label": "Show Hospital Capacity", "value": 1},
-                                        {
-                                            "label": "Show Quarantine Capacity",
-                                            "value": 3,
+                                        style={
+                                            "padding": "2% 3%",
+                                            "display": "inline-block",
+                                            "vertical-align": "bottom",
+                                            "text-align": "center",
+                                            "width": "100%",
                                         },
-                                        {"label": "Show by Date", "value": 2},
-                                    ],
-                                    value=[],
-                                    labelStyle={"display": "block"},
-                                    id="mods",
-                                )
-                            ],
-                            style={
-                                "padding": "0% 3%",
-                                "display": "inline-block",
-                                "width": "35%",
-                            },
-                        ),
-                        html.Div(
-                            [
-                                dcc.Dropdown(
-                                    options=[
-                                        {"label": sample.name[n], "value": n}
-                                        for n in sample.name.keys()
-                                    ],
-                                    placeholder="Select an example region",
-                                    id="init",
-                                )
-                            ],
-                            style={
-                                "padding": "0% 3%",
-                                "display": "inline-block",
-                                "width": "55%",
-                            },
-                        ),
-                        # Plots
-                        html.Div(
-                            [
-                                dcc.Graph(id="overall-plot"),
-                            ],
-                            style={
-                                "vertical-align": "top",
-                                "border-style": "outset",
-                                "margin": "1% 0%",
-                            },
-                        ),
-                        html.Div(
-                            [
-                                dcc.Graph(id="fatal-plot"),
-                            ],
-                            style={
-                                "vertical-align": "top",
-                                "border-style": "outset",
-                                "margin": "1% 0%",
-                            },
-                        ),
-                        html.Div(
-                            [
-                                dcc.Graph(id="r0-plot"),
-                            ],
-                            style={
-                                "vertical-align": "top",
-                                "border-style": "outset",
-                                "margin": "1% 0%",
-                            },
-                        ),
-                        # File downloader
-                        html.Div(
-                            [
-                                html.Div(
-                                    [
-                                        html.H2("Download Statistics"),
-                                        dcc.Input(
-                                            id="file",
-                                            value="",
-                                            type="text",
-                                            placeholder="Specify exported file name (default: "
-                                            "exported_stats"
-                                            ")",
-                                            style={"width": "100%"},
-                                        ),
-                                        html.Button(
-                                            "Statistics Data (.csv)",
-                                            id="btn_csv",
-                                            style={"color": "white", "margin": "2%"},
-                                        ),
-                                        dcc.Download(id="download-dataframe-csv"),
-                                        html.Button(
-                                            "Information Summary (.txt)",
-                                            id="btn_sum",
-                                            style={"color": "white", "margin": "2%"},
-                                        ),
-                                        dcc.Download(id="download-sum"),
-                                        html.Button(
-                                            "Export Inputs (.json)",
-                                            id="btn_ipt",
-                                            style={"color": "white", "margin": "2%"},
-                                        ),
-                                        dcc.Download(id="download-ipt"),
-                                    ],
-                                    style={
-                                        "padding": "2% 3%",
-                                        "display": "inline-block",
-                                        "vertical-align": "bottom",
-                                        "text-align": "center",
-                                        "width": "100%",
-                                    },
-                                ),
-                            ],
-                            style={
-                                "vertical-align": "top",
-                                "border-style": "outset",
-                                "margin": "1% 0%",
-                            },
-                        ),
-                    ],
-                    style={
-                        "width": "66%",
-                        "display": "inline-block",
-                        "vertical-align": "top",
-                        "margin": "1% 0%",
-                    },
-                ),
-            ]
-        )
-    ]
+                                    ),
+                                ],
+                                style={
+                                    "vertical-align": "top",
+                                    "border-style": "outset",
+                                    "margin": "1% 0%",
+                                },
+                            ),
+                        ],
+                        style={
+                            "width": "66%",
+                            "display": "inline-block",
+                            "vertical-align": "top",
+                            "margin": "1% 0%",
+                        },
+                    ),
+                ]
+            )
+        ]
+    )
+
+
+# Number of stages shown initially, and largest number of stages
+DEFAULT_STAGES = 3
+MAX_STAGES = 30
+
+# Default values for up to 30 stages
+# fmt: off
+DEFAULT_DAY = (
+    6, 20, 30, 49, 55, 60, 69, 70, 80, 85, 90, 95, 100, 105, 110,
+    115, 120, 125, 130, 135, 140, 145, 145, 145, 145, 145, 145, 145, 145, 145,
+)
+DEFAULT_DELTA_R0 = (1.5,) + (1,) * 29
+DEFAULT_PCONT = (
+    0.1, 0.4, 0.6, 0.8, 0.8, 0.85, 0.9, 0.9, 0.95, 1, 0.9, 0.9, 0.95, 1, 0.9,
+    0.9, 0.95, 1, 0.9, 0.9, 0.95, 1, 0.9, 0.9, 0.95, 1, 0.9, 0.9, 0.95, 1,
 )
+# fmt: on
+
+# Styles of the shown and hidden stage inputs
+STAGE_STYLE = {"border-style": "outset", "margin": "1%", "padding": "1%"}
+HIDDEN_STAGE_STYLE = dict(STAGE_STYLE, display="none")
+
+
+def stage_data(n, day, delta_r0, pcont, schedules=None):
+    r"""
+    Content of the ``stages`` store: the number of stages and the values of
+    the first ``n`` stages, in the json input file keys, and the parameter
+    schedules of the loaded file, which have no inputs of their own.
+    """
+    data = {
+        "n_r0": n,
+        "day": list(day[:n]),
+        "delta_r0": list(delta_r0[:n]),
+        "pcont": list(pcont[:n]),
+    }
+    if schedules:
+        data["schedules"] = schedules
+    return data
+
+
+def stage_input(i, day, delta_r0, pcont, visible=True):
+    r"""
+    Generate the input slots of a single stage.
+
+    Parameters
+    ----------
+    i : `int`
+        Index of the stage.
+    day : `int`
+        Starting date of the stage.
+    delta_r0 : `float`
+        R0 reduction of the stage.
+    pcont : `float`
+        Contained proportion of the stage.
+    visible : `bool`
+        Whether the stage is shown.
+
+    Returns
+    -------
+    stage : `dash_html_components.Div`
+        A Div of HTML Elements holding the stage inputs.
+    """
+    return html.Div(
+        [
+            html.H5(f"Stage {i+1}:"),
+            html.Div(
+                [
+                    html.H6("Starting Date"),
+                    dcc.Input(
+                        id={"role": "day", "index": i},
+                        min=1,
+                        max=1000,
+                        value=day,
+                        step=1,
+                        type="number",
+                        style={"width": "80%"},
+                    ),
+                ],
+                style={"width": "33%", "display": "inline-block"},
+            ),
+            html.Div(
+                [
+                    html.H6("R0 Reduction"),
+                    dcc.Input(
+                        id={"role": "r0", "index": i},
+                        value=delta_r0,
+                        step=0.1,
+                        type="number",
+                        style={"width": "100%"},
+                    ),
+                ],
+                style={
+                    "width": "28%",
+                    "display": "inline-block",
+                    "margin": "0 5% 0 0",
+                },
+            ),
+            html.Div(
+                [
+                    html.H6("Contained Proportion"),
+                    dcc.Slider(
+                        id={"role": "pcont", "index": i},
+                        min=0,
+                        max=1,
+                        value=pcont,
+                        step=0.01,
+                        tooltip={"always_visible": False},
+                        marks={0: "0", 1: "1"},
+                    ),
+                ],
+                style={"width": "33%", "display": "inline-block"},
+            ),
+        ],
+        id={"role": "stage", "index": i},
+        style=STAGE_STYLE if visible else HIDDEN_STAGE_STYLE,
+    )
 
 
-# Dynamically creating stage inputs
+# Editing the stage inputs
 @app.callback(
-    Output("in-r0", "children"),
+    Output("stages", "data"),
+    Output({"role": "stage", "index": ALL}, "style"),
+    Output({"role": "day", "index": ALL}, "value"),
+    Output({"role": "r0", "index": ALL}, "value"),
+    Output({"role": "pcont", "index": ALL}, "value"),
+    Input("num", "value"),
     Input("init", "value"),
-    [Input("num", "value")],
-    [Input("up", "contents")],
+    Input("up", "contents"),
+    Input("opt-pick", "value"),
+    Input({"role": "day", "index": ALL}, "value"),
+    Input({"role": "r0", "index": ALL}, "value"),
+    Input({"role": "pcont", "index": ALL}, "value"),
     State("up", "filename"),
+    State("opt-store", "data"),
+    State("stages", "data"),
+    prevent_initial_call=True,
 )
-def ins_generate(init, n, content, file):
+@profiled()
+def edit_stages(n, init, content, pick, day, delta_r0, pcont, file, schedules, stored):
     r"""
-    Generate dynamic stage inputs based on number of stages, either from file or from input.
-    Triggered when there is change in at least 1 variable.
+    Keep the stage store in step with the stage inputs, and fill the stage
+    inputs from a sample region, an uploaded file or an optimised schedule.
+
+    Only the stages whose visibility or values change are sent back, and the
+    store is written once per change, so that each change solves once.
 
     Parameters
     ----------
-    init : `str`
-        Chosen sample region.
     n : `int`
         Number of stages.
+    init : `str`
+        Chosen sample region.
     content : `base64`
         File content, encoded to base64.
+    pick : `int`
+        Chosen optimised schedule.
+    day, delta_r0, pcont : :class:`list`
+        Current values of every stage input, shown or not.
     file : `str`
         File name.
+    schedules : :class:`list`
+        Optimised schedules.
+    stored : `dict`
+        Current content of the stage store.
 
     Returns
     -------
-    stages : :class:`list`
-        A list of HTML Elements with pre-defined values for the stage inputs.
+    stages : `dict`
+        New content of the stage store, see :func:`stage_data`.
+    styles, days, delta_r0s, pconts : :class:`list`
+        New style and values of each stage input, `dash.no_update` where
+        they do not change.
     """
-    # Check which input is changing
-    ctx = dash.callback_context.triggered
-    current_call = [] if not ctx else ctx[0]["prop_id"].split(".")[0]
-
-    # If it's only changing in irrelevant variables, set to default
-    if (not file or "up" not in current_call) and "init" not in current_call:
-        # Default values for up to 30 stages
-        d = [
-            6,
-            20,
-            30,
-            49,
-            55,
-            60,
-            69,
-            70,
-            80,
-            85,
-            90,
-            95,
-            100,
-            105,
-            110,
-            115,
-            120,
-            125,
-            130,
-            135,
-            140,
-            145,
-            145,
-            145,
-            145,
-            145,
-            145,
-            145,
-            145,
-            145,
-        ]
-        dr = [
-            1.5,
-            1,
-            1,
-            1,
-            1,
-            1,
-            1,
-            1,
-            1,
-            1,
-            1,
-            1,
-            1,
-            1,
-            1,
-            1,
-            1,
-            1,
-            1,
-            1,
-            1,
-            1,
-            1,
-            1,
-            1,
-            1,
-            1,
-            1,
-            1,
-            1,
-        ]
-        pco = [
-            0.1,
-            0.4,
-            0.6,
-            0.8,
-            0.8,
-            0.85,
-            0.9,
-            0.9,
-            0.95,
-            1,
-            0.9,
-            0.9,
-            0.95,
-            1,
-            0.9,
-            0.9,
-            0.95,
-            1,
-            0.9,
-            0.9,
-            0.95,
-            1,
-            0.9,
-            0.9,
-            0.95,
-            1,
-            0.9,
-            0.9,
-            0.95,
-            1,
-        ]
-        return [
-            html.Div(
-                [
-                    html.H5(f"Stage {i+1}:"),
-                    html.Div(
-                        [
-                            html.H6("Starting Date"),
-                            dcc.Input(
-                                id={"role": "day", "index": i},
-                                min=1,
-                                max=1000,
-                                value=d[i],
-                                step=1,
-                                type="number",
-                                style={"width": "80%"},
-                            ),
-                        ],
-                        style={"width": "33%", "display": "inline-block"},
-                    ),
-                    html.Div(
-                        [
-                            html.H6("R0 Reduction"),
-                            dcc.Input(
-                                id={"role": "r0", "index": i},
-                                value=dr[i],
-                                step=0.1,
-                                type="number",
-                                style={"width": "100%"},
-                            ),
-                        ],
-                        style={
-                            "width": "28%",
-                            "display": "inline-block",
-                            "margin": "0 5% 0 0",
-                        },
-                    ),
-                    html.Div(
-                        [
-                            html.H6("Contained Proportion"),
-                            dcc.Slider(
-                                id={"role": "pcont", "index": i},
-                                min=0,
-                                max=1,
-                                value=pco[i],
-                                step=0.01,
-                                tooltip={"always_visible": False},
-                                marks={0: "0", 1: "1"},
-                            ),
-                        ],
-                        style={"width": "33%", "display": "inline-block"},
-                    ),
-                ],
-                style={"border-style": "outset", "margin": "1%", "padding": "1%"},
-            )
-            for i in range(n)
-        ]
-
-    # Choosing which to change the stage inputs, by finding out the triggered component
-    json_stage = ["delta_r0", "pcont", "day", "n_r0"]
-    # If it's sample that is looked for, use the inputs from sample file
-    if current_call == "init":
-        jf = json.loads(sample.loc[init])
-    # If it's a file, use the inputs from it
-    else:
+    triggered = {t["prop_id"].split(".")[0] for t in dash.callback_context.triggered}
+    unchanged = [dash.no_update] * MAX_STAGES
+    values = [unchanged, unchanged, unchanged]
+
+    # Values loaded from a sample region, a file or an optimised schedule.
+    # Parameter schedules come with the region or file, and are kept otherwise
+    jf = None
+    scheduled = stored.get("schedules")
+    if "opt-pick" in triggered and pick is not None and pick >= 0 and schedules:
+        jf = schedules[pick]
+    if "init" in triggered:
+        jf = presets.get(init).scenario.to_dict()
+        scheduled = jf.get("schedules")
+    elif "up" in triggered and file:
         _, content_string = content.split(",")
-        decoded = base64.b64decode(content_string)
-        jf = json.loads(decoded)
-
-        # Handling wrong formatting cases
-
-        # Irrelevant attributes
-        for i in json_stage:
-            if i not in jf:
-                return dash.no_update
-        # Inconsistent number of stage variables
-        if len(jf["day"]) != len(jf["delta_r0"]) or len(jf["day"]) != len(jf["pcont"]):
-            return dash.no_update
-
-    return [
-        html.Div(
-            [
-                html.H5(f"Stage {i+1}:"),
-                html.Div(
-                    [
-                        html.H6("Starting Date"),
-                        dcc.Input(
-                            id={"role": "day", "index": i},
-                            min=1,
-                            max=1000,
-                            value=jf["day"][i],
-                            step=1,
-                            type="number",
-                            style={"width": "80%"},
-                        ),
-                    ],
-                    style={"width": "33%", "display": "inline-block"},
-                ),
-                html.Div(
-                    [
-                        html.H6("R0 Reduction"),
-                        dcc.Input(
-                            id={"role": "r0", "index": i},
-                            value=jf["delta_r0"][i],
-                            step=0.1,
-                            type="number",
-                            style={"width": "100%"},
-                        ),
-                    ],
-                    style={
-                        "width": "28%",
-                        "display": "inline-block",
-                        "margin": "0 5% 0 0",
-                    },
-                ),
-                html.Div(
-                    [
-                        html.H6("Contained Proportion"),
-                        dcc.Slider(
-                            id={"role": "pcont", "index": i},
-                            min=0,
-                            max=1,
-                            value=jf["pcont"][i],
-                            step=0.01,
-                            tooltip={"always_visible": False},
-                            marks={0: "0", 1: "1"},
-                        ),
-                    ],
-                    style={"width": "33%", "display": "inline-block"},
-                ),
-            ],
-            style={"border-style": "outset", "margin": "1%", "padding": "1%"},
+        try:
+            jf = Scenario.from_json(base64.b64decode(content_string), strict=True)
+        except ValueError:
+            raise PreventUpdate
+        jf = jf.to_dict()
+        scheduled = jf.get("schedules")
+
+    if jf is not None:
+        n = len(jf["day"])
+        loaded = [jf["day"], jf["delta_r0"], jf["pcont"]]
+        values = [list(v) + unchanged[len(v) :] for v in loaded]
+        day, delta_r0, pcont = (
+            list(v) + current[len(v) :]
+            for v, current in zip(loaded, (day, delta_r0, pcont))
         )
-        for i in range(jf["n_r0"])
+    n = min(max(int(n or 0), 0), MAX_STAGES)
+
+    shown = stored["n_r0"]
+    styles = [
+        (
+            (STAGE_STYLE if i < n else HIDDEN_STAGE_STYLE)
+            if min(n, shown) <= i < max(n, shown)
+            else dash.no_update
+        )
+        for i in range(MAX_STAGES)
     ]
+    data = stage_data(n, day, delta_r0, pcont, scheduled)
+    if data == stored:
+        data = dash.no_update
+    return [data, styles] + values
 
 
 @app.callback(
@@ -1371,6 +1542,7 @@ def ins_generate(init, n, content, file):
     [Input(f"collapse-button{i}", "n_clicks") for i in ["", "-p", "-t"]],
     [State(f"collapse{i}", "is_open") for i in ["", "-p", "-t"]],
 )
+@profiled()
 def toggle_accordion(n1, n2, n3, is_open1, is_open2, is_open3):
     r"""
     Toggle Open/Close of input groups.
@@ -1405,6 +1577,201 @@ def toggle_accordion(n1, n2, n3, is_open1, is_open2, is_open3):
     return False, False, False
 
 
+# Search stage schedules within capacity
+@app.callback(
+    Output("opt-store", "data"),
+    Output("opt-pick", "options"),
+    Output("opt-pick", "value"),
+    Input("btn_opt", "n_clicks"),
+    State("slider-N", component_property="value"),
+    State("stages", "data"),
+    State("slider-r0", component_property="value"),
+    State("date", component_property="date"),
+    State("ndate", "value"),
+    State("hcap", component_property="value"),
+    State("hqar", component_property="value"),
+    State("slider-tinc", component_property="value"),
+    State("slider-tinf", component_property="value"),
+    State("slider-ticu", component_property="value"),
+    State("slider-thsp", component_property="value"),
+    State("slider-tcrt", component_property="value"),
+    State("slider-trec", component_property="value"),
+    State("slider-tqar", component_property="value"),
+    State("slider-tqah", component_property="value"),
+    State("slider-pquar", component_property="value"),
+    State("slider-pcross", component_property="value"),
+    State("slider-pqhsp", component_property="value"),
+    State("slider-pj", component_property="value"),
+    State("slider-ph", component_property="value"),
+    State("slider-pc", component_property="value"),
+    State("slider-pf", component_property="value"),
+    prevent_initial_call=True,
+)
+@profiled()
+def run_optimizer(n_clicks, N, stages, r0, *inputs):
+    r"""
+    Search the least restrictive stage schedules that stay within capacity.
+
+    Parameters
+    ----------
+    n_clicks : `int`
+        Clicks on the optimise button.
+    N : `int`
+        Population.
+    stages : `dict`
+        Content of the stage store.
+    r0 : `float`
+        Basic reproduction number.
+    *inputs : `numbers`
+        Other current inputs, in the order of the json input file.
+
+    Returns
+    -------
+    schedules : :class:`list`
+        Best schedules, then the trade-off frontier.
+    options : :class:`list`
+        Dropdown options describing each schedule.
+    pick : `None`
+        Clears the previous choice.
+    """
+    from seiqhcdro.optimize import optimize
+
+    try:
+        scenario = Scenario.from_dict(
+            dict(zip(Scenario._fields[6:], inputs), N=N, r0=r0, **stages)
+        )
+        # Serial in the web worker: the process pool of seiqhcdro.batch is
+        # forked, and would copy the threads and open handles of the server.
+        # Larger searches run in parallel as "optimize" jobs, in spawned
+        # processes of the job queue
+        result = optimize(scenario, n_candidates=32, rounds=3, seed=0, parallel=False)
+    except (ValueError, TypeError) as e:
+        return None, [{"label": f"Error: {e}", "value": -1, "disabled": True}], None
+
+    schedules, options = [], []
+    for kind, candidates in (
+        ("Least restrictive", result.best),
+        ("Trade-off", result.frontier),
+    ):
+        for i, c in enumerate(candidates):
+            options.append(
+                {
+                    "label": f"{kind} {i + 1}: {c.restriction:.0%} average R0 reduction, "
+                    f"{c.hospitalised:,.0f} hospitalised, {c.quarantined:,.0f} quarantined",
+                    "value": len(schedules),
+                }
+            )
+            schedules.append(
+                {
+                    "day": list(c.scenario.day),
+                    "delta_r0": list(c.scenario.delta_r0),
+                    "pcont": list(c.scenario.pcont),
+                }
+            )
+    if not schedules:
+        options = [
+            {
+                "label": f"No schedule within capacity among {result.evaluated} tried",
+                "value": -1,
+                "disabled": True,
+            }
+        ]
+    return schedules, options, None
+
+
+# Read scenarios uploaded for overlaying
+@app.callback(
+    Output("overlay-store", "data"),
+    Output("overlay", "options"),
+    Output("overlay", "value"),
+    Input("up_overlay", "contents"),
+    State("up_overlay", "filename"),
+    State("overlay-store", "data"),
+    State("overlay", "value"),
+    prevent_initial_call=True,
+)
+@profiled()
+def store_overlays(contents, filenames, uploaded, selected):
+    r"""
+    Read uploaded .json input files and add them to the scenarios to overlay.
+
+    Parameters
+    ----------
+    contents : :class:`list`
+        File contents, encoded to base64.
+    filenames : :class:`list`
+        File names.
+    uploaded : `dict`
+        Scenarios uploaded so far, by file name.
+    selected : :class:`list`
+        Scenarios currently overlaid.
+
+    Returns
+    -------
+    uploaded : `dict`
+        Scenarios uploaded so far, including the new ones.
+    options : :class:`list`
+        Dropdown options of scenarios to overlay.
+    selected : :class:`list`
+        Scenarios overlaid, with the new ones selected.
+    """
+    uploaded = dict(uploaded or {})
+    selected = list(selected or [])
+    for content, filename in zip(contents or [], filenames or []):
+        _, content_string = content.split(",")
+        try:
+            scenario = Scenario.from_json(base64.b64decode(content_string))
+        except Exception as e:
+            print(e)
+            continue
+        uploaded[filename] = scenario.to_dict()
+        if "upload:" + filename not in selected:
+            selected.append("upload:" + filename)
+    return uploaded, overlay_options(uploaded), selected
+
+
+# Parse uploaded comparison statistics once
+@app.callback(
+    Output("stat-key", "data"),
+    Output("stat-region", "options"),
+    Output("stat-region", "value"),
+    Input("up_stat", "contents"),
+    State("up_stat", "filename"),
+)
+@profiled()
+def store_stats(contents, filename):
+    r"""
+    Parse an uploaded csv file of statistics and store it server-side.
+    Only the returned key is sent to the plotting callback afterwards.
+
+    Parameters
+    ----------
+    contents : `base64`
+        File content, encoded to base64.
+    filename : `str`
+        File name.
+
+    Returns
+    -------
+    key : `str`
+        Content hash of the stored statistics, or `None` if there is no valid file.
+    options : `list`
+        Regions of the statistics, to compare with one of them only.
+    region : `None`
+        Reset region choice, i.e. all regions.
+    """
+    if not contents or not filename or "csv" not in filename:
+        return None, [], None
+    _, content_string = contents.split(",")
+    try:
+        key = observed.ingest(base64.b64decode(content_string))
+        options = [{"label": r, "value": r} for r in observed.regions(key)]
+        return key, options, None
+    except Exception as e:
+        print(e)
+        return None, [], None
+
+
 @app.callback(
     Output("overall-plot", "figure"),
     Output("fatal-plot", "figure"),
@@ -1413,11 +1780,8 @@ def toggle_accordion(n1, n2, n3, is_open1, is_open2, is_open3):
     Output("download-sum", "data"),
     Output("download-ipt", "data"),
     Input("slider-N", component_property="value"),
-    Input("num", "value"),
+    Input("stages", "data"),
     Input("slider-r0", component_property="value"),
-    [Input({"role": "r0", "index": ALL}, component_property="value")],
-    [Input({"role": "pcont", "index": ALL}, component_property="value")],
-    [Input({"role": "day", "index": ALL}, component_property="value")],
     Input("date", component_property="date"),
     Input("ndate", "value"),
     Input("hcap", component_property="value"),
@@ -1442,17 +1806,20 @@ def toggle_accordion(n1, n2, n3, is_open1, is_open2, is_open3):
     Input("btn_ipt", "n_clicks"),
     Input("mods", component_property="value"),
     Input("file", component_property="value"),
-    Input("up_stat", "contents"),
-    State("up_stat", "filename"),
+    Input("stat-key", "data"),
+    Input("stat-region", "value"),
+    Input("overlay", "value"),
+    Input("overall-plot", "relayoutData"),
+    Input("fatal-plot", "relayoutData"),
+    Input("r0-plot", "relayoutData"),
+    State("overlay-store", "data"),
     prevent_initial_call=True,
 )
+@profiled()
 def update_graph(
     N,
-    n_r0,
+    stages,
     r0,
-    delta_r0,
-    pcont,
-    day,
     date,
     ndate,
     hcap,
@@ -1477,8 +1844,13 @@ def update_graph(
     sigma_duck,
     mod,
     file,
-    contents,
-    filename,
+    stat_key,
+    stat_region,
+    overlay,
+    overall_zoom,
+    fatal_zoom,
+    r0_zoom,
+    uploaded,
 ):
     r"""
     Produce/change output plot. Triggered on open, or when any variable changes.
@@ -1497,134 +1869,93 @@ def update_graph(
         Exported file for download, if requested
     """
 
-    def R0_dynamic(t):
-        r"""
-        Get R0 based on day and stage inputs.
-
-        Parameters
-        ----------
-        t : `int`
-            Number of days passed since initial outbreak.
-
-        Returns
-        -------
-        r0 : `float`
-            Corresponding reproductive number.
-        """
-        # Default stage when created initially
-        if not delta_r0 or not pcont or not day:
-            return 4.1
-        # No change yet: Keep to default
-        elif t < day[0]:
-            return r0
-        else:
-            i = 0
-            # Check which stage t is in
-            while t >= day[i]:
-                if (i == len(day) - 1) or (t < day[i + 1]):
-                    break
-                i += 1
-            # Initial stage
-            if i == 0:
-                return (
-                    r0 * (1 - pcont[0])
-                    - 2 * delta_r0[0] / 30 * (t - (day[0] - 1)) * pcont[0]
-                )
-            else:
-                # Recursively call the function, as R0 works in a similar fashion to Hidden Markov Model
-                # If there is increase in proportion contamination (See formula for details)
-                if pcont[i] >= pcont[i - 1]:
-                    return max(
-                        min(R0_dynamic(day[i] - 1), r0 * (1 - pcont[i]))
-                        - 2 * delta_r0[i] / 30 * (t - (day[i] - 1)) * pcont[i],
-                        0,
-                    )
-                # If there is decrease in proportion contamination (See formula for details)
-                else:
-                    if min(R0_dynamic(day[i] - 1), r0 * (1 - pcont[i])) > 0:
-                        return min(
-                            R0_dynamic(day[i] - 1), r0 * (1 - pcont[i])
-                        ) + 2 * delta_r0[i] / 30 * (t - (day[i] - 1)) * (1 - pcont[i])
-                    else:
-                        return 0.0
-
-    # Open up comparison csv file, if there is one
+    # Relayouts other than zooming do not change the plots
+    ctx = dash.callback_context.triggered
+    if ctx and ctx[0]["prop_id"].endswith(".relayoutData"):
+        if not any(k.startswith("xaxis") for k in ctx[0]["value"] or {}):
+            raise PreventUpdate
+
+    import pandas as pd
+    import plotly.graph_objs as go
+    from plotly.subplots import make_subplots
+
+    # Load the comparison statistics, if there are any
+    stage = Stages("update_graph")
+    stage("observed")
     compare = False
-    if contents:
-        _, content_string = contents.split(",")
-        decoded = base64.b64decode(content_string)
+    if stat_key:
         try:
-            if "csv" in filename:
-                df_compare = pd.read_csv(io.StringIO(decoded.decode("utf-8")))
-                compare = True
+            df_compare = observed.load(stat_key, stat_region).align(date, ndate)
+            compare = True
         except Exception as e:
             print(e)
 
     # Solve for output variables
-    args = (
-        R0_dynamic,
-        tinf,
-        tinc,
-        thsp,
-        tcrt,
-        ticu,
-        tqar,
-        tqah,
-        trec,
-        ph,
-        pc,
-        pf,
-        pj,
-        pquar,
-        pqhsp,
-        pcross,
-    )
-
-    n_infected = 1
-    initial_state = [(N - n_infected) / N, 0, n_infected / N, 0, 0, 0, 0, 0, 0]
-
-    sol = solve_ivp(
-        SEIQHCDRO_model,
-        [0, ndate],
-        initial_state,
-        args=args,
-        t_eval=np.arange(ndate + 1),
-        method="Radau",
+    stage("solve")
+    n_r0, delta_r0, pcont, day = (
+        stages[k] for k in ("n_r0", "delta_r0", "pcont", "day")
     )
-    S, E, I, Q, H, C, D, R, O = sol.y
+    # Inputs being edited, e.g. an emptied box, keep the current plots
+    try:
+        scenario = Scenario.from_dict(
+            {
+                "N": N,
+                "n_r0": n_r0,
+                "r0": r0,
+                "delta_r0": delta_r0,
+                "pcont": pcont,
+                "day": day,
+                "date": date,
+                "ndate": ndate,
+                "hcap": hcap,
+                "hqar": hqar,
+                "tinc": tinc,
+                "tinf": tinf,
+                "ticu": ticu,
+                "thsp": thsp,
+                "tcrt": tcrt,
+                "trec": trec,
+                "tqar": tqar,
+                "tqah": tqah,
+                "pquar": pquar,
+                "pcross": pcross,
+                "pqhsp": pqhsp,
+                "pj": pj,
+                "ph": ph,
+                "pc": pc,
+                "pf": pf,
+                "schedules": stages.get("schedules"),
+            }
+        )
+    except ValueError:
+        raise PreventUpdate
+    traj = presets.lookup(scenario)
+    if traj is None:
+        traj = simulate(scenario, method="auto", cache=solve_cache)
 
     # Show by days passed pr date?
+    stage("series")
     x_day = pd.date_range(date, periods=ndate + 1).tolist()
     x = x_day if 2 in mod else np.linspace(0, ndate, ndate + 1)
 
     # Infected, Hospitalised
-    ift = np.round((I + H + C + D + R + O) * N)
-    hsp = np.round((H + C + D + R) * N)
-    hsp_in = np.append(
-        [0], [hsp[i + 1] - hsp[i] if hsp[i + 1] > hsp[i] else 0 for i in range(ndate)]
-    )
-    ift_in = np.append(
-        [0], [ift[i + 1] - ift[i] if ift[i + 1] > ift[i] else 0 for i in range(ndate)]
-    )
-    for i in range(ndate):
-        hsp[i + 1] = hsp[i] + hsp_in[i]
-        ift[i + 1] = ift[i] + ift_in[i]
+    ift, ift_in = traj.infected, traj.daily_infected
+    hsp, hsp_in = traj.hospitalised, traj.daily_hospitalised
 
     # Critical, Dead
-    crt = np.round((C + D) * N)
-    ded = np.round(D * N)
-    crt_in = np.append(
-        [0], [crt[i + 1] - crt[i] if crt[i + 1] > crt[i] else 0 for i in range(ndate)]
-    )
-    ded_in = np.append(
-        [0], [ded[i + 1] - ded[i] if ded[i + 1] > ded[i] else 0 for i in range(ndate)]
-    )
+    crt, ded = traj.critical, traj.deaths
 
-    # Quarantine
-    qar = np.round((E + I + Q + H + C + D) * N)
+    # Sample zoomed-in windows between days, from the solver interpolants
+    def zoomed(relayout):
+        window = zoom_window(relayout, date, ndate)
+        if window is None:
+            return x, traj
+        t = np.union1d(traj.t, np.linspace(*window, ZOOM_POINTS))
+        x_fine = pd.Timestamp(date) + pd.to_timedelta(t, unit="D") if 2 in mod else t
+        return x_fine, traj.resample(t)
 
-    # R0
-    r0_trend = np.array([R0_dynamic(t) for t in np.linspace(0, ndate, ndate + 1)])
+    x1, traj1 = zoomed(fatal_zoom)
+    x2, traj2 = zoomed(r0_zoom)
 
     df = pd.DataFrame(
         {
@@ -1639,6 +1970,7 @@ def update_graph(
     )
 
     # Plotting
+    stage("figures")
     fig = make_subplots(
         rows=1,
         cols=2,
@@ -1673,6 +2005,7 @@ def update_graph(
         paper_bgcolor="rgba(0,0,0,0)",
         plot_bgcolor="rgb(61,61,61)",
         font=dict(color="rgb(174, 211, 210)"),
+        uirevision=f"{date} {ndate} {2 in mod}",
     )
     fig.update_xaxes(
         zerolinecolor="rgb(110,110,110)", gridwidth=1, gridcolor="rgb(100,100,100)"
@@ -1688,8 +2021,10 @@ def update_graph(
         y_title="Cases",
     )
 
-    fig1.add_trace(go.Scatter(x=x, y=crt - ded, name="Active ICU"), row=1, col=1)
-    fig1.add_trace(go.Scatter(x=x, y=ded, name="Deaths"), row=1, col=2)
+    fig1.add_trace(
+        go.Scatter(x=x1, y=traj1.active_icu, name="Active ICU"), row=1, col=1
+    )
+    fig1.add_trace(go.Scatter(x=x1, y=traj1.deaths, name="Deaths"), row=1, col=2)
 
     fig1.update_layout(
         title={
@@ -1703,6 +2038,7 @@ def update_graph(
         paper_bgcolor="rgba(0,0,0,0)",
         plot_bgcolor="rgb(61,61,61)",
         font=dict(color="rgb(174, 211, 210)"),
+        uirevision=f"{date} {ndate} {2 in mod}",
     )
     fig1.update_xaxes(
         zerolinecolor="rgb(110,110,110)", gridwidth=1, gridcolor="rgb(100,100,100)"
@@ -1719,9 +2055,13 @@ def update_graph(
     )
 
     fig2.add_trace(
-        go.Scatter(x=x, y=r0_trend, name="Effective Reproduction Number"), row=1, col=1
+        go.Scatter(x=x2, y=traj2.r0, name="Effective Reproduction Number"),
+        row=1,
+        col=1,
+    )
+    fig2.add_trace(
+        go.Scatter(x=x2, y=traj2.quarantined, name="Total quarantined"), row=1, col=2
     )
-    fig2.add_trace(go.Scatter(x=x, y=qar, name="Total quarantined"), row=1, col=2)
     if 3 in mod:
         fig2.add_trace(
             go.Scatter(x=x, y=hqar * np.ones(ndate + 1), name="Quarantine Capacity"),
@@ -1741,6 +2081,7 @@ def update_graph(
         paper_bgcolor="rgba(0,0,0,0)",
         plot_bgcolor="rgb(61,61,61)",
         font=dict(color="rgb(174, 211, 210)"),
+        uirevision=f"{date} {ndate} {2 in mod}",
     )
     fig2.update_xaxes(
         zerolinecolor="rgb(110,110,110)", gridwidth=1, gridcolor="rgb(100,100,100)"
@@ -1756,13 +2097,13 @@ def update_graph(
 
     # Add comparison lines if there is any
     if compare:
-        if "infected" in df_compare.columns:
+        if "infected" in df_compare:
             fig.add_trace(
                 go.Scatter(x=x, y=df_compare["infected"], name="Actual Infected"),
                 row=1,
                 col=2,
             )
-        if "daily_infected" in df_compare.columns:
+        if "daily_infected" in df_compare:
             fig.add_trace(
                 go.Scatter(
                     x=x, y=df_compare["daily_infected"], name="Actual Daily Infected"
@@ -1770,13 +2111,13 @@ def update_graph(
                 row=1,
                 col=1,
             )
-        if "active_critical" in df_compare.columns:
+        if "active_critical" in df_compare:
             fig1.add_trace(
                 go.Scatter(x=x, y=df_compare["active_critical"], name="Actual ICU"),
                 row=1,
                 col=1,
             )
-        if "active_quarantined" in df_compare.columns:
+        if "active_quarantined" in df_compare:
             fig2.add_trace(
                 go.Scatter(
                     x=x, y=df_compare["active_quarantined"], name="Actual On Quarantine"
@@ -1784,14 +2125,61 @@ def update_graph(
                 row=1,
                 col=2,
             )
-        if "deaths" in df_compare.columns:
+        if "deaths" in df_compare:
             fig1.add_trace(
                 go.Scatter(x=x, y=df_compare["deaths"], name="Actual Deaths"),
                 row=1,
                 col=2,
             )
 
+    # Add the scenarios to compare with: presets are already solved, uploaded
+    # inputs are solved together
+    stage("overlays")
+    others, uploads = [], []
+    for k in overlay or []:
+        if k in presets:
+            others.append((presets.get(k).name, presets.trajectory(k)))
+        elif k.startswith("upload:") and k[7:] in (uploaded or {}):
+            others.append((k[7:], None))
+            uploads.append(Scenario.from_dict(uploaded[k[7:]]))
+    solved = iter(overlay_cache.solve(uploads))
+    for label, other in others:
+        other = next(solved) if other is None else other
+        x_other = (
+            pd.date_range(other.scenario.date, periods=other.scenario.ndate + 1)
+            if 2 in mod
+            else other.t
+        )
+        line = dict(dash="dash")
+        for f, y, name, col in (
+            (fig, other.daily_infected, "Daily Infected Incidence", 1),
+            (fig, other.daily_hospitalised, "Daily Hospital Incidence", 1),
+            (fig, other.infected, "Total Infected", 2),
+            (fig, other.hospitalised, "Total Hospitalised", 2),
+            (fig1, other.active_icu, "Active ICU", 1),
+            (fig1, other.deaths, "Deaths", 2),
+            (fig2, other.r0, "Effective Reproduction Number", 1),
+            (fig2, other.quarantined, "Total quarantined", 2),
+        ):
+            f.add_trace(
+                go.Scatter(
+                    x=x_other,
+                    y=y,
+                    name=f"{label}: {name}",
+                    line=line,
+                    legendgroup=label,
+                ),
+                row=1,
+                col=col,
+            )
+
+    # Draw no more points than fit the plots, or than are visible when zoomed in
+    stage("thinning")
+    for f, relayout in ((fig, overall_zoom), (fig1, fatal_zoom), (fig2, r0_zoom)):
+        thin_figure(f, date, zoom_window(relayout, date, ndate))
+
     # Check if there is any download triggered. If there is, send a file, depending on the specified format
+    stage("export")
     ctx = dash.callback_context.triggered
     if ctx:
         name = "exported_stats" if not file else file
@@ -1806,36 +2194,7 @@ def update_graph(
                 None,
             )
         elif current_call == "btn_ipt":
-            json_out = json.dumps(
-                {
-                    "N": N,
-                    "n_r0": n_r0,
-                    "r0": r0,
-                    "delta_r0": delta_r0,
-                    "pcont": pcont,
-                    "day": day,
-                    "date": date,
-                    "ndate": ndate,
-                    "hcap": hcap,
-                    "hqar": hqar,
-                    "tinc": tinc,
-                    "tinf": tinf,
-                    "ticu": ticu,
-                    "thsp": thsp,
-                    "tcrt": tcrt,
-                    "trec": trec,
-                    "tqar": tqar,
-                    "tqah": tqah,
-                    "pquar": pquar,
-                    "pcross": pcross,
-                    "pqhsp": pqhsp,
-                    "pj": pj,
-                    "ph": ph,
-                    "pc": pc,
-                    "pf": pf,
-                },
-                indent=4,
-            )
+            json_out = scenario.to_json()
             return (
                 fig,
                 fig1,
@@ -1845,44 +2204,11 @@ def update_graph(
                 dict(content=json_out, filename=name + ".json"),
             )
         elif current_call == "btn_sum":
-            text = f"""
-Generated by SEIQHCDRO COVID-19 Modelling Team for Vietnam: Hoang-Anh NGO, Tuan Khoi NGUYEN and Thu-Anh NGUYEN
-
-Population: {N} people
-The outbreak is assumed to begin on {date}, with R0 = {r0}
-
-The outbreak has {n_r0} stages, starting on days {day}:
-_Reduction of R0 through each stage: {delta_r0}
-_Containing proportion through each stage: {pcont}
-
-Infectious period: {tinf} days
-Incubated period: {tinc} days
-Hospitalised Duration: {thsp} days
-Critical Status Duration: {tcrt} days
-Intensive Care Duration: {ticu} days
-Quarantine Duration: {tqar} days
-Quarantine in Hospital Duration: {tqah} days
-Recovery time: {trec} days
-
-Quarantined proportion: {pquar}
-Cross-contamination proportion: {pcross}
-Quarantined & Hospitalised proportion {pqhsp}
-Journal impact level: {pj*100}%
-Hospitalised rate: {ph*100}%
-Critical rate: {pc*100}%
-Death rate: {pf*100}%
-
-Hospital capacity is {hcap}, which is {'not enough' if hcap<np.max(hsp) else 'sufficient'} for the worst day of the outbreak, with {np.max(hsp)} hospital patients.
-Hospital capacity is {hqar}, which is {'not enough' if hqar<np.max(qar) else 'sufficient'} for the worst day of the outbreak, with {np.max(qar)} hospital patients.
-
-The final outcome of the outbreak is
-_{np.max(ift)} COVID-19 positive cases
-_{np.max(qar)} quarantined individuals 
-_{np.max(hsp)} hospitalised patients
-_{np.max(crt)} in critical condition
-_{np.max(ded)} deceased
-
-            """
+            from seiqhcdro.events import locate
+            from seiqhcdro.report import EVENTS, Report
+
+            events = locate(traj, EVENTS)
+            text = Report(name, name, traj, events).text()
             return (
                 fig,
                 fig1,
@@ -1924,6 +2250,7 @@ _{np.max(ded)} deceased
     State("up", "filename"),
     prevent_initial_call=True,
 )
+@profiled()
 def load_to_input(init, content, file):
     r"""
     Load json file content to inputs.
@@ -1972,7 +2299,6 @@ def load_to_input(init, content, file):
     json_attrib = [
         w.replace("slider-", "") if "slider-" in w else w for w in components
     ]
-    json_stage = ["delta_r0", "pcont", "day"]
 
     # Check which file to be used from
     ctx = dash.callback_context.triggered
@@ -1980,127 +2306,36 @@ def load_to_input(init, content, file):
         current_call = ctx[0]["prop_id"].split(".")[0]
         # Sample file to be used
         if current_call == "init":
-            jf = json.loads(sample.loc[init])
-            updated_name = sample.name[init]
+            preset = presets.get(init)
+            jf = preset.scenario.to_dict()
+            updated_name = preset.name
         # Uploaded file to be used
         else:
             if not file:
                 return [dash.no_update for i in components] + ["Error: File not found!"]
             _, content_string = content.split(",")
             decoded = base64.b64decode(content_string)
-            jf = json.loads(decoded)
-            # Irrelevant attribute handling
-            for i in json_attrib + json_stage:
-                if i not in jf:
-                    return [dash.no_update for i in components] + [
-                        f'Error: Input "{i}" not found!'
-                    ]
-            # Inconsistent input handling
-            if len(jf["day"]) != len(jf["delta_r0"]) or len(jf["day"]) != len(
-                jf["pcont"]
-            ):
-                return [dash.no_update for i in components] + [
-                    f"Error: Number of stage inputs not consistent!"
-                ]
+            # Irrelevant attribute and inconsistent input handling
+            try:
+                jf = Scenario.from_json(decoded, strict=True).to_dict()
+            except ValueError as e:
+                return [dash.no_update for i in components] + [f"Error: {e}"]
             updated_name = file
 
+    message = f"Updated inputs from {updated_name}"
+    if jf.get("schedules"):
+        message += f", with schedules of {', '.join(sorted(jf['schedules']))}"
     return [jf[i] for i in json_attrib] + [
-        html.P(f"Updated inputs from {updated_name}!", style={"color": "chartreuse"})
+        html.P(message + "!", style={"color": "chartreuse"})
     ]
 
 
-def SEIQHCDRO_model(
-    t,
-    y,
-    R_0,
-    T_inf,
-    T_inc,
-    T_hsp,
-    T_crt,
-    T_icu,
-    T_quar,
-    T_quar_hosp,
-    T_rec,
-    p_h,
-    p_c,
-    p_f,
-    p_jrnl,
-    p_quar,
-    p_quar_hosp,
-    p_cross_cont,
-):
-    """
-    Main function of SEIQHCDRO model.
-
-    Parameters:
-    ---
-    t: time step for solve_ivp
-    y: solution of previous timestep (or initial solution)
-    R_0: basic reproduction number. This can be a constant, or a function with respect to time. These two cases are handled using an if condition of the callability of R_0.
-    T_inf: infectious period of an infected agent
-    T_inc: incubation time
-    T_hsp: duration for an infected agent to check into a health agency
-    T_crt: duration for a hospitalised person to turn into a critical case since the initial check-in
-    T_icu: duration for a person to stay in the Intensive Care Unit until a clinical outcome has been decided (Recovered or Death)
-    T_quar: duration of quarantine, indicated by the government
-    T_quar_hosp: duration from the start of quarantine until the patient get tested positive for COVID-19 and hospitalised
-    p_h: proportion of hospitalised patients
-    p_c: proportion of hospitalised patients who switched to a critical case
-    p_f: proportion of critical cases resulting in death
-    p_cont: the reduced percentage of contact tracing between individuals in the population due to policy measures. Same as R_0, this can be a constant or a function with respect to time. These two cases are also handled using an if condition.
-    p_jrnl: the reduced percentage of contact tracing between individuals in the population due to policy measures. The percentage of p_jrnl are kept constant, since COVID-19 news, policies and activities are updated everyday, regardless whether there is an outbreak.
-    p_quar: proportion of exposed individual who are quarantined, either at home or at a facility under the supervision of local authority
-    p_quar_hosp: proportion of quarantined individuals who are infected with COVID-19 and hospitalised
-    p_cross_cont: cross contamination ratio within quarantined facility under the supervision of local authority
-
-    Returns
-    ---
-    dy_dt: `list`
-        List of numerical derivatives calculated.
-    """
-
-    # Check if R is constant or not
-    if callable(R_0):
-
-        def R0_dynamic(t):
-            return R_0(t)
-
-    else:
-
-        def R0_dynamic(t):
-            return R_0
-
-    S, E, I, Q, H, C, D, R, O = y
-
-    dS_dt = -R0_dynamic(t) * (1 / T_inf + (1 - p_h) / T_rec) * I * S
-    dE_dt = (
-        R0_dynamic(t) * (1 / T_inf + (1 - p_h) / T_rec) * I * S
-        - 1 / T_inc * E
-        - p_quar * (E) / T_quar
-    )
-    dI_dt = 1 / T_inc * E - (p_h / T_inf + (1 - p_h) / T_rec) * I
-    dQ_dt = p_quar * (E) / T_quar - (p_quar_hosp + p_cross_cont) * Q / T_quar_hosp
-    dH_dt = (
-        p_h / T_inf * I
-        - (1 - p_c) / T_hsp * H
-        - p_c / T_crt * H
-        - p_h / T_rec * H
-        + (p_quar_hosp + p_cross_cont) * Q / T_quar_hosp
-    )
-    dC_dt = p_c / T_crt * H - C / (T_icu + T_crt)
-    dD_dt = p_f / (T_icu + T_crt) * C
-    dR_dt = (1 - p_c) / T_hsp * H + (1 - p_f) / (T_icu + T_crt) * C
-    dO_dt = (1 - p_h) / T_rec * I + p_h / T_rec * H
-
-    dy_dt = [dS_dt, dE_dt, dI_dt, dQ_dt, dH_dt, dC_dt, dD_dt, dR_dt, dO_dt]
-    return dy_dt
-
-
 # Update the index
 @app.callback(
     dash.dependencies.Output("page-content", "children"),
     [dash.dependencies.Input("url", "pathname")],
 )
+@profiled()
 def display_page(pathname):
     r"""
     Routing the content to display.
@@ -2116,9 +2351,9 @@ def display_page(pathname):
         A Div of HTML Elements for the specified route.
     """
     if pathname == "/about":
-        return about_page
+        return about_page()
     else:
-        return main_page
+        return main_page()
 
 
 if __name__ == "__main__":
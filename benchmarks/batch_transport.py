@@ -0,0 +1,94 @@
+"""
+Batch result transport benchmark.
+
+Solves the same batch over the process pool twice, each time in a fresh
+interpreter: once with the pool processes pickling their solutions back to the
+parent, and once writing them into the shared memory-mapped array of
+:func:`seiqhcdro.batch.solve_array`. Reports the wall time and the peak
+resident memory of the parent for each.
+
+Usage::
+
+    python benchmarks/batch_transport.py [--scenarios 20000] [--ndate 300]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import resource, sys, time
+import numpy as np
+from seiqhcdro.batch import CHUNK_SIZE, _pool, _solve_chunk, solve_array
+from seiqhcdro.scenario import Scenario
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    scenarios = [
+        Scenario()._replace(r0=float(r), ndate={ndate})
+        for r in rng.uniform(2, 5, {scenarios})
+    ]
+    _pool().submit(int).result()
+    start = time.perf_counter()
+    if "{mode}" == "pickled":
+        chunks = [
+            scenarios[k : k + CHUNK_SIZE] for k in range(0, len(scenarios), CHUNK_SIZE)
+        ]
+        y = np.concatenate(list(_pool().map(_solve_chunk, chunks)))
+    else:
+        y = solve_array(scenarios, parallel=True)
+    peak = float(y[:, 6, -1].max())
+    elapsed = time.perf_counter() - start
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(elapsed, rss / 1024 if sys.platform != "darwin" else rss / 2**20, peak)
+"""
+
+
+def measure(mode, scenarios, ndate):
+    r"""
+    Solve a batch in a fresh interpreter.
+
+    Returns
+    -------
+    seconds : `float`
+        Wall time of the solve.
+    rss : `float`
+        Peak resident memory of the parent, in MiB.
+    deaths : `float`
+        Largest final death count, to check that both modes agree.
+    """
+    out = subprocess.check_output(
+        [
+            sys.executable,
+            "-c",
+            PROBE.format(mode=mode, scenarios=scenarios, ndate=ndate),
+        ],
+        cwd=ROOT,
+    )
+    return tuple(float(v) for v in out.split())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--scenarios", type=int, default=20000)
+    parser.add_argument("--ndate", type=int, default=300)
+    args = parser.parse_args(argv)
+
+    size = args.scenarios * 9 * (args.ndate + 1) * 8 / 2**20
+    print(f"{args.scenarios} scenarios, {size:.0f} MiB of results")
+    results = {}
+    for mode in ("pickled", "shared"):
+        seconds, rss, deaths = measure(mode, args.scenarios, args.ndate)
+        results[mode] = deaths
+        print(f"{mode:8} {seconds:8.2f} s  peak RSS {rss:8.0f} MiB")
+    if results["pickled"] != results["shared"]:
+        print("  FAIL: the transports give different results")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
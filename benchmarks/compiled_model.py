@@ -0,0 +1,132 @@
+"""
+Compiled model check and benchmark.
+
+Compares the right hand side compiled from the SEIQHCDRO structure with the
+hand-written ``SEIQHCDRO_model``, and its analytic Jacobian with central finite
+differences, on states along every preset trajectory. Then times the Radau
+solve of each preset with the hand-written model and with the compiled model
+and Jacobian. Fails when the compiled model does not match.
+
+Usage::
+
+    python benchmarks/compiled_model.py [--rtol 1e-12] [--runs 3]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def check():
+    r"""
+    Largest relative differences of the compiled right hand side and Jacobian
+    over the presets.
+
+    Returns
+    -------
+    rhs, jac : `float`
+        Largest difference of each, relative to the largest entry.
+    """
+    import numpy as np
+
+    from seiqhcdro.compiler import compile_structure
+    from seiqhcdro.model import SEIQHCDRO_model
+    from seiqhcdro.presets import get_registry
+
+    model = compile_structure()
+    worst_rhs = worst_jac = 0.0
+    for preset in get_registry():
+        args = preset.scenario.model_args()
+        traj = get_registry().trajectory(preset.key)
+        for t in traj.t[:: max(1, len(traj.t) // 50)]:
+            y = traj.y[:, t]
+            expected = np.array(SEIQHCDRO_model(t, y, *args))
+            got = np.array(model.rhs(t, y, *args))
+            scale = np.abs(expected).max() or 1
+            worst_rhs = max(worst_rhs, np.abs(got - expected).max() / scale)
+
+            eps = 1e-7
+            fd = np.empty((len(y), len(y)))
+            for j in range(len(y)):
+                dy = np.zeros(len(y))
+                dy[j] = eps
+                fd[:, j] = (
+                    np.array(SEIQHCDRO_model(t, y + dy, *args))
+                    - np.array(SEIQHCDRO_model(t, y - dy, *args))
+                ) / (2 * eps)
+            scale = np.abs(fd).max() or 1
+            worst_jac = max(
+                worst_jac, np.abs(model.jac(t, y, *args) - fd).max() / scale
+            )
+    return worst_rhs, worst_jac
+
+
+def timings(runs):
+    r"""
+    Best solve time of each preset, with the hand-written and compiled model.
+
+    Returns
+    -------
+    times : `dict`
+        ``(hand-written, compiled)`` times in milliseconds, by preset key.
+    """
+    import numpy as np
+    from scipy.integrate import solve_ivp
+
+    from seiqhcdro.compiler import compile_structure
+    from seiqhcdro.model import SEIQHCDRO_model
+    from seiqhcdro.presets import get_registry
+    from seiqhcdro.simulate import ATOL_PEOPLE, RTOL
+
+    model = compile_structure()
+    out = {}
+    for preset in get_registry():
+        s = preset.scenario
+        best = []
+        for options in ({"fun": SEIQHCDRO_model}, {"fun": model.rhs, "jac": model.jac}):
+            times = []
+            for _ in range(runs):
+                start = time.perf_counter()
+                solve_ivp(
+                    t_span=[0, s.ndate],
+                    y0=s.initial_state(),
+                    args=s.model_args(),
+                    t_eval=np.arange(s.ndate + 1),
+                    method="Radau",
+                    rtol=RTOL,
+                    atol=ATOL_PEOPLE / s.N,
+                    **options,
+                )
+                times.append(time.perf_counter() - start)
+            best.append(min(times) * 1000)
+        out[preset.key] = tuple(best)
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--rtol", type=float, default=1e-12)
+    parser.add_argument("--jac-rtol", type=float, default=1e-6)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    failed = False
+    rhs, jac = check()
+    print(f"right hand side: {rhs:.1e} (tolerance {args.rtol:.0e})")
+    print(f"jacobian: {jac:.1e} (tolerance {args.jac_rtol:.0e})")
+    if rhs > args.rtol or jac > args.jac_rtol:
+        print("  FAIL: compiled model differs from SEIQHCDRO_model")
+        failed = True
+
+    for key, (hand, compiled) in timings(args.runs).items():
+        print(f"{key}: {hand:.1f} ms hand-written, {compiled:.1f} ms compiled")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+"""
+Network egress benchmark of the web application.
+
+Replays the same analyst session twice in process, once without and once
+with ``Accept-Encoding: gzip``: the page, its scripts and stylesheets, the
+layout, and the callbacks of a preset pick and slider drags, as in
+``benchmarks/load_test.py``. Reports the bytes sent by the server and the
+time to the first plot on a slow connection for both, then replays the
+session again, as a returning analyst whose browser kept the versioned static
+files, to report the bytes saved by the cache headers and the callbacks
+answered by the response cache. Fails if compression or caching does not
+reduce the bytes, or if repeated callbacks are not answered from the cache.
+
+Usage::
+
+    python benchmarks/egress.py [--bandwidth 1.6] [--latency 150] [--drags 4]
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from load_test import Session  # noqa: E402
+
+# Static files the page requests, in its HTML
+_STATIC = re.compile(r'(?:src|href)="(/[^"]+)"')
+
+
+class LocalSession(Session):
+    r"""
+    :class:`~load_test.Session` sending its requests to the Flask test
+    client of the application, and keeping a log of each response.
+
+    Parameters
+    ----------
+    client : `flask.testing.FlaskClient`
+        Client of the application.
+    dependencies : :class:`list`
+        Callbacks, as returned by ``/_dash-dependencies``.
+    rng : :class:`random.Random`
+        Random source of the actions.
+    gzip : `bool`
+        Whether the session accepts gzip responses.
+    """
+
+    def __init__(self, client, dependencies, rng, gzip=True):
+        super().__init__("http://localhost", dependencies, rng, lambda *s: None)
+        self.client = client
+        self.headers = {"Accept-Encoding": "gzip"} if gzip else {}
+        self.log = []
+
+    def request(self, method, path, body=None):
+        r"""
+        Send a request and log ``(path, bytes, seconds, headers)``.
+        """
+        start = time.perf_counter()
+        response = self.client.open(
+            path,
+            method=method,
+            data=body,
+            headers=self.headers,
+            content_type="application/json" if body is not None else None,
+        )
+        data = response.get_data()
+        self.log.append(
+            (path, len(data), time.perf_counter() - start, response.headers)
+        )
+        if response.headers.get("Content-Encoding") == "gzip":
+            import gzip
+
+            data = gzip.decompress(data)
+        return response.status_code, data
+
+    def page(self):
+        r"""
+        Load the page as a browser: its HTML and static files, then the layout
+        and its callbacks.
+        """
+        _, html = self.request("GET", "/")
+        for path in _STATIC.findall(html.decode()):
+            self.request("GET", path)
+        self.request("GET", "/_dash-dependencies")
+        self.load()
+
+
+def replay(client, dependencies, gzip, seed, drags):
+    r"""
+    Replay a session: page load, preset pick and slider drags.
+
+    Returns
+    -------
+    log : :class:`list`
+        ``(path, bytes, seconds, headers)`` of each response.
+    first_plot : `int`
+        Number of responses up to the first plot.
+    """
+    session = LocalSession(client, dependencies, random.Random(seed), gzip)
+    session.page()
+    first_plot = len(session.log)
+    session.preset()
+    for _ in range(drags):
+        session.drag()
+    return session.log, first_plot
+
+
+def transfer(log, bandwidth, latency, skip_cached=False):
+    r"""
+    Bytes of a log, and their time on a connection, one request after the
+    other.
+
+    Parameters
+    ----------
+    bandwidth : `float`
+        Bandwidth in Mbit/s.
+    latency : `float`
+        Round trip time in milliseconds.
+    skip_cached : `bool`
+        Skip responses a browser keeps, those with ``immutable`` cache headers.
+    """
+    total, seconds = 0, 0.0
+    for _, size, server, headers in log:
+        if skip_cached and "immutable" in headers.get("Cache-Control", ""):
+            continue
+        total += size
+        seconds += server + latency / 1000 + size * 8 / (bandwidth * 1e6)
+    return total, seconds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--bandwidth", type=float, default=1.6, help="Mbit/s")
+    parser.add_argument("--latency", type=float, default=150, help="ms")
+    parser.add_argument("--drags", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    import json
+
+    import app
+
+    client = app.server.test_client()
+    dependencies = json.loads(client.get("/_dash-dependencies").get_data())
+    link = (args.bandwidth, args.latency)
+
+    results = {}
+    for label, gzip in (("identity", False), ("gzip", True)):
+        app.response_cache.clear()
+        log, first_plot = replay(client, dependencies, gzip, args.seed, args.drags)
+        results[label] = (
+            transfer(log, *link),
+            transfer(log[:first_plot], *link),
+        )
+    hits = app.response_cache.hits
+    repeat, _ = replay(client, dependencies, True, args.seed, args.drags)
+    hits = app.response_cache.hits - hits
+    callbacks = sum(path == "/_dash-update-component" for path, *_ in repeat)
+    results["repeat"] = (transfer(repeat, *link, skip_cached=True), (None, None))
+
+    print(f"{args.bandwidth:g} Mbit/s, {args.latency:g} ms round trip")
+    print(f"{'session':9} {'bytes':>10} {'time (s)':>9} {'first plot (s)':>15}")
+    for label, ((total, seconds), (_, first)) in results.items():
+        first = "" if first is None else f"{first:15.2f}"
+        print(f"{label:9} {total:10d} {seconds:9.2f} {first}")
+    print(f"repeat: {hits} of {callbacks} callbacks answered from the response cache")
+
+    failed = False
+    if results["gzip"][0][0] >= results["identity"][0][0]:
+        print("  FAIL: compression does not reduce the bytes sent")
+        failed = True
+    if results["repeat"][0][0] >= results["gzip"][0][0]:
+        print("  FAIL: the cache headers do not reduce the bytes of a repeat visit")
+        failed = True
+    if not hits:
+        print("  FAIL: no callback answered from the response cache")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,238 @@
+"""
+Golden-output regression check of the solver engines.
+
+Reference trajectories of every sample region and of edge cases (no stage,
+one stage, 30 stages, a 1000-day horizon, contained proportions of 0 and 1,
+scheduled parameters) are solved once with the hand-written
+``SEIQHCDRO_model`` at tight tolerances, and stored with the daily series of
+the plots. Each candidate
+engine then solves the same cases, and every series must stay within
+``atol + rtol * max|reference|`` of the reference. Fails when an engine
+drifts, or when the stored cases no longer match their definition.
+
+Usage::
+
+    python benchmarks/golden.py [--update] [--engines simulate,batch] [--rtol 1e-2]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Stored reference trajectories
+REFERENCE = os.path.join(ROOT, "benchmarks", "golden", "reference.npz")
+
+# Tolerances of the reference solve, the absolute one in people
+REFERENCE_RTOL = 1e-10
+REFERENCE_ATOL = 1e-6
+
+# Absolute tolerance of the candidate engines in people. Their relative
+# tolerances, to the peak of each series, are declared with each engine. R0
+# does not depend on the solver and must match exactly.
+ATOL = 2
+EXACT = ("r0",)
+
+
+def cases():
+    r"""
+    Scenarios of the regression suite, by name.
+    """
+    import sample
+    from seiqhcdro.scenario import Scenario
+
+    out = {key: Scenario.from_json(text) for key, text in sample.loc.items()}
+    base = Scenario()
+    out["no_stage"] = base._replace(n_r0=0, delta_r0=(), pcont=(), day=())
+    out["one_stage"] = base._replace(n_r0=1, delta_r0=(1.5,), pcont=(0.4,), day=(20,))
+    out["thirty_stages"] = base._replace(
+        n_r0=30,
+        delta_r0=tuple(0.5 + (i % 4) * 0.5 for i in range(30)),
+        pcont=tuple(round(0.1 + 0.8 * (i * 7 % 10) / 10, 2) for i in range(30)),
+        day=tuple(range(6, 300, 10)),
+    )
+    out["long_horizon"] = base._replace(ndate=1000)
+    out["pcont_zero"] = base._replace(pcont=(0.0, 0.0, 0.0))
+    out["pcont_one"] = base._replace(pcont=(1.0, 1.0, 1.0))
+    out["schedules"] = Scenario.from_dict(
+        dict(
+            base.to_dict(),
+            schedules={
+                "pquar": {"day": [40, 90], "value": [0.5, 0.9]},
+                "ph": {
+                    "day": [0, 60, 150],
+                    "value": [0.85, 0.6, 0.7],
+                    "interp": "linear",
+                },
+                "tqah": {"day": [30], "value": [4]},
+            },
+        )
+    )
+    return out
+
+
+def reference(scenario):
+    r"""
+    Solve a scenario stage by stage with the hand-written model, at tight
+    tolerances.
+    """
+    import numpy as np
+    from scipy.integrate import solve_ivp
+
+    from seiqhcdro.model import SEIQHCDRO_model
+    from seiqhcdro.simulate import Trajectory, stage_boundaries
+
+    t = np.arange(scenario.ndate + 1)
+    y = np.empty((9, len(t)))
+    state = scenario.initial_state()
+    edges = [0] + list(stage_boundaries(scenario)) + [scenario.ndate]
+    for a, b in zip(edges[:-1], edges[1:]):
+        inside = (t >= a) & (t <= b)
+        sol = solve_ivp(
+            SEIQHCDRO_model,
+            [a, b],
+            state,
+            args=scenario.model_args(),
+            t_eval=t[inside],
+            method="Radau",
+            rtol=REFERENCE_RTOL,
+            atol=REFERENCE_ATOL / scenario.N,
+        )
+        y[:, inside] = sol.y
+        state = sol.y[:, -1]
+    return Trajectory(t, y, scenario)
+
+
+def _cached(scenario):
+    r"""
+    Incremental re-solve through a :class:`SolveCache`, after solving the
+    scenario with its last stage changed.
+    """
+    from seiqhcdro.simulate import SolveCache
+
+    cache = SolveCache()
+    if scenario.pcont:
+        pcont = scenario.pcont[:-1] + (1 - scenario.pcont[-1],)
+        cache.solve(scenario._replace(pcont=pcont))
+    return cache.solve(scenario)
+
+
+def _batch(scenario):
+    from seiqhcdro.batch import simulate_batch
+
+    return simulate_batch([scenario], parallel=False)[0]
+
+
+def _method(method):
+    def solve(scenario):
+        from seiqhcdro.simulate import simulate
+
+        return simulate(scenario, method=method)
+
+    return solve
+
+
+# Candidate engines, each solving one scenario into a Trajectory, with their
+# relative tolerance. BDF and LSODA are less accurate than Radau at the same
+# solver tolerances.
+ENGINES = {
+    "simulate": (_method("Radau"), 2e-3),
+    "auto": (_method("auto"), 2e-3),
+    "cached": (_cached, 2e-3),
+    "batch": (_batch, 2e-3),
+    "bdf": (_method("BDF"), 3e-2),
+    "lsoda": (_method("LSODA"), 1e-2),
+}
+
+
+def update(path=REFERENCE):
+    r"""
+    Solve and store the reference trajectories of every case.
+    """
+    import numpy as np
+
+    from seiqhcdro.simulate import SERIES
+
+    arrays = {}
+    for name, scenario in cases().items():
+        traj = reference(scenario)
+        arrays[f"{name}/scenario"] = np.array(scenario.to_json(indent=None))
+        for k, v in traj.series(SERIES).items():
+            arrays[f"{name}/{k}"] = v
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.savez_compressed(path, **arrays)
+
+
+def compare(engines, rtol=None, atol=ATOL, path=REFERENCE):
+    r"""
+    Solve every case with each engine and compare it with the reference, with
+    the relative tolerance of the engine unless ``rtol`` is given.
+
+    Returns
+    -------
+    rows : :class:`list`
+        ``(case, engine, error, worst series, seconds)``, with the error as a
+        fraction of the allowed difference, so that values above 1 fail.
+    stale : :class:`list`
+        Cases whose stored scenario differs from their definition.
+    """
+    import numpy as np
+
+    from seiqhcdro.simulate import SERIES
+
+    stored = np.load(path)
+    rows, stale = [], []
+    for name, scenario in cases().items():
+        if str(stored[f"{name}/scenario"]) != scenario.to_json(indent=None):
+            stale.append(name)
+            continue
+        for engine in engines:
+            start = time.perf_counter()
+            solve, engine_rtol = ENGINES[engine]
+            traj = solve(scenario)
+            elapsed = time.perf_counter() - start
+            tolerance = engine_rtol if rtol is None else rtol
+            worst, worst_series = 0.0, None
+            for k, v in traj.series(SERIES).items():
+                ref = stored[f"{name}/{k}"]
+                allowed = 1e-12 if k in EXACT else atol + tolerance * np.abs(ref).max()
+                error = np.abs(v - ref).max() / allowed
+                if error > worst:
+                    worst, worst_series = error, k
+            rows.append((name, engine, worst, worst_series, elapsed))
+    return rows, stale
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--update", action="store_true")
+    parser.add_argument("--engines", default=",".join(ENGINES))
+    parser.add_argument("--rtol", type=float)
+    parser.add_argument("--atol", type=float, default=ATOL)
+    args = parser.parse_args(argv)
+
+    if args.update or not os.path.exists(REFERENCE):
+        update()
+        print(f"stored reference trajectories in {os.path.relpath(REFERENCE)}")
+
+    engines = args.engines.split(",")
+    unknown = set(engines) - set(ENGINES)
+    if unknown:
+        parser.error(f"unknown engines {', '.join(sorted(unknown))}")
+
+    rows, stale = compare(engines, args.rtol, args.atol)
+    failed = bool(stale)
+    for name in stale:
+        print(f"{name}: FAIL: stored case differs, run with --update")
+    for name, engine, error, series, elapsed in rows:
+        status = "ok" if error <= 1 else f"FAIL ({series})"
+        print(f"{name:14} {engine:9} {error:7.3f} {elapsed * 1000:8.1f} ms  {status}")
+        failed |= error > 1
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
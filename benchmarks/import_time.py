@@ -0,0 +1,102 @@
+"""
+Import-time benchmark.
+
+Imports the model library (and optionally the Dash application) in fresh
+interpreters and fails when the import is slower than the given budget, or when
+the headless model pulls in any of the heavy web/numerical dependencies.
+
+Usage::
+
+    python benchmarks/import_time.py [--budget-ms 50] [--app-budget-ms 1500] [--runs 5]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must not be loaded by a headless ``import seiqhcdro``
+FORBIDDEN = ("dash", "plotly", "pandas", "scipy", "flask")
+
+PROBE = """
+import sys, time
+t = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t
+loaded = [m for m in {forbidden!r} if m in sys.modules]
+print(elapsed * 1000, ",".join(loaded))
+"""
+
+
+def measure(module, runs, forbidden=()):
+    r"""
+    Time the import of a module, each run in a new interpreter.
+
+    Parameters
+    ----------
+    module : `str`
+        Name of the module to import.
+    runs : `int`
+        Number of fresh interpreters to start.
+    forbidden : `tuple`
+        Modules whose presence in ``sys.modules`` after the import is reported.
+
+    Returns
+    -------
+    best : `float`
+        Fastest import time, in milliseconds.
+    loaded : :class:`list`
+        Forbidden modules that were loaded by the import.
+    """
+    times = []
+    loaded = []
+    for _ in range(runs):
+        out = subprocess.check_output(
+            [sys.executable, "-c", PROBE.format(module=module, forbidden=forbidden)],
+            cwd=ROOT,
+            env=dict(os.environ, SEIQHCDRO_PRESETS_WARM="0"),
+            stderr=subprocess.DEVNULL,
+        )
+        ms, _, mods = out.decode().strip().rpartition("\n")[2].partition(" ")
+        times.append(float(ms))
+        loaded = [m for m in mods.split(",") if m]
+    return min(times), loaded
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--budget-ms", type=float, default=50.0)
+    parser.add_argument("--app-budget-ms", type=float, default=None)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    failed = False
+
+    best, loaded = measure("seiqhcdro", args.runs, FORBIDDEN)
+    print(f"import seiqhcdro: {best:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    if loaded:
+        print(f"  FAIL: headless import loaded {', '.join(loaded)}")
+        failed = True
+    if best > args.budget_ms:
+        print("  FAIL: over budget")
+        failed = True
+
+    best, loaded = measure("app", args.runs, ("pandas", "scipy", "plotly.subplots"))
+    print(f"import app: {best:.1f} ms", end="")
+    if args.app_budget_ms is not None:
+        print(f" (budget {args.app_budget_ms:.0f} ms)", end="")
+    print()
+    if loaded:
+        print(f"  FAIL: app import eagerly loaded {', '.join(loaded)}")
+        failed = True
+    if args.app_budget_ms is not None and best > args.app_budget_ms:
+        print("  FAIL: over budget")
+        failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,620 @@
+"""
+Load test of the Dash callbacks with concurrent sessions.
+
+Starts the application under gunicorn for each worker count and worker class,
+and replays analyst sessions against it from concurrent threads. Each session
+loads the page like the browser does, then picks a preset, drags sliders,
+edits stages and exports results, sending the same ``_dash-update-component``
+requests as the Dash renderer, callback chains included. Reports the latency
+percentiles, throughput and error rate of each configuration, overall and by
+action.
+
+Usage::
+
+    python benchmarks/load_test.py [--workers 1,2,4] [--worker-class sync,gthread]
+        [--sessions 8] [--duration 30] [--url http://127.0.0.1:8050]
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Actions of a session, with their relative frequency
+ACTIONS = {"preset": 1, "drag": 4, "stage": 3, "export": 1}
+
+# Buttons of the export action
+EXPORTS = ("btn_csv", "btn_sum", "btn_ipt")
+
+# Largest number of callback rounds triggered by one action
+MAX_ROUNDS = 8
+
+
+def _key(component_id):
+    r"""
+    Identifier of a component as written in property ids, e.g. ``"slider-N"``
+    or ``'{"index":0,"role":"r0"}'``.
+    """
+    if isinstance(component_id, dict):
+        return json.dumps(component_id, sort_keys=True, separators=(",", ":"))
+    return component_id
+
+
+def _parse_output(spec):
+    r"""
+    Outputs of a callback from its ``output`` string, as ``(id, property)``.
+    """
+    multi = spec.startswith("..")
+    parts = spec[2:-2].split("...") if multi else [spec]
+    outputs = []
+    for part in parts:
+        component, prop = part.rsplit(".", 1)
+        if component.startswith("{"):
+            component = json.loads(component)
+        outputs.append((component, prop))
+    return outputs, multi
+
+
+def _matches(pattern, component_id):
+    r"""
+    Whether a component id matches a pattern id with ``ALL`` wildcards.
+    """
+    if not isinstance(pattern, dict) or not isinstance(component_id, dict):
+        return pattern == component_id
+    if set(pattern) != set(component_id):
+        return False
+    return all(isinstance(v, list) or component_id[k] == v for k, v in pattern.items())
+
+
+class Session:
+    r"""
+    Client replaying what the Dash renderer sends for one browser tab.
+
+    Components of the page are indexed by id with their properties, and a
+    change of properties fires every callback with one of them as input, then
+    the callbacks with their outputs as inputs, and so on.
+
+    Parameters
+    ----------
+    url : `str`
+        Base URL of the server.
+    dependencies : :class:`list`
+        Callbacks, as returned by ``/_dash-dependencies``.
+    rng : :class:`random.Random`
+        Random source of the actions.
+    record : `callable`
+        Called with ``(action, callback, seconds, ok)`` after each request.
+    """
+
+    def __init__(self, url, dependencies, rng, record):
+        parsed = urllib.parse.urlsplit(url)
+        self.host, self.port = parsed.hostname, parsed.port or 80
+        self.prefix = parsed.path.rstrip("/")
+        self.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+        self.rng = rng
+        self.record = record
+        self.callbacks = []
+        for dep in dependencies:
+            if dep.get("clientside_function"):
+                continue
+            outputs, multi = _parse_output(dep["output"])
+            inputs = [(self._id(i["id"]), i["property"]) for i in dep["inputs"]]
+            state = [(self._id(i["id"]), i["property"]) for i in dep["state"]]
+            dep = dict(dep, outputs=outputs, multi=multi)
+            self.callbacks.append((dep, inputs, state))
+        self.props = {}
+        self.ids = {}
+        self.children = {}
+        self.action = "load"
+
+    @staticmethod
+    def _id(component_id):
+        if component_id.startswith("{"):
+            return json.loads(component_id)
+        return component_id
+
+    def request(self, method, path, body=None):
+        r"""
+        Send a request, reconnecting once if the server closed the connection.
+
+        Returns
+        -------
+        status : `int`
+            HTTP status.
+        data : `bytes`
+            Response body.
+        """
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        for attempt in range(2):
+            try:
+                self.connection.request(method, self.prefix + path, body, headers)
+                response = self.connection.getresponse()
+                return response.status, response.read()
+            except (http.client.HTTPException, ConnectionError):
+                self.connection.close()
+                if attempt:
+                    raise
+
+    def _index(self, tree, owner):
+        r"""
+        Index the components of a layout tree, and remember them as
+        descendants of the ``(id, property)`` holding them.
+        """
+        added = []
+        stack = [tree]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, list):
+                stack.extend(reversed(node))
+            elif isinstance(node, dict) and "props" in node:
+                props = node["props"]
+                if "id" in props:
+                    key = _key(props["id"])
+                    self.props[key] = dict(props)
+                    self.ids[key] = props["id"]
+                    self.children.setdefault(owner, []).append(key)
+                    added.append(key)
+                stack.append(props.get("children"))
+        return added
+
+    def _drop(self, owner):
+        r"""
+        Forget the components held by a property, before it is replaced.
+        """
+        for key in self.children.pop(owner, []):
+            self.props.pop(key, None)
+            self.ids.pop(key, None)
+            self._drop((key, "children"))
+
+    def _set(self, key, prop, value):
+        r"""
+        Store a property, re-indexing the components it holds.
+
+        Returns
+        -------
+        added : :class:`list`
+            Components added to the page.
+        """
+        self._drop((key, prop))
+        self.props.setdefault(key, {})[prop] = value
+        return self._index(value, (key, prop)) if prop == "children" else []
+
+    def _resolve(self, dependency):
+        r"""
+        Concrete ``(id, property, value)`` items of an input or state, a list
+        of them for ``ALL`` patterns. `None` if a required component is
+        missing.
+        """
+        component, prop = dependency
+        if not isinstance(component, dict):
+            if component not in self.props:
+                return None
+            value = self.props[component].get(prop)
+            return {"id": component, "property": prop, "value": value}
+        return [
+            {"id": self.ids[key], "property": prop, "value": props.get(prop)}
+            for key, props in self.props.items()
+            if _matches(component, self.ids[key])
+        ]
+
+    def _triggered(self, changed, added):
+        r"""
+        Callbacks with an input among the changed properties, with those
+        properties, or among the properties of the added components, as
+        initial calls without changed properties. ``changed`` maps each
+        property to the output of the callback that set it, and a callback is
+        not fired by its own outputs.
+        """
+        out = []
+        for dep, inputs, state in self.callbacks:
+            fired, initial = [], False
+            for component, prop in inputs:
+                for key in self.ids:
+                    if not _matches(component, self.ids[key]):
+                        continue
+                    if changed.get((key, prop), dep["output"]) != dep["output"]:
+                        fired.append((key, prop))
+                    elif key in added and not dep.get("prevent_initial_call"):
+                        initial = True
+            if fired or initial:
+                out.append((dep, inputs, state, fired))
+        return out
+
+    @staticmethod
+    def _waits(call, calls):
+        r"""
+        Whether a callback has an input set by another callback of the same
+        round, so that the renderer only calls it once that one answered.
+        """
+        inputs = call[1]
+        return any(
+            other[0] is not call[0] and (component, prop) in inputs
+            for other in calls
+            for component, prop in other[0]["outputs"]
+        )
+
+    def _outputs(self, dep):
+        r"""
+        Concrete outputs of a callback, a list of them for ``ALL`` patterns.
+        """
+        out = []
+        for component, prop in dep["outputs"]:
+            if not isinstance(component, dict):
+                out.append({"id": component, "property": prop})
+                continue
+            out.append(
+                [
+                    {"id": self.ids[key], "property": prop}
+                    for key in self.props
+                    if _matches(component, self.ids[key])
+                ]
+            )
+        return out
+
+    def _call(self, dep, inputs, state, fired):
+        r"""
+        Send one callback request and store its outputs.
+
+        Returns
+        -------
+        changed : `set`
+            ``(id, property)`` changed by the callback.
+        added : :class:`list`
+            Components added to the page.
+        """
+        resolved = [self._resolve(i) for i in inputs]
+        if any(r is None for r in resolved):
+            return set(), []
+        outputs = self._outputs(dep)
+        body = {
+            "output": dep["output"],
+            "outputs": outputs if dep["multi"] else outputs[0],
+            "inputs": resolved,
+            "state": [self._resolve(s) for s in state],
+            "changedPropIds": [f"{key}.{prop}" for key, prop in fired],
+        }
+        start = time.perf_counter()
+        try:
+            status, data = self.request(
+                "POST", "/_dash-update-component", json.dumps(body)
+            )
+        except (OSError, http.client.HTTPException):
+            status, data = None, b""
+        ok = status in (200, 204)
+        self.record(self.action, dep["output"], time.perf_counter() - start, ok)
+        if status != 200:
+            return set(), []
+
+        changed, added = set(), []
+        for component, props in json.loads(data)["response"].items():
+            key = _key(
+                json.loads(component) if component.startswith("{") else component
+            )
+            for prop, value in props.items():
+                added += self._set(key, prop, value)
+                changed.add((key, prop))
+        return changed, added
+
+    def fire(self, changed, added=()):
+        r"""
+        Run the callback chain of changed properties, one round of requests
+        per step of the chain, like the renderer. Callbacks waiting for
+        another callback of the round are called in the next one, with the
+        properties that fired them.
+        """
+        added, waiting = list(added), []
+        for _ in range(MAX_ROUNDS):
+            calls = self._triggered(changed, set(added))
+            for dep, inputs, state, fired in waiting:
+                for call in calls:
+                    if call[0] is dep:
+                        call[3].extend(f for f in fired if f not in call[3])
+                        break
+                else:
+                    calls.append((dep, inputs, state, fired))
+            if not calls:
+                break
+            waiting = [call for call in calls if self._waits(call, calls)]
+            changed, added = {}, []
+            for call in calls:
+                if call in waiting:
+                    continue
+                c, a = self._call(*call)
+                changed.update(dict.fromkeys(c, call[0]["output"]))
+                added += a
+
+    def change(self, key, prop, value):
+        r"""
+        Change a property as the user does, and run its callback chain.
+        """
+        added = self._set(key, prop, value)
+        self.fire({(key, prop): None}, added)
+
+    def load(self):
+        r"""
+        Load the page: its layout, then the callbacks of the initial
+        components.
+        """
+        self.action = "load"
+        status, data = self.request("GET", "/_dash-layout")
+        if status != 200:
+            raise RuntimeError(f"Layout request failed with status {status}")
+        added = self._index(json.loads(data), ("", "layout"))
+        if "url" in self.props:
+            self.props["url"]["pathname"] = "/"
+        self.fire({}, added)
+
+    def preset(self):
+        options = self.props.get("init", {}).get("options") or []
+        if options:
+            self.change("init", "value", self.rng.choice(options)["value"])
+
+    def drag(self, steps=8):
+        r"""
+        Drag a slider to a random value, sending each intermediate value.
+        """
+        sliders = [
+            k
+            for k, p in self.props.items()
+            if isinstance(self.ids[k], str)
+            and k.startswith("slider-")
+            and isinstance(p.get("min"), (int, float))
+            and isinstance(p.get("max"), (int, float))
+        ]
+        if not sliders:
+            return
+        key = self.rng.choice(sliders)
+        p = self.props[key]
+        step = p.get("step") or (p["max"] - p["min"]) / 100
+        start = p.get("value", p["min"])
+        start = p["min"] if not isinstance(start, (int, float)) else start
+        end = self.rng.uniform(p["min"], p["max"])
+        for i in range(1, steps + 1):
+            value = start + (end - start) * i / steps
+            value = min(p["max"], max(p["min"], round(value / step) * step))
+            self.change(key, "value", round(value, 6))
+
+    def stage(self):
+        r"""
+        Change the R0 reduction or the contained proportion of a shown stage.
+        """
+        shown = (self.props.get("stages", {}).get("data") or {}).get("n_r0", 0)
+        stages = [
+            k
+            for k, i in self.ids.items()
+            if isinstance(i, dict)
+            and i.get("role") in ("r0", "pcont")
+            and i["index"] < shown
+        ]
+        if not stages:
+            return
+        key = self.rng.choice(stages)
+        if self.ids[key]["role"] == "pcont":
+            value = round(self.rng.uniform(0, 1), 2)
+        else:
+            value = round(self.rng.uniform(0.5, 3), 1)
+        self.change(key, "value", value)
+
+    def export(self):
+        buttons = [b for b in EXPORTS if b in self.props]
+        if buttons:
+            key = self.rng.choice(buttons)
+            clicks = self.props[key].get("n_clicks") or 0
+            self.change(key, "n_clicks", clicks + 1)
+
+    def run(self, deadline, think):
+        r"""
+        Load the page, then run random actions until the deadline.
+        """
+        self.load()
+        names, weights = zip(*ACTIONS.items())
+        while time.perf_counter() < deadline:
+            self.action = self.rng.choices(names, weights)[0]
+            getattr(self, self.action)()
+            time.sleep(self.rng.uniform(0, 2 * think))
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workers, worker_class, threads, timeout=120):
+    r"""
+    Start the application under gunicorn and wait until it answers.
+
+    Returns
+    -------
+    process : :class:`subprocess.Popen`
+        Server process, to terminate.
+    url : `str`
+        Base URL of the server.
+    """
+    port = _free_port()
+    command = [
+        sys.executable,
+        "-m",
+        "gunicorn",
+        "app:server",
+        f"--workers={workers}",
+        f"--worker-class={worker_class}",
+        f"--bind=127.0.0.1:{port}",
+        "--timeout=120",
+    ]
+    if worker_class == "gthread":
+        command.append(f"--threads={threads}")
+    process = subprocess.Popen(
+        command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with status {process.returncode}")
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            connection.request("GET", "/_dash-layout")
+            if connection.getresponse().status == 200:
+                return process, url
+        except OSError:
+            time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("gunicorn did not answer in time")
+
+
+def run_load(url, sessions, duration, think, seed=0):
+    r"""
+    Replay concurrent sessions against a server.
+
+    Returns
+    -------
+    samples : :class:`list`
+        ``(action, callback, seconds, ok)`` of every request.
+    elapsed : `float`
+        Wall time of the run, in seconds.
+    """
+    probe = Session(url, [], random.Random(), None)
+    status, data = probe.request("GET", "/_dash-dependencies")
+    if status != 200:
+        raise RuntimeError(f"Dependencies request failed with status {status}")
+    dependencies = json.loads(data)
+
+    samples = []
+    lock = threading.Lock()
+
+    def record(*sample):
+        with lock:
+            samples.append(sample)
+
+    errors = []
+
+    def session(i):
+        try:
+            Session(url, dependencies, random.Random(seed + i), record).run(
+                deadline, think
+            )
+        except Exception as e:
+            errors.append(e)
+            record("session", "", 0.0, False)
+
+    start = time.perf_counter()
+    deadline = start + duration
+    threads = [threading.Thread(target=session, args=(i,)) for i in range(sessions)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for e in errors[:3]:
+        print(f"  session failed: {e}")
+    return samples, time.perf_counter() - start
+
+
+def summarize(samples, elapsed):
+    r"""
+    Statistics of a run, overall and by action.
+
+    Returns
+    -------
+    rows : `dict`
+        ``{"requests", "throughput", "p50", "p95", "p99", "errors"}`` by
+        action, with ``"all"`` first. Latencies are in milliseconds,
+        throughput in requests per second and errors a fraction.
+    """
+    import numpy as np
+
+    groups = defaultdict(list)
+    for action, _, seconds, ok in samples:
+        groups["all"].append((seconds, ok))
+        groups[action].append((seconds, ok))
+    rows = {}
+    for action in ["all"] + sorted(set(groups) - {"all"}):
+        seconds = np.array([s for s, _ in groups[action]]) * 1000
+        ok = np.array([o for _, o in groups[action]])
+        p50, p95, p99 = np.percentile(seconds, [50, 95, 99])
+        rows[action] = {
+            "requests": len(seconds),
+            "throughput": len(seconds) / elapsed,
+            "p50": p50,
+            "p95": p95,
+            "p99": p99,
+            "errors": 1 - ok.mean(),
+        }
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--worker-class", default="sync,gthread")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--think", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--url", help="load an already running server instead")
+    parser.add_argument("--output", help="also write the results to a JSON file")
+    args = parser.parse_args(argv)
+
+    if args.url:
+        configurations = [(None, None)]
+    else:
+        configurations = [
+            (int(w), k)
+            for k in args.worker_class.split(",")
+            for w in args.workers.split(",")
+        ]
+
+    results = []
+    for workers, worker_class in configurations:
+        process = None
+        if args.url:
+            url, label = args.url, args.url
+        else:
+            process, url = start_server(workers, worker_class, args.threads)
+            label = f"{workers} x {worker_class}"
+        try:
+            samples, elapsed = run_load(
+                url, args.sessions, args.duration, args.think, args.seed
+            )
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+        print(f"{label}, {args.sessions} sessions, {elapsed:.0f} s")
+        rows = summarize(samples, elapsed)
+        for action, row in rows.items():
+            print(
+                f"  {action:8} {row['requests']:6d} requests {row['throughput']:7.1f}/s"
+                f"  p50 {row['p50']:7.1f} p95 {row['p95']:7.1f} p99 {row['p99']:7.1f} ms"
+                f"  errors {row['errors']:.1%}"
+            )
+        results.append(
+            {
+                "workers": workers,
+                "worker_class": worker_class,
+                "sessions": args.sessions,
+                "seconds": elapsed,
+                "actions": rows,
+            }
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""
+Automatic solver selection benchmark.
+
+Solves the cases of ``benchmarks/golden.py`` and stiffer variants of the
+default scenario with every fixed method of ``solve_ivp`` at the default
+tolerances, and with ``method="auto"``, which picks a method and its
+tolerances from the stiffness of each scenario. Reports the best time of each,
+and fails if the automatic choice is slower than the fixed Radau solve of the
+web application on any sample region, or in total.
+
+Usage::
+
+    python benchmarks/solver_choice.py [--repeat 3] [--methods RK45,LSODA,BDF,Radau]
+"""
+
+import argparse
+import os
+import sys
+import time
+import warnings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Fixed method of the web application before the automatic choice
+FIXED = "Radau"
+
+# Shortest hospitalisation delays of quarantined cases, in days, of the stiff
+# variants of the default scenario
+STIFF_TQAH = (0.05, 1e-3)
+
+
+def cases():
+    r"""
+    Scenarios of the benchmark by name, and the names of the sample regions.
+    """
+    import sample
+    from golden import cases as golden_cases
+    from seiqhcdro.scenario import Scenario
+
+    out = golden_cases()
+    for tqah in STIFF_TQAH:
+        out[f"tqah_{tqah:g}"] = Scenario()._replace(tqah=tqah)
+    return out, list(sample.loc)
+
+
+def best_time(scenario, method, repeat):
+    r"""
+    Shortest wall time of a solve over ``repeat`` runs, after a first run.
+    """
+    from seiqhcdro.simulate import simulate
+
+    simulate(scenario, method=method)
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        simulate(scenario, method=method)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--methods", default="RK45,LSODA,BDF,Radau")
+    args = parser.parse_args(argv)
+
+    from seiqhcdro.simulate import select_method, stiffness
+
+    # Explicit methods ignore the Jacobian passed to every solve
+    warnings.simplefilter("ignore", UserWarning)
+    methods = args.methods.split(",")
+    if FIXED not in methods:
+        methods.append(FIXED)
+
+    scenarios, regions = cases()
+    header = " ".join(f"{m:>8}" for m in methods + ["auto"])
+    print(f"{'case':14} {'rate/day':>9} {'choice':>7} {header}  (ms)")
+    totals = dict.fromkeys(methods + ["auto"], 0.0)
+    failed = False
+    for name, scenario in scenarios.items():
+        times = {m: best_time(scenario, m, args.repeat) for m in methods + ["auto"]}
+        for m, seconds in times.items():
+            totals[m] += seconds
+        slower = name in regions and times["auto"] > times[FIXED]
+        failed |= slower
+        print(
+            f"{name:14} {stiffness(scenario):9.3g} {select_method(scenario)[0]:>7} "
+            + " ".join(f"{times[m] * 1000:8.1f}" for m in methods + ["auto"])
+            + ("  FAIL: slower than " + FIXED if slower else "")
+        )
+    print(f"{'total':32} " + " ".join(f"{totals[m] * 1000:8.1f}" for m in totals))
+    speedup = totals[FIXED] / totals["auto"]
+    print(f"auto is {speedup:.1f}x faster than {FIXED} in total")
+    if speedup < 1:
+        print(f"  FAIL: auto is slower than {FIXED} in total")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
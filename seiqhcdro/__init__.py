@@ -0,0 +1,11 @@
+"""
+SEIQHCDRO COVID-19 model library.
+
+The model core is kept free of Dash, Plotly, pandas and SciPy so that it can be
+imported headless in a few milliseconds. Heavier pieces live in submodules and
+pull in their own dependencies only when they are imported.
+"""
+
+from .model import COMPARTMENTS, R0_dynamic, SEIQHCDRO_model
+
+__all__ = ["COMPARTMENTS", "R0_dynamic", "SEIQHCDRO_model"]
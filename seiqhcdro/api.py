@@ -0,0 +1,484 @@
+"""
+JSON API of the model, served by the Flask server behind the Dash app.
+
+Endpoints
+---------
+``POST /api/v1/simulate``
+    Body is a scenario in the ``btn_ipt`` export schema, a list of scenarios,
+    or ``{"scenarios": [...], "output": ..., "format": ...}``. ``output`` is
+    ``summary`` (default), ``trajectory``, ``events`` for the days of the
+    events of :mod:`seiqhcdro.events`, or ``breach`` for the first capacity
+    breach only, which stops each solve at the breach. ``format`` is ``json``
+    (default) or ``npy`` for a binary NumPy array of summaries or
+    trajectories. Both can also be given as query parameters. Batches of
+    more than :data:`INLINE_MAX` scenarios are not solved by the web worker:
+    summaries are queued as a ``batch`` job, answered with 202 and its
+    identifier, and other outputs are refused.
+``POST /api/v1/preview``
+    Same body as ``simulate``, answered at once by the emulator of
+    :mod:`seiqhcdro.surrogate` with a ``low`` and ``high`` estimate of each
+    output. Scenarios the emulator does not cover, i.e. with parameter
+    schedules or an untrained horizon, are solved instead, with equal
+    estimates and ``"emulated": false``. If no emulator is trained for the
+    current model, a ``surrogate`` job is queued and the response is 503 with
+    its identifier.
+``POST /api/v1/rpc``
+    JSON-RPC 2.0 access to the same ``simulate`` method, with batch calls.
+``POST /api/v1/jobs``
+    Queue a long-running analysis ``{"kind": ..., "params": {...}}``, see
+    :mod:`seiqhcdro.jobs`. ``GET /api/v1/jobs/<id>`` gives its progress,
+    ``GET /api/v1/jobs/<id>/result`` its result (JSON, or ``?format=npz``) and
+    ``DELETE /api/v1/jobs/<id>`` cancels it.
+``GET /api/v1/profile``
+    Memory profile of the callbacks in the worker answering, see
+    :mod:`seiqhcdro.profiling`, as JSON or as a text table with
+    ``?format=text``. ``DELETE`` clears it. 404 unless the server runs with
+    ``SEIQHCDRO_PROFILE=1``.
+
+Responses are gzip-compressed when the client accepts it.
+"""
+
+import gzip
+import io
+import os
+
+import numpy as np
+from flask import Blueprint, Response, jsonify, request, send_file, url_for
+
+from .scenario import Scenario
+from .simulate import SERIES, SUMMARY_FIELDS
+
+api = Blueprint("api", __name__, url_prefix="/api/v1")
+
+# Largest number of scenarios accepted in one request
+MAX_BATCH = 10000
+
+# Largest number of scenarios solved by the web worker answering a request.
+# Requests are solved in that worker, without the process pool, which must
+# not be forked from a server worker; larger batches go to the job queue.
+INLINE_MAX = int(os.environ.get("SEIQHCDRO_API_INLINE_MAX", 256))
+
+# Kinds of results of a simulation request
+OUTPUTS = ("summary", "trajectory", "events", "breach")
+
+# Responses smaller than this are not worth compressing
+GZIP_MIN_SIZE = 1024
+
+
+class APIError(Exception):
+    r"""
+    Invalid request, reported to the client with a 400 status.
+    """
+
+
+def parse_request(body, args=None):
+    r"""
+    Read the scenarios and output options of a simulation request.
+
+    Parameters
+    ----------
+    body : `dict` or :class:`list`
+        Decoded JSON body.
+    args : `dict`
+        Query parameters, overriding the options in the body.
+
+    Returns
+    -------
+    scenarios : :class:`list`
+        Parsed :class:`Scenario` objects.
+    batch : `bool`
+        Whether a list of scenarios was given.
+    options : `dict`
+        ``output``, ``format`` and ``series`` options.
+    """
+    args = args or {}
+    options = {}
+    if isinstance(body, dict) and "scenarios" in body:
+        options = {k: body[k] for k in ("output", "format", "series") if k in body}
+        body = body["scenarios"]
+    options.update({k: args[k] for k in ("output", "format", "series") if k in args})
+
+    batch = isinstance(body, list)
+    items = body if batch else [body]
+    if not items or not all(isinstance(i, dict) for i in items):
+        raise APIError("Expected a scenario object or a list of scenario objects")
+    if len(items) > MAX_BATCH:
+        raise APIError(f"At most {MAX_BATCH} scenarios per request")
+    scenarios = []
+    for k, item in enumerate(items):
+        try:
+            scenarios.append(Scenario.from_dict(item))
+        except (ValueError, TypeError) as e:
+            raise APIError(f"Scenario {k}: {e}" if batch else str(e))
+
+    output = options.get("output", "summary")
+    fmt = options.get("format", "json")
+    series = options.get("series", SERIES)
+    if isinstance(series, str):
+        series = series.split(",")
+    if not isinstance(series, (list, tuple)) or not all(
+        isinstance(k, str) for k in series
+    ):
+        raise APIError('"series" must be a comma-separated string or a list of names')
+    if output not in OUTPUTS:
+        raise APIError(f'Unknown output "{output}"')
+    if fmt not in ("json", "npy"):
+        raise APIError(f'Unknown format "{fmt}"')
+    unknown = set(series) - set(SERIES)
+    if unknown:
+        raise APIError(f'Unknown series "{", ".join(sorted(unknown))}"')
+
+    return scenarios, batch, {"output": output, "format": fmt, "series": tuple(series)}
+
+
+def _inline(scenarios):
+    r"""
+    Refuse to solve more than :data:`INLINE_MAX` scenarios in a request.
+    """
+    if len(scenarios) > INLINE_MAX:
+        raise APIError(
+            f"At most {INLINE_MAX} scenarios are solved per request, "
+            'queue larger batches as a "batch" job'
+        )
+
+
+def run(scenarios, output="summary", series=SERIES):
+    r"""
+    Solve scenarios as one batch, in this process, and convert the results to
+    plain Python.
+
+    Returns
+    -------
+    results : :class:`list`
+        One JSON-serialisable result per scenario.
+    """
+    _inline(scenarios)
+    if output in ("events", "breach"):
+        from .events import CAPACITY_EVENTS, detect_batch
+
+        if output == "events":
+            found = detect_batch(scenarios, parallel=False)
+        else:
+            found = detect_batch(
+                scenarios, CAPACITY_EVENTS, stop=CAPACITY_EVENTS, parallel=False
+            )
+        return [{"events": e.times, "stopped": e.stopped, "end": e.end} for e in found]
+
+    from .batch import simulate_batch
+
+    results = []
+    for traj in simulate_batch(scenarios, parallel=False):
+        summary = traj.summary()
+        result = {"summary": {k: float(summary[k]) for k in SUMMARY_FIELDS}}
+        if output == "trajectory":
+            result["date"] = traj.scenario.date
+            result["t"] = traj.t.tolist()
+            result["series"] = {k: v.tolist() for k, v in traj.series(series).items()}
+        results.append(result)
+    return results
+
+
+def run_array(scenarios, output="summary", series=SERIES):
+    r"""
+    Solve scenarios as one batch, in this process, into a single array.
+
+    Returns
+    -------
+    array : `numpy.ndarray`
+        ``(n, 5)`` summaries, or ``(n, len(series), ndate + 1)`` trajectories.
+    columns : `tuple`
+        Names along the second axis.
+    """
+    from .batch import simulate_batch
+
+    if output not in ("summary", "trajectory"):
+        raise APIError(f'Output "{output}" is only available as JSON')
+    _inline(scenarios)
+    if output == "summary":
+        trajectories = simulate_batch(scenarios, parallel=False)
+        array = np.array(
+            [[traj.summary()[k] for k in SUMMARY_FIELDS] for traj in trajectories]
+        )
+        return array, SUMMARY_FIELDS
+
+    if len({s.ndate for s in scenarios}) > 1:
+        raise APIError('Binary trajectories need the same "ndate" for all scenarios')
+    trajectories = simulate_batch(scenarios, parallel=False)
+    array = np.array([[getattr(traj, k) for k in series] for traj in trajectories])
+    return array, series
+
+
+def gzip_response(response, min_size=GZIP_MIN_SIZE):
+    r"""
+    Compress a response body with gzip, if the client accepts it.
+
+    Parameters
+    ----------
+    response : `flask.Response`
+        Outgoing response.
+    min_size : `int`
+        Smallest body size, in bytes, worth compressing.
+
+    Returns
+    -------
+    response : `flask.Response`
+        The same response, compressed in place when applicable.
+    """
+    if (
+        response.direct_passthrough
+        or response.status_code < 200
+        or response.status_code >= 300
+        or "Content-Encoding" in response.headers
+        or "gzip" not in request.headers.get("Accept-Encoding", "").lower()
+    ):
+        return response
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+    response.set_data(gzip.compress(data, compresslevel=6))
+    response.headers["Content-Encoding"] = "gzip"
+    response.headers["Content-Length"] = len(response.get_data())
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+@api.errorhandler(APIError)
+def _api_error(e):
+    return jsonify({"error": str(e)}), 400
+
+
+@api.after_request
+def _compress(response):
+    return gzip_response(response)
+
+
+@api.route("/simulate", methods=["POST"])
+def simulate_endpoint():
+    r"""
+    Simulate one scenario or a batch, see the module documentation.
+    """
+    body = request.get_json(force=True, silent=True)
+    if body is None:
+        raise APIError("Request body must be JSON")
+    scenarios, batch, options = parse_request(body, request.args)
+    if len(scenarios) > INLINE_MAX and options["output"] == "summary":
+        from .jobs import get_queue
+
+        params = {"scenarios": [s.to_dict() for s in scenarios]}
+        return _accepted(get_queue().submit("batch", params))
+
+    if options["format"] == "npy":
+        array, columns = run_array(scenarios, options["output"], options["series"])
+        buf = io.BytesIO()
+        np.save(buf, array if batch else array[0])
+        response = Response(buf.getvalue(), mimetype="application/octet-stream")
+        response.headers["X-Columns"] = ",".join(columns)
+        return response
+
+    results = run(scenarios, options["output"], options["series"])
+    return jsonify({"results": results} if batch else results[0])
+
+
+@api.route("/preview", methods=["POST"])
+def preview_endpoint():
+    r"""
+    Emulated summaries of one scenario or a batch, solving only those the
+    emulator does not cover.
+    """
+    from .batch import simulate_batch
+    from .jobs import get_queue
+    from .surrogate import get_surrogate, solved
+
+    body = request.get_json(force=True, silent=True)
+    if body is None:
+        raise APIError("Request body must be JSON")
+    scenarios, batch, _ = parse_request(body)
+
+    surrogate = get_surrogate()
+    if surrogate is None:
+        queue = get_queue()
+        training = [
+            j
+            for j in queue.list()
+            if j["kind"] == "surrogate" and j["status"] in ("queued", "running")
+        ]
+        job_id = training[0]["id"] if training else queue.submit("surrogate", {})
+        response = jsonify({"error": "The emulator is being trained", "job": job_id})
+        response.status_code = 503
+        response.headers["Retry-After"] = "60"
+        return response
+
+    previews = surrogate.predict(scenarios)
+    emulated = [p is not None for p in previews]
+    missing = [i for i, e in enumerate(emulated) if not e]
+    _inline(missing)
+    exact = solved(simulate_batch([scenarios[i] for i in missing], parallel=False))
+    for i, p in zip(missing, exact):
+        previews[i] = p
+    results = [dict(p._asdict(), emulated=e) for p, e in zip(previews, emulated)]
+    return jsonify({"results": results} if batch else results[0])
+
+
+def _rpc_call(call):
+    r"""
+    Handle a single JSON-RPC 2.0 call.
+
+    Returns
+    -------
+    response : `dict`
+        JSON-RPC response, or `None` for notifications.
+    """
+    if (
+        not isinstance(call, dict)
+        or call.get("jsonrpc") != "2.0"
+        or "method" not in call
+    ):
+        return {
+            "jsonrpc": "2.0",
+            "error": {"code": -32600, "message": "Invalid Request"},
+            "id": None,
+        }
+    rid = call.get("id")
+    if call["method"] != "simulate":
+        error = {"code": -32601, "message": "Method not found"}
+    else:
+        params = call.get("params") or {}
+        if isinstance(params, dict) and "scenario" in params:
+            params = dict(params, scenarios=params["scenario"])
+        try:
+            scenarios, batch, options = parse_request(params)
+            results = run(scenarios, options["output"], options["series"])
+            result = results if batch else results[0]
+            error = None
+        except APIError as e:
+            error = {"code": -32602, "message": str(e)}
+
+    if "id" not in call:
+        return None
+    if error:
+        return {"jsonrpc": "2.0", "error": error, "id": rid}
+    return {"jsonrpc": "2.0", "result": result, "id": rid}
+
+
+@api.route("/rpc", methods=["POST"])
+def rpc_endpoint():
+    r"""
+    JSON-RPC 2.0 endpoint, with batch calls.
+    """
+    body = request.get_json(force=True, silent=True)
+    if body is None:
+        return jsonify(
+            {
+                "jsonrpc": "2.0",
+                "error": {"code": -32700, "message": "Parse error"},
+                "id": None,
+            }
+        )
+    if body == []:
+        return jsonify(_rpc_call(None))
+    if isinstance(body, list):
+        responses = [r for r in map(_rpc_call, body) if r is not None]
+        return jsonify(responses) if responses else ("", 204)
+    response = _rpc_call(body)
+    return jsonify(response) if response is not None else ("", 204)
+
+
+@api.route("/jobs", methods=["POST"])
+def submit_job():
+    r"""
+    Queue a job and return its identifier.
+    """
+    from .jobs import get_queue
+
+    body = request.get_json(force=True, silent=True)
+    if not isinstance(body, dict) or "kind" not in body:
+        raise APIError('Expected {"kind": ..., "params": {...}}')
+    try:
+        job_id = get_queue().submit(body["kind"], body.get("params", {}))
+    except ValueError as e:
+        raise APIError(str(e))
+    return _accepted(job_id)
+
+
+def _accepted(job_id):
+    r"""
+    202 response to a queued job, pointing to its status.
+    """
+    response = jsonify({"id": job_id, "status": "queued"})
+    response.status_code = 202
+    response.headers["Location"] = url_for("api.job_status", job_id=job_id)
+    return response
+
+
+@api.route("/jobs", methods=["GET"])
+def list_jobs():
+    r"""
+    Status of the most recent jobs.
+    """
+    from .jobs import get_queue
+
+    return jsonify({"jobs": get_queue().list()})
+
+
+@api.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    r"""
+    Status and progress of a job.
+    """
+    from .jobs import get_queue
+
+    job = get_queue().get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+
+@api.route("/jobs/<job_id>", methods=["DELETE"])
+def cancel_job(job_id):
+    r"""
+    Cancel a job.
+    """
+    from .jobs import get_queue
+
+    queue = get_queue()
+    if not queue.cancel(job_id):
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(queue.get(job_id))
+
+
+@api.route("/jobs/<job_id>/result", methods=["GET"])
+def job_result(job_id):
+    r"""
+    Result of a finished job, as JSON or as the stored ``.npz`` file.
+    """
+    from .jobs import get_queue
+
+    queue = get_queue()
+    job = queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    path = queue.result(job_id)
+    if path is None:
+        return jsonify({"error": f'Job is {job["status"]}', "job": job}), 409
+    if request.args.get("format") == "npz":
+        return send_file(path, mimetype="application/octet-stream")
+    with np.load(path) as data:
+        return jsonify({k: data[k].tolist() for k in data.files})
+
+
+@api.route("/profile", methods=["GET", "DELETE"])
+def profile():
+    r"""
+    Memory profile of the callbacks in this worker, or clear it.
+    """
+    from . import profiling
+
+    if not profiling.ENABLED:
+        return jsonify({"error": "Profiling is disabled"}), 404
+    if request.method == "DELETE":
+        profiling.reset()
+        return "", 204
+    report = profiling.report(request.args.get("top", profiling.TOP, type=int))
+    if request.args.get("format") == "text":
+        return Response(profiling.format_report(report), mimetype="text/plain")
+    return jsonify(report)
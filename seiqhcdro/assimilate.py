@@ -0,0 +1,389 @@
+"""
+Sequential assimilation of observed statistics into an ensemble forecast.
+
+An :class:`EnsembleFilter` keeps an ensemble of model states together with
+the uncertain inputs of each member, e.g. the R0 of the scenario. Each new
+day of data costs one day of integration of the whole ensemble, stacked into
+one vectorized system as in :mod:`seiqhcdro.batch`, followed by a
+stochastic ensemble Kalman filter update of the states and parameters from
+the observed columns of :mod:`seiqhcdro.observed` available that day. The
+forecast is then read from the updated ensemble, without solving the scenario
+again from day 0.
+
+The update works on logarithms, of the compartments and of ``1 +`` the
+observed counts, so that states stay positive and observation errors are
+relative. Parameters are updated on a log scale, or a logit scale for
+proportions, and drift as a random walk between days so that the ensemble
+can follow parameters that change over time.
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+
+from .batch import R0Table, _stacked_jac, _stacked_model
+from .model import COMPARTMENTS
+from .observed import COLUMNS
+from .scenario import MODEL_FIELDS, Scenario
+from .simulate import ATOL_PEOPLE, RTOL
+
+# Inputs of a scenario that can be estimated
+PARAMETERS = ("r0",) + MODEL_FIELDS
+
+# Quantiles of the published forecast
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+# Smallest population fraction kept in a compartment, before taking its log
+FLOOR = 1e-15
+
+
+def _forward(name, value):
+    r"""
+    Unbounded form of a parameter value, in which it is updated.
+    """
+    if name.startswith("p"):
+        value = np.clip(value, 1e-6, 1 - 1e-6)
+        return np.log(value / (1 - value))
+    return np.log(value)
+
+
+def _inverse(name, value):
+    r"""
+    Parameter value of its unbounded form, see :func:`_forward`.
+    """
+    if name.startswith("p"):
+        return 1 / (1 + np.exp(-value))
+    return np.exp(value)
+
+
+def observe(y, previous, N):
+    r"""
+    Observed columns predicted by compartments.
+
+    Parameters
+    ----------
+    y : `numpy.ndarray`
+        Compartments, of shape ``(9, ...)``.
+    previous : `numpy.ndarray`
+        Total infected cases of the day before, for ``daily_infected``.
+    N : `float`
+        Population.
+
+    Returns
+    -------
+    columns : `dict`
+        Counts of each of :data:`~seiqhcdro.observed.COLUMNS`, defined as the
+        matching series of :class:`~seiqhcdro.simulate.Trajectory` before
+        rounding.
+    """
+    S, E, I, Q, H, C, D, R, O = y
+    infected = (I + H + C + D + R + O) * N
+    return {
+        "infected": infected,
+        "daily_infected": np.maximum(infected - previous, 0),
+        "active_critical": C * N,
+        "active_quarantined": (E + I + Q + H + C + D) * N,
+        "deaths": D * N,
+    }
+
+
+class Forecast(NamedTuple):
+    r"""
+    Quantiles of the observed columns over the members of an ensemble.
+
+    ``series`` maps each of :data:`~seiqhcdro.observed.COLUMNS` to an array of
+    shape ``(len(quantiles), len(t))``, and ``parameters`` each estimated
+    parameter to its quantiles on the day of the forecast.
+    """
+
+    t: np.ndarray
+    quantiles: tuple
+    series: dict
+    parameters: dict
+
+    def to_dict(self):
+        r"""
+        Convert to plain Python, for a JSON response.
+        """
+        return {
+            "t": self.t.tolist(),
+            "quantiles": list(self.quantiles),
+            "series": {k: v.tolist() for k, v in self.series.items()},
+            "parameters": {k: v.tolist() for k, v in self.parameters.items()},
+        }
+
+
+class EnsembleFilter:
+    r"""
+    Ensemble of model states and parameters, updated from daily observations.
+
+    Parameters
+    ----------
+    scenario : :class:`Scenario`
+        Scenario giving the initial state and the parameters that are not
+        estimated, including its stages and schedules.
+    size : `int`
+        Number of members.
+    params : `tuple`
+        Estimated inputs, from :data:`PARAMETERS`. The stages of each member
+        apply to its own ``r0``, and other estimated inputs replace their
+        schedule, if any.
+    spread : `float`
+        Standard deviation of the initial parameters, on their log or logit
+        scale.
+    drift : `float`
+        Standard deviation of the daily random walk of the parameters, on the
+        same scale.
+    obs_error : `float`
+        Relative error of the observations.
+    day : `int`
+        Day of the scenario the ensemble starts at. The members are integrated
+        from day 0 up to it.
+    seed : `int`
+        Seed of the random draws.
+
+    Raises
+    ------
+    ValueError
+        If a parameter cannot be estimated, or if the ensemble has fewer than
+        two members.
+    """
+
+    def __init__(
+        self,
+        scenario,
+        size=100,
+        params=("r0",),
+        spread=0.2,
+        drift=0.02,
+        obs_error=0.1,
+        day=0,
+        seed=None,
+    ):
+        if not isinstance(scenario, Scenario):
+            scenario = Scenario.from_dict(scenario)
+        unknown = set(params) - set(PARAMETERS)
+        if unknown:
+            raise ValueError(f'Cannot estimate "{", ".join(sorted(unknown))}"')
+        if size < 2:
+            raise ValueError("An ensemble needs at least two members")
+
+        self.scenario = scenario
+        self.params = tuple(params)
+        self.drift = drift
+        self.obs_error = obs_error
+        self.rng = np.random.default_rng(seed)
+
+        center = np.array([_forward(p, getattr(scenario, p)) for p in params])
+        self.theta = center[:, None] + spread * self.rng.standard_normal(
+            (len(params), size)
+        )
+        self.day = 0
+        self.state = np.repeat(
+            np.array(scenario.initial_state(), dtype=float)[:, None], size, axis=1
+        )
+        self.previous = self._infected(self.state)
+        if day > 0:
+            self.propagate(day)
+
+    @property
+    def size(self):
+        r"""
+        Number of members.
+        """
+        return self.state.shape[1]
+
+    def _infected(self, y):
+        return observe(y, 0, self.scenario.N)["infected"]
+
+    def _model_args(self):
+        r"""
+        R0 and parameters of the stacked members, see
+        :func:`~seiqhcdro.batch._stacked_model`.
+        """
+        values = {p: _inverse(p, v) for p, v in zip(self.params, self.theta)}
+        args = self.scenario.model_args()
+        R0 = args[0]
+        if "r0" in values:
+            R0 = R0Table.compile(
+                [self.scenario._replace(r0=float(r0)) for r0 in values["r0"]]
+            )
+        return R0, [values.get(f, a) for f, a in zip(MODEL_FIELDS, args[1:])]
+
+    def _integrate(self, t):
+        r"""
+        Integrate every member from the current day.
+
+        Parameters
+        ----------
+        t : `numpy.ndarray`
+            Increasing days after the current one.
+
+        Returns
+        -------
+        y : `numpy.ndarray`
+            Compartments of shape ``(9, size, len(t))``.
+        """
+        from scipy.integrate import solve_ivp
+
+        sol = solve_ivp(
+            _stacked_model,
+            [self.day, t[-1]],
+            self.state.ravel(),
+            args=self._model_args(),
+            t_eval=t,
+            method="Radau",
+            rtol=RTOL,
+            atol=ATOL_PEOPLE / self.scenario.N,
+            jac=_stacked_jac,
+        )
+        return sol.y.reshape(len(COMPARTMENTS), self.size, -1)
+
+    def propagate(self, days=1):
+        r"""
+        Advance the ensemble by a number of days without observations.
+        """
+        y = self._integrate(np.arange(self.day + 1, self.day + days + 1))
+        self.previous = self._infected(y[:, :, -2] if days > 1 else self.state)
+        self.state = y[:, :, -1]
+        self.day += days
+        self.theta += (
+            self.drift * np.sqrt(days) * self.rng.standard_normal(self.theta.shape)
+        )
+
+    def update(self, observations):
+        r"""
+        Update the states and parameters from the observations of the current
+        day, with perturbed observations.
+
+        Parameters
+        ----------
+        observations : `dict`
+            Count of any of :data:`~seiqhcdro.observed.COLUMNS`. NaN values
+            are skipped.
+
+        Raises
+        ------
+        ValueError
+            If a column is not one of :data:`~seiqhcdro.observed.COLUMNS`.
+        """
+        unknown = set(observations) - set(COLUMNS)
+        if unknown:
+            raise ValueError(f'Unknown columns "{", ".join(sorted(unknown))}"')
+        names = [
+            k for k in COLUMNS if k in observations and np.isfinite(observations[k])
+        ]
+        if not names:
+            return
+
+        N = self.scenario.N
+        predicted = observe(self.state, self.previous, N)
+        hx = np.log1p(np.array([predicted[k] for k in names]))
+        obs = np.log1p(np.maximum([observations[k] for k in names], 0))
+        perturbed = obs[:, None] + self.obs_error * self.rng.standard_normal(hx.shape)
+
+        # Augmented ensemble: log of the compartments after S, and parameters
+        z = np.vstack([np.log(np.maximum(self.state[1:], FLOOR)), self.theta])
+        m = self.size
+        dz = z - z.mean(axis=1, keepdims=True)
+        dh = hx - hx.mean(axis=1, keepdims=True)
+        czh = dz @ dh.T / (m - 1)
+        chh = dh @ dh.T / (m - 1) + self.obs_error**2 * np.eye(len(names))
+        z = z + czh @ np.linalg.solve(chh, perturbed - hx)
+
+        k = len(COMPARTMENTS) - 1
+        rest = np.exp(np.minimum(z[:k], 0))
+        total = rest.sum(axis=0)
+        rest /= np.maximum(total, 1)
+        self.state = np.vstack([1 - rest.sum(axis=0), rest])
+        self.theta = z[k:]
+
+    def assimilate(self, observations):
+        r"""
+        Advance the ensemble by one day and update it with the observations of
+        that day.
+        """
+        self.propagate(1)
+        self.update(observations)
+
+    def run(self, columns, until=None):
+        r"""
+        Assimilate the days of aligned observations after the current one.
+
+        Parameters
+        ----------
+        columns : `dict`
+            Daily values of each column from day 0 of the scenario, as given
+            by :meth:`~seiqhcdro.observed.Dataset.align`.
+        until : `int`
+            Last day assimilated, by default the last day with a value.
+        """
+        if until is None:
+            known = [np.flatnonzero(np.isfinite(v)) for v in columns.values()]
+            until = max([int(i[-1]) for i in known if len(i)] + [self.day])
+        for day in range(self.day + 1, until + 1):
+            self.assimilate({k: v[day] for k, v in columns.items() if day < len(v)})
+
+    def forecast(self, horizon, quantiles=QUANTILES):
+        r"""
+        Forecast of the observed columns from the current day.
+
+        Parameters
+        ----------
+        horizon : `int`
+            Number of days forecast.
+        quantiles : `tuple`
+            Quantiles of the members reported.
+
+        Returns
+        -------
+        forecast : :class:`Forecast`
+            Quantiles from the current day to ``horizon`` days later.
+        """
+        t = np.arange(self.day, self.day + horizon + 1)
+        y = np.concatenate([self.state[:, :, None], self._integrate(t[1:])], axis=2)
+        previous = np.concatenate(
+            [self.previous[:, None], self._infected(y[:, :, :-1])], axis=1
+        )
+        columns = observe(y, previous, self.scenario.N)
+        values = {p: _inverse(p, v) for p, v in zip(self.params, self.theta)}
+        return Forecast(
+            t,
+            tuple(quantiles),
+            {k: np.quantile(v, quantiles, axis=0) for k, v in columns.items()},
+            {k: np.quantile(v, quantiles) for k, v in values.items()},
+        )
+
+    def save(self, path):
+        r"""
+        Store the ensemble in a ``.npz`` file, to resume the next day.
+        """
+        np.savez(
+            path,
+            scenario=np.array(self.scenario.to_json(indent=None)),
+            params=np.array(self.params),
+            settings=np.array([self.drift, self.obs_error]),
+            day=self.day,
+            state=self.state,
+            previous=self.previous,
+            theta=self.theta,
+            rng=np.array(str(self.rng.bit_generator.state)),
+        )
+
+    @classmethod
+    def load(cls, path):
+        r"""
+        Resume an ensemble stored by :meth:`save`.
+        """
+        from ast import literal_eval
+
+        with np.load(path) as f:
+            out = cls.__new__(cls)
+            out.scenario = Scenario.from_json(str(f["scenario"]))
+            out.params = tuple(str(p) for p in f["params"])
+            out.drift, out.obs_error = (float(v) for v in f["settings"])
+            out.day = int(f["day"])
+            out.state, out.previous, out.theta = f["state"], f["previous"], f["theta"]
+            out.rng = np.random.default_rng()
+            out.rng.bit_generator.state = literal_eval(str(f["rng"]))
+        return out
@@ -0,0 +1,460 @@
+"""
+Batch solution of many scenarios.
+
+Scenarios sharing the same horizon are stacked into one vectorized system and
+solved together, with a block-diagonal Jacobian sparsity so that the implicit
+solver stays cheap. Large batches are split into chunks and spread over a
+process pool, whose processes write their solutions into memory-mapped arrays
+shared with the caller instead of sending them back.
+"""
+
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import NamedTuple
+
+import numpy as np
+
+from .compiler import compile_structure
+from .model import COMPARTMENTS, R0_dynamic
+from .scenario import MODEL_FIELDS, Scenario
+from .simulate import ATOL_PEOPLE, RTOL, Trajectory
+
+# Number of scenarios solved together in one vectorized system
+CHUNK_SIZE = 32
+
+# Directory of the result arrays shared with the pool processes, in memory
+# where the system provides it
+SHARED_DIR = os.environ.get(
+    "SEIQHCDRO_SHARED_DIR",
+    "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(),
+)
+
+_executor = None
+
+
+class R0Table(NamedTuple):
+    r"""
+    :func:`R0_dynamic` of many scenarios, compiled into piecewise linear rows.
+
+    Row 0 of each scenario is the period before the first stage, row ``i + 1``
+    is stage ``i``. Within a row, ``R0(t) = max(A + sign * (c * (t - T0) * m), lo)``,
+    which reproduces :func:`R0_dynamic` exactly.
+    """
+
+    day0: np.ndarray
+    day_next: np.ndarray
+    A: np.ndarray
+    c: np.ndarray
+    T0: np.ndarray
+    m: np.ndarray
+    sign: np.ndarray
+    lo: np.ndarray
+
+    @classmethod
+    def compile(cls, scenarios):
+        r"""
+        Compile the stage inputs of a list of scenarios.
+
+        Parameters
+        ----------
+        scenarios : :class:`list`
+            List of :class:`Scenario`.
+
+        Returns
+        -------
+        table : :class:`R0Table`
+            Padded coefficient arrays, one row per scenario.
+        """
+        n = len(scenarios)
+        width = max([len(s.day) for s in scenarios] + [1])
+        day0 = np.full(n, np.inf)
+        day_next = np.full((n, width), np.inf)
+        A = np.zeros((n, width + 1))
+        c = np.zeros((n, width + 1))
+        T0 = np.zeros((n, width + 1))
+        m = np.zeros((n, width + 1))
+        sign = np.ones((n, width + 1))
+        lo = np.full((n, width + 1), -np.inf)
+
+        for j, s in enumerate(scenarios):
+            r0, delta_r0, pcont, day = s.r0, s.delta_r0, s.pcont, s.day
+            # Default stage when created initially
+            if not delta_r0 or not pcont or not day:
+                A[j, 0] = 4.1
+                continue
+            A[j, 0] = r0
+            day0[j] = day[0]
+            day_next[j, : len(day) - 1] = day[1:]
+            for i in range(len(day)):
+                row = i + 1
+                T0[j, row] = day[i] - 1
+                c[j, row] = 2 * delta_r0[i] / 30
+                if i == 0:
+                    A[j, row] = r0 * (1 - pcont[0])
+                    sign[j, row], m[j, row] = -1, pcont[0]
+                    continue
+                base = min(
+                    R0_dynamic(day[i] - 1, r0, delta_r0, pcont, day),
+                    r0 * (1 - pcont[i]),
+                )
+                if pcont[i] >= pcont[i - 1]:
+                    A[j, row], sign[j, row], m[j, row] = base, -1, pcont[i]
+                    lo[j, row] = 0
+                elif base > 0:
+                    A[j, row], sign[j, row], m[j, row] = base, 1, 1 - pcont[i]
+                else:
+                    c[j, row] = 0.0
+
+        return cls(day0, day_next, A, c, T0, m, sign, lo)
+
+    def __call__(self, t):
+        r"""
+        Evaluate the reproduction number of every scenario at time ``t``.
+        """
+        stage = np.argmax(t < self.day_next, axis=1) + 1
+        row = np.where(t < self.day0, 0, stage)
+        idx = np.arange(len(row))
+        A, c, T0 = self.A[idx, row], self.c[idx, row], self.T0[idx, row]
+        m, sign, lo = self.m[idx, row], self.sign[idx, row], self.lo[idx, row]
+        return np.maximum(A + sign * (c * (t - T0) * m), lo)
+
+
+class ScheduleTable(NamedTuple):
+    r"""
+    Schedules of one parameter over many scenarios, compiled into padded
+    piecewise linear rows, see :meth:`~seiqhcdro.schedule.Schedule.segments`.
+    Within a row, the value at ``t`` is ``values + slopes * (t - left)`` of
+    the segment starting on the last day before ``t``.
+    """
+
+    days: np.ndarray
+    values: np.ndarray
+    slopes: np.ndarray
+    left: np.ndarray
+
+    @classmethod
+    def compile(cls, schedules, base):
+        r"""
+        Compile the schedules of a parameter.
+
+        Parameters
+        ----------
+        schedules : :class:`list`
+            :class:`~seiqhcdro.schedule.Schedule` of each scenario, or `None`
+            if it keeps its scalar value.
+        base : :class:`list`
+            Scalar value of the parameter in each scenario.
+
+        Returns
+        -------
+        table : :class:`ScheduleTable`
+            Padded arrays, one row per scenario.
+        """
+        n = len(schedules)
+        width = max([len(s.day) for s in schedules if s is not None] + [1])
+        days = np.full((n, width), np.inf)
+        values = np.repeat(np.asarray(base, dtype=float)[:, None], width + 1, axis=1)
+        slopes = np.zeros((n, width + 1))
+        left = np.zeros((n, width + 1))
+        for j, schedule in enumerate(schedules):
+            if schedule is None:
+                continue
+            v, slope, edge = schedule.segments(base[j])
+            days[j, : len(schedule.day)] = schedule.day
+            values[j, : len(v)], values[j, len(v) :] = v, v[-1]
+            slopes[j, : len(slope)] = slope
+            left[j, : len(edge)] = edge
+        return cls(days, values, slopes, left)
+
+    def __call__(self, t):
+        r"""
+        Evaluate the parameter of every scenario at time ``t``.
+        """
+        segment = np.count_nonzero(t >= self.days, axis=1)
+        idx = np.arange(len(segment))
+        values, slopes = self.values[idx, segment], self.slopes[idx, segment]
+        return values + slopes * (t - self.left[idx, segment])
+
+
+def _model_params(scenarios):
+    r"""
+    Parameters of stacked scenarios after R0, in the order of
+    :data:`MODEL_FIELDS`: an array of values, or a :class:`ScheduleTable` if
+    any scenario schedules the parameter.
+    """
+    params = []
+    for f in MODEL_FIELDS:
+        base = [getattr(s, f) for s in scenarios]
+        schedules = [dict(s.schedules).get(f) for s in scenarios]
+        if any(schedules):
+            params.append(ScheduleTable.compile(schedules, base))
+        else:
+            params.append(np.array(base, dtype=float))
+    return params
+
+
+def _stacked_model(t, y, R0, params):
+    r"""
+    Right hand side of many stacked scenarios, laid out compartment-major.
+    """
+    return compile_structure().stacked_rhs(t, y, R0, *params)
+
+
+def _stacked_jac(t, y, R0, params):
+    r"""
+    Sparse Jacobian of :func:`_stacked_model`.
+    """
+    return compile_structure().stacked_jac(t, y, R0, *params)
+
+
+def _solve_chunk(scenarios, method="Radau", rtol=RTOL, atol=ATOL_PEOPLE):
+    r"""
+    Solve scenarios sharing the same ``ndate`` as one vectorized system.
+
+    Parameters
+    ----------
+    scenarios : :class:`list`
+        List of :class:`Scenario` with the same ``ndate``.
+    method : `str`
+        Integration method passed to :func:`scipy.integrate.solve_ivp`.
+    rtol : `float`
+        Relative tolerance.
+    atol : `float`
+        Absolute tolerance, in people.
+
+    Returns
+    -------
+    y : `numpy.ndarray`
+        Solution of shape ``(len(scenarios), 9, ndate + 1)``.
+    """
+    from scipy.integrate import solve_ivp
+
+    n = len(scenarios)
+    ndate = scenarios[0].ndate
+    params = _model_params(scenarios)
+    initial_state = np.array([s.initial_state() for s in scenarios]).T.ravel()
+    k = len(COMPARTMENTS)
+    population = np.array([s.N for s in scenarios], dtype=float)
+
+    sol = solve_ivp(
+        _stacked_model,
+        [0, ndate],
+        initial_state,
+        args=(R0Table.compile(scenarios), params),
+        t_eval=np.arange(ndate + 1),
+        method=method,
+        rtol=rtol,
+        atol=np.tile(atol / population, k),
+        jac=_stacked_jac if method in ("Radau", "BDF") else None,
+    )
+    return sol.y.reshape(k, n, -1).transpose(1, 0, 2)
+
+
+def _solve_into(path, start, scenarios, method="Radau"):
+    r"""
+    Solve a chunk in a pool process, into rows ``start`` onward of the shared
+    result array stored at ``path``.
+    """
+    out = np.load(path, mmap_mode="r+")
+    out[start : start + len(scenarios)] = _solve_chunk(scenarios, method)
+
+
+def _pool():
+    r"""
+    Process pool shared by all batch calls of this process.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=os.cpu_count())
+    return _executor
+
+
+def _solve_groups(scenarios, parallel, method, chunk_size):
+    r"""
+    Solve scenarios grouped by horizon, one result array per group.
+
+    In parallel, each array is a memory-mapped file of :data:`SHARED_DIR`
+    that the pool processes fill in place, so that no solution is pickled
+    and the caller reads them without copying. The file is removed once
+    solved; the mapping stays valid until the array is released.
+
+    Returns
+    -------
+    groups : `dict`
+        Indices of the scenarios of each ``ndate``.
+    arrays : `dict`
+        Solutions of shape ``(len(indices), 9, ndate + 1)`` of each ``ndate``.
+    """
+    groups = {}
+    for i, s in enumerate(scenarios):
+        groups.setdefault(s.ndate, []).append(i)
+    tasks = [
+        (ndate, k, [scenarios[i] for i in idx[k : k + chunk_size]])
+        for ndate, idx in groups.items()
+        for k in range(0, len(idx), chunk_size)
+    ]
+    if parallel is None:
+        parallel = len(tasks) > 1
+
+    arrays, paths = {}, {}
+    try:
+        for ndate, idx in groups.items():
+            shape = (len(idx), len(COMPARTMENTS), ndate + 1)
+            if not parallel:
+                arrays[ndate] = np.empty(shape)
+                continue
+            fd, paths[ndate] = tempfile.mkstemp(
+                prefix="seiqhcdro-", suffix=".npy", dir=SHARED_DIR
+            )
+            os.close(fd)
+            mapped = np.lib.format.open_memmap(paths[ndate], "w+", float, shape)
+            arrays[ndate] = np.asarray(mapped)
+
+        if parallel:
+            ndates, starts, chunks = zip(*tasks) if tasks else ((), (), ())
+            solve = partial(_solve_into, method=method)
+            for _ in _pool().map(solve, [paths[d] for d in ndates], starts, chunks):
+                pass
+        else:
+            for ndate, k, chunk in tasks:
+                arrays[ndate][k : k + len(chunk)] = _solve_chunk(chunk, method)
+    finally:
+        for path in paths.values():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    return groups, arrays
+
+
+def solve_array(scenarios, parallel=None, method="Radau", chunk_size=CHUNK_SIZE):
+    r"""
+    Solve many scenarios sharing the same horizon into a single array.
+
+    Parameters
+    ----------
+    scenarios, parallel, method, chunk_size
+        See :func:`simulate_batch`.
+
+    Returns
+    -------
+    y : `numpy.ndarray`
+        Compartments of shape ``(len(scenarios), 9, ndate + 1)``, memory-mapped
+        when solved in parallel.
+
+    Raises
+    ------
+    ValueError
+        If the scenarios have different horizons.
+    """
+    scenarios = [
+        s if isinstance(s, Scenario) else Scenario.from_dict(s) for s in scenarios
+    ]
+    if len({s.ndate for s in scenarios}) > 1:
+        raise ValueError('All scenarios must have the same "ndate"')
+    if not scenarios:
+        return np.empty((0, len(COMPARTMENTS), 0))
+    _, arrays = _solve_groups(scenarios, parallel, method, chunk_size)
+    return arrays[scenarios[0].ndate]
+
+
+def simulate_batch(scenarios, parallel=None, method="Radau", chunk_size=CHUNK_SIZE):
+    r"""
+    Solve many scenarios at once.
+
+    Parameters
+    ----------
+    scenarios : :class:`list`
+        List of :class:`Scenario` or dictionaries in the JSON schema.
+    parallel : `bool`
+        Whether to spread chunks over the process pool. By default, only
+        batches of more than one chunk are run in parallel.
+    method : `str`
+        Integration method passed to :func:`scipy.integrate.solve_ivp`.
+    chunk_size : `int`
+        Number of scenarios stacked into one vectorized system.
+
+    Returns
+    -------
+    trajectories : :class:`list`
+        One :class:`Trajectory` per scenario, in the input order.
+    """
+    scenarios = [
+        s if isinstance(s, Scenario) else Scenario.from_dict(s) for s in scenarios
+    ]
+
+    # Group by horizon, so that each chunk shares its time grid
+    groups, arrays = _solve_groups(scenarios, parallel, method, chunk_size)
+
+    out = [None] * len(scenarios)
+    for ndate, idx in groups.items():
+        t = np.arange(ndate + 1)
+        for i, y in zip(idx, arrays[ndate]):
+            out[i] = Trajectory(t, y, scenarios[i])
+    return out
+
+
+class TrajectoryCache:
+    r"""
+    Trajectories of recently solved scenarios, kept one per scenario.
+
+    Scenarios missing from the cache are solved together with
+    :func:`simulate_batch`, so adding a scenario to a comparison only costs its
+    own solve.
+
+    Parameters
+    ----------
+    maxsize : `int`
+        Number of trajectories kept, least recently used first out.
+    """
+
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def solve(self, scenarios, parallel=False, method="Radau"):
+        r"""
+        Solve scenarios, reusing the cached trajectories.
+
+        Parameters
+        ----------
+        scenarios : :class:`list`
+            List of :class:`Scenario` or dictionaries in the JSON schema.
+        parallel : `bool`
+            Whether to spread the missing scenarios over the process pool, see
+            :func:`simulate_batch`.
+        method : `str`
+            Integration method passed to :func:`scipy.integrate.solve_ivp`.
+
+        Returns
+        -------
+        trajectories : :class:`list`
+            One :class:`Trajectory` per scenario, in the input order.
+        """
+        scenarios = [
+            s if isinstance(s, Scenario) else Scenario.from_dict(s) for s in scenarios
+        ]
+        with self._lock:
+            found = {
+                s: self._entries[s, method]
+                for s in scenarios
+                if (s, method) in self._entries
+            }
+
+        missing = [s for s in dict.fromkeys(scenarios) if s not in found]
+        if missing:
+            solved = simulate_batch(missing, parallel=parallel, method=method)
+            found.update(zip(missing, solved))
+
+        with self._lock:
+            for s in scenarios:
+                self._entries[s, method] = found[s]
+                self._entries.move_to_end((s, method))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return [found[s] for s in scenarios]
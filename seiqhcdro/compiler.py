@@ -0,0 +1,264 @@
+"""
+Compiler of compartment models described by their flows.
+
+A :class:`Structure` lists the compartments, the parameters and the flows of a
+model. Each flow moves ``rate * source`` per day from its source to its
+target, times a contact compartment for mass-action terms such as infection.
+:func:`compile_structure` generates the right hand side and its analytic
+Jacobian as plain NumPy code, once per structure, for one scenario or for
+many scenarios stacked compartment-major.
+
+:data:`SEIQHCDRO` is the structure of :func:`~seiqhcdro.model.SEIQHCDRO_model`.
+Variants, e.g. with a vaccinated compartment, are new structures and compile
+the same way.
+"""
+
+import ast
+import keyword
+import re
+from functools import lru_cache
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from .model import COMPARTMENTS, FLOWS, PARAMETERS
+
+# Nodes allowed in rate expressions
+_NODES = (
+    ast.Expression,
+    ast.BinOp,
+    ast.UnaryOp,
+    ast.Name,
+    ast.Load,
+    getattr(ast, "Num", ast.Constant),
+    ast.Constant,
+    ast.Add,
+    ast.Sub,
+    ast.Mult,
+    ast.Div,
+    ast.Pow,
+    ast.USub,
+    ast.UAdd,
+)
+
+# Names used by the generated code
+_RESERVED = re.compile(r"t|y|np|J|[kf]\d+")
+
+
+class Flow(NamedTuple):
+    r"""
+    Flow from ``source`` to ``target`` of ``rate * source * contact`` per day.
+    ``rate`` is an arithmetic expression of the parameters, and ``contact``
+    is `None` for linear flows.
+    """
+
+    source: str
+    target: str
+    rate: str
+    contact: Optional[str] = None
+
+
+class Structure(NamedTuple):
+    r"""
+    Declarative description of a compartment model.
+
+    ``parameters`` are the arguments of the compiled functions after ``t``
+    and ``y``, and ``time_varying`` those that may be given as functions of
+    time.
+    """
+
+    compartments: Tuple[str, ...]
+    parameters: Tuple[str, ...]
+    flows: Tuple[Flow, ...]
+    time_varying: Tuple[str, ...] = ("R_0",)
+
+
+# Every parameter may follow a schedule, see seiqhcdro.schedule
+SEIQHCDRO = Structure(
+    COMPARTMENTS, PARAMETERS, tuple(Flow(*f) for f in FLOWS), time_varying=PARAMETERS
+)
+
+
+class CompiledModel(NamedTuple):
+    r"""
+    Generated functions of a :class:`Structure`.
+
+    ``rhs(t, y, *params)`` returns the list of derivatives, like
+    :func:`~seiqhcdro.model.SEIQHCDRO_model`, and ``jac(t, y, *params)`` the
+    Jacobian as an array of shape ``(k, k) + y[0].shape``. Both accept a state
+    of shape ``(k,)`` or ``(k, m)`` for ``m`` scenarios, with parameters given
+    as scalars or arrays of length ``m``. ``sparsity`` is the ``(k, k)``
+    boolean pattern of the Jacobian, and ``source`` the generated code.
+    """
+
+    structure: Structure
+    rhs: object
+    jac: object
+    sparsity: np.ndarray
+    source: str
+
+    def stacked_rhs(self, t, y, *params):
+        r"""
+        Right hand side of stacked scenarios, as a flat array laid out
+        compartment-major.
+        """
+        k = len(self.structure.compartments)
+        return np.concatenate(self.rhs(t, y.reshape(k, -1), *params))
+
+    def stacked_jac(self, t, y, *params):
+        r"""
+        Sparse Jacobian of :meth:`stacked_rhs`.
+
+        Returns
+        -------
+        jac : `scipy.sparse.csc_matrix`
+            Matrix of shape ``(len(y), len(y))``, with diagonal blocks between
+            each pair of compartments.
+        """
+        from scipy import sparse
+
+        k = len(self.structure.compartments)
+        m = len(y) // k
+        blocks = np.broadcast_to(self.jac(t, y.reshape(k, m), *params), (k, k, m))
+        i, j = np.nonzero(self.sparsity)
+        index = np.arange(m)
+        rows = (i[:, None] * m + index).ravel()
+        cols = (j[:, None] * m + index).ravel()
+        return sparse.csc_matrix(
+            (blocks[i, j].ravel(), (rows, cols)), shape=(k * m, k * m)
+        )
+
+    def stacked_sparsity(self, m):
+        r"""
+        Sparsity pattern of :meth:`stacked_jac` for ``m`` scenarios.
+        """
+        from scipy import sparse
+
+        return sparse.kron(self.sparsity, sparse.identity(m), format="csc")
+
+
+def _check(structure):
+    r"""
+    Check that a structure only uses its own names and plain arithmetic.
+
+    Raises
+    ------
+    ValueError
+        If a name is invalid, unknown or used twice, or if a rate is not an
+        arithmetic expression of the parameters.
+    """
+    names = structure.compartments + structure.parameters
+    for name in names:
+        if (
+            not name.isidentifier()
+            or keyword.iskeyword(name)
+            or _RESERVED.fullmatch(name)
+        ):
+            raise ValueError(f'Invalid name "{name}"')
+    if len(set(names)) != len(names):
+        raise ValueError("Compartment and parameter names must be unique")
+    for p in structure.time_varying:
+        if p not in structure.parameters:
+            raise ValueError(f'Unknown time-varying parameter "{p}"')
+
+    for flow in structure.flows:
+        for c in (flow.source, flow.target, flow.contact):
+            if c is not None and c not in structure.compartments:
+                raise ValueError(f'Unknown compartment "{c}"')
+        try:
+            tree = ast.parse(flow.rate, mode="eval")
+        except SyntaxError:
+            raise ValueError(f'Invalid rate "{flow.rate}"')
+        for node in ast.walk(tree):
+            if not isinstance(node, _NODES):
+                raise ValueError(f'Invalid rate "{flow.rate}"')
+            if isinstance(node, ast.Name) and node.id not in structure.parameters:
+                raise ValueError(f'Unknown parameter "{node.id}" in "{flow.rate}"')
+
+
+def _generate(structure):
+    r"""
+    Python source of the right hand side and Jacobian of a structure.
+
+    Returns
+    -------
+    source : `str`
+        Definitions of ``rhs`` and ``jac``.
+    sparsity : `numpy.ndarray`
+        Boolean pattern of the Jacobian.
+    """
+    compartments = structure.compartments
+    index = {c: i for i, c in enumerate(compartments)}
+    k = len(compartments)
+
+    header = [f"(t, y, {', '.join(structure.parameters)}):"]
+    for p in structure.time_varying:
+        header.append(f"    {p} = {p}(t) if callable({p}) else {p}")
+    header.append(f"    {', '.join(compartments)}{',' if k == 1 else ''} = y")
+    for n, flow in enumerate(structure.flows):
+        header.append(f"    k{n} = {flow.rate}")
+
+    # Right hand side: each flow leaves its source and enters its target
+    terms = {c: [] for c in compartments}
+    rhs = ["def rhs" + header[0]] + header[1:]
+    for n, flow in enumerate(structure.flows):
+        contact = f" * {flow.contact}" if flow.contact else ""
+        rhs.append(f"    f{n} = k{n} * {flow.source}{contact}")
+        terms[flow.source].append(f"- f{n}")
+        terms[flow.target].append(f"+ f{n}")
+    derivatives = []
+    for c in compartments:
+        expr = " ".join(terms[c]).lstrip("+ ")
+        derivatives.append(expr if expr else f"np.zeros_like({c})")
+    rhs.append(f"    return [{', '.join(derivatives)}]")
+
+    # Jacobian: derivatives of each flow by its source and its contact
+    entries = {}
+    for n, flow in enumerate(structure.flows):
+        partials = [
+            (flow.source, f"k{n} * {flow.contact}" if flow.contact else f"k{n}")
+        ]
+        if flow.contact:
+            partials.append((flow.contact, f"k{n} * {flow.source}"))
+        for by, d in partials:
+            j = index[by]
+            entries.setdefault((index[flow.source], j), []).append(f"- {d}")
+            entries.setdefault((index[flow.target], j), []).append(f"+ {d}")
+    jac = ["def jac" + header[0]] + header[1:]
+    jac.append(f"    J = np.zeros(({k}, {k}) + np.shape({compartments[0]}))")
+    sparsity = np.zeros((k, k), dtype=bool)
+    for (i, j), ds in sorted(entries.items()):
+        jac.append(f"    J[{i}, {j}] = {' '.join(ds).lstrip('+ ')}")
+        sparsity[i, j] = True
+    jac.append("    return J")
+
+    return "\n".join(rhs) + "\n\n\n" + "\n".join(jac) + "\n", sparsity
+
+
+@lru_cache(maxsize=None)
+def compile_structure(structure=SEIQHCDRO):
+    r"""
+    Compile a model structure, once per structure.
+
+    Parameters
+    ----------
+    structure : :class:`Structure`
+        Model to compile.
+
+    Returns
+    -------
+    compiled : :class:`CompiledModel`
+        Generated right hand side and Jacobian.
+
+    Raises
+    ------
+    ValueError
+        If the structure is invalid.
+    """
+    _check(structure)
+    source, sparsity = _generate(structure)
+    namespace = {"np": np}
+    exec(compile(source, f"<{', '.join(structure.compartments)}>", "exec"), namespace)
+    return CompiledModel(
+        structure, namespace["rhs"], namespace["jac"], sparsity, source
+    )
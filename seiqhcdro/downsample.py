@@ -0,0 +1,71 @@
+"""
+Downsampling of long series for plotting.
+
+Plots never need more points than they have pixels across. Series are reduced
+with Largest-Triangle-Three-Buckets, which keeps the visual shape of the
+curve, and the global extremes are always kept so that peaks are drawn at
+their true height.
+"""
+
+import numpy as np
+
+
+def lttb(x, y, n):
+    r"""
+    Select points with Largest-Triangle-Three-Buckets.
+
+    Parameters
+    ----------
+    x : `numpy.ndarray`
+        Increasing abscissas.
+    y : `numpy.ndarray`
+        Values. NaN values are only kept if a bucket has nothing else.
+    n : `int`
+        Number of points to keep.
+
+    Returns
+    -------
+    index : `numpy.ndarray`
+        Sorted indices of the kept points, including the first and last points
+        and the largest and smallest values.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    size = len(x)
+    if n >= size or n < 3:
+        return np.arange(size)
+
+    # Interior points are split into n - 2 buckets, one point kept per bucket
+    edges = np.linspace(1, size - 1, n - 1).astype(int)
+    keep = np.empty(n, dtype=int)
+    keep[0], keep[-1] = 0, size - 1
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        ax, ay = x[keep[i]], y[keep[i]]
+        # Third vertex: average of the next bucket, or the last point
+        if i + 2 < len(edges):
+            nxt = y[hi : edges[i + 2]]
+            nxt = nxt[~np.isnan(nxt)]
+            cx = x[hi : edges[i + 2]].mean()
+            cy = nxt.mean() if len(nxt) else ay
+        else:
+            cx, cy = x[-1], y[-1]
+        area = np.abs((ax - cx) * (y[lo:hi] - ay) - (ax - x[lo:hi]) * (cy - ay))
+        area = np.where(np.isnan(area), -1, area)
+        keep[i + 1] = lo + np.argmax(area)
+
+    if not np.all(np.isnan(y)):
+        keep = np.append(keep, [np.nanargmax(y), np.nanargmin(y)])
+    return np.unique(keep)
+
+
+def visible(x, lo, hi):
+    r"""
+    Indices of the points inside ``[lo, hi]``, with one more on each side so
+    that lines reach the edges of the view.
+    """
+    x = np.asarray(x, dtype=float)
+    inside = np.flatnonzero((x >= lo) & (x <= hi))
+    if not len(inside):
+        return inside
+    return np.arange(max(inside[0] - 1, 0), min(inside[-1] + 2, len(x)))
@@ -0,0 +1,297 @@
+"""
+Events located during the integration of a scenario.
+
+Events are found by the root finding of :func:`scipy.integrate.solve_ivp`, so
+their time is precise rather than rounded to the daily samples. Counts are the
+continuous values, before the daily rounding of the plots. Any event can stop
+the integration, so that threshold-only queries, such as whether a scenario
+breaches capacity, do not solve the rest of the horizon. Events of a scenario
+that is already solved are found on its trajectory with :func:`locate`.
+
+Events
+------
+``hospital_capacity``
+    Total hospitalised cases rise above ``hcap``.
+``quarantine_capacity``
+    Total quarantined individuals rise above ``hqar``.
+``peak``
+    Peak of the infectious compartment, where dI/dt changes from positive to
+    negative.
+``rt_below_1``, ``rt_above_1``
+    Effective reproduction number falls below, or rises above, 1.
+"""
+
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from .batch import CHUNK_SIZE, _pool
+from .compiler import compile_structure
+from .scenario import Scenario
+from .simulate import ATOL_PEOPLE, IMPLICIT, RTOL, stage_boundaries
+
+EVENTS = (
+    "hospital_capacity",
+    "quarantine_capacity",
+    "peak",
+    "rt_below_1",
+    "rt_above_1",
+)
+
+# Events stopping a capacity query
+CAPACITY_EVENTS = ("hospital_capacity", "quarantine_capacity")
+
+
+class Events(NamedTuple):
+    r"""
+    Events found in a scenario.
+
+    ``times`` maps each requested event to the days on which it happened.
+    ``stopped`` is the event that stopped the integration at day ``end``, or
+    `None` if the whole horizon was solved.
+    """
+
+    times: dict
+    stopped: Optional[str]
+    end: float
+
+    def first(self, name):
+        r"""
+        First day of an event, or `None` if it did not happen.
+        """
+        times = self.times.get(name)
+        return times[0] if times else None
+
+
+def _event_function(scenario, name):
+    r"""
+    Event function of :func:`scipy.integrate.solve_ivp`, with its direction.
+    """
+    N = scenario.N
+
+    if name == "hospital_capacity":
+
+        def event(t, y, *args):
+            S, E, I, Q, H, C, D, R, O = y
+            return (H + C + D + R) * N - scenario.hcap
+
+        event.direction = 1
+    elif name == "quarantine_capacity":
+
+        def event(t, y, *args):
+            S, E, I, Q, H, C, D, R, O = y
+            return (E + I + Q + H + C + D) * N - scenario.hqar
+
+        event.direction = 1
+    elif name == "peak":
+        model = compile_structure()
+
+        def event(t, y, *args):
+            return model.rhs(t, y, *args)[2]
+
+        event.direction = -1
+    elif name in ("rt_below_1", "rt_above_1"):
+
+        def event(t, y, *args):
+            return scenario.R0(t) - 1
+
+        event.direction = -1 if name == "rt_below_1" else 1
+    else:
+        raise ValueError(f'Unknown event "{name}"')
+    return event
+
+
+def detect(scenario, names=EVENTS, stop=(), method="Radau"):
+    r"""
+    Solve a scenario and locate events.
+
+    Parameters
+    ----------
+    scenario : :class:`Scenario` or `dict`
+        Scenario to solve.
+    names : `tuple`
+        Events to locate, see :data:`EVENTS`.
+    stop : `tuple`
+        Events that stop the integration the first time they happen.
+    method : `str`
+        Integration method passed to :func:`scipy.integrate.solve_ivp`.
+
+    Returns
+    -------
+    events : :class:`Events`
+        Days of each event.
+    """
+    from scipy.integrate import solve_ivp
+
+    if not isinstance(scenario, Scenario):
+        scenario = Scenario.from_dict(scenario)
+
+    functions = []
+    for name in names:
+        event = _event_function(scenario, name)
+        event.terminal = name in stop
+        functions.append(event)
+
+    model = compile_structure()
+    times = {name: [] for name in names}
+    state = scenario.initial_state()
+    edges = [0] + list(stage_boundaries(scenario)) + [scenario.ndate]
+    for a, b in zip(edges[:-1], edges[1:]):
+        sol = solve_ivp(
+            model.rhs,
+            [a, b],
+            state,
+            args=scenario.model_args(),
+            method=method,
+            rtol=RTOL,
+            atol=ATOL_PEOPLE / scenario.N,
+            events=functions,
+            jac=model.jac if method in IMPLICIT else None,
+        )
+        for name, t_events in zip(names, sol.t_events):
+            times[name].extend(float(t) for t in t_events)
+        if sol.status == 1:
+            stopped = next(
+                name for name, t in zip(names, sol.t_events) if name in stop and len(t)
+            )
+            return Events(times, stopped, float(sol.t[-1]))
+        state = sol.y[:, -1]
+    return Events(times, None, float(scenario.ndate))
+
+
+def locate(trajectory, names=EVENTS):
+    r"""
+    Locate events on a solved trajectory, without integrating again.
+
+    Sign changes of each event function are looked for between the samples of
+    the trajectory, within each integration stage, as :func:`detect` does
+    between solver steps. Their day is then found on the solver interpolants,
+    when the trajectory kept them, or else interpolated linearly between the
+    samples. An event happening twice between two samples is missed, while
+    crossings that :func:`detect` skips within one long solver step, such as
+    late peaks once the infectious compartment is nearly empty, are found; the
+    first day of each event agrees.
+
+    Parameters
+    ----------
+    trajectory : :class:`~seiqhcdro.simulate.Trajectory`
+        Solution of a scenario over its whole horizon.
+    names : `tuple`
+        Events to locate, see :data:`EVENTS`.
+
+    Returns
+    -------
+    events : :class:`Events`
+        Days of each event.
+    """
+    from scipy.optimize import brentq
+
+    scenario = trajectory.scenario
+    args = scenario.model_args()
+    functions = [_event_function(scenario, name) for name in names]
+    t = np.asarray(trajectory.t, dtype=float)
+
+    def state(times):
+        if trajectory.dense is not None:
+            return trajectory.state(times)
+        return np.array([np.interp(times, t, row) for row in trajectory.y])
+
+    times = {name: [] for name in names}
+    edges = [0] + list(stage_boundaries(scenario)) + [scenario.ndate]
+    for a, b in zip(edges[:-1], edges[1:]):
+        grid = np.unique(np.concatenate([[a], t[(t > a) & (t < b)], [b]]))
+        y = state(grid)
+        for name, event in zip(names, functions):
+            g = np.array([event(ti, yi, *args) for ti, yi in zip(grid, y.T)])
+            # Same crossings as the root finding of solve_ivp
+            up = (g[:-1] <= 0) & (g[1:] >= 0)
+            down = (g[:-1] >= 0) & (g[1:] <= 0)
+            for k in np.flatnonzero(up if event.direction > 0 else down):
+                t0, t1, g0, g1 = grid[k], grid[k + 1], g[k], g[k + 1]
+                if g0 == g1:
+                    root = t0
+                elif trajectory.dense is not None:
+                    root = brentq(lambda x: event(x, state(x)[:, 0], *args), t0, t1)
+                else:
+                    root = t0 + (t1 - t0) * g0 / (g0 - g1)
+                times[name].append(float(root))
+    return Events(times, None, float(scenario.ndate))
+
+
+def _detect_all(scenarios, names, stop, method):
+    r"""
+    :func:`detect` over a list of scenarios, in one process.
+    """
+    return [detect(s, names, stop, method) for s in scenarios]
+
+
+def detect_batch(
+    scenarios,
+    names=EVENTS,
+    stop=(),
+    method="Radau",
+    parallel=None,
+    chunk_size=CHUNK_SIZE,
+):
+    r"""
+    Locate events in many scenarios.
+
+    Parameters
+    ----------
+    scenarios : :class:`list`
+        List of :class:`Scenario` or dictionaries in the JSON schema.
+    names, stop, method
+        See :func:`detect`.
+    parallel : `bool`
+        Whether to spread chunks over the process pool. By default, only
+        batches of more than one chunk are run in parallel.
+    chunk_size : `int`
+        Number of scenarios per task of the pool.
+
+    Returns
+    -------
+    events : :class:`list`
+        One :class:`Events` per scenario, in the input order.
+    """
+    scenarios = [
+        s if isinstance(s, Scenario) else Scenario.from_dict(s) for s in scenarios
+    ]
+    chunks = [
+        scenarios[k : k + chunk_size] for k in range(0, len(scenarios), chunk_size)
+    ]
+    if parallel is None:
+        parallel = len(chunks) > 1
+    args = (
+        chunks,
+        [names] * len(chunks),
+        [stop] * len(chunks),
+        [method] * len(chunks),
+    )
+    results = _pool().map(_detect_all, *args) if parallel else map(_detect_all, *args)
+    return [e for chunk in results for e in chunk]
+
+
+def breaches(scenarios, parallel=None):
+    r"""
+    First capacity breach of each scenario, stopping each solve at its breach.
+
+    Parameters
+    ----------
+    scenarios : :class:`list`
+        List of :class:`Scenario` or dictionaries in the JSON schema.
+    parallel : `bool`
+        See :func:`detect_batch`.
+
+    Returns
+    -------
+    breaches : :class:`list`
+        ``(day, event)`` of the first breach of each scenario, with ``event``
+        one of :data:`CAPACITY_EVENTS`, or `None` if capacity is never
+        exceeded.
+    """
+    return [
+        (e.end, e.stopped) if e.stopped else None
+        for e in detect_batch(
+            scenarios, CAPACITY_EVENTS, stop=CAPACITY_EVENTS, parallel=parallel
+        )
+    ]
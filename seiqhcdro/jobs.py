@@ -0,0 +1,676 @@
+"""
+Background jobs for long-running analyses.
+
+Jobs are stored in a SQLite database and run in a local process pool, so no
+external broker is needed and every server worker shares the same queue. The
+number of jobs running at once is limited across all workers, job processes
+run at a lower priority than the web workers, and finished jobs are removed
+after a retention period.
+
+Job kinds
+---------
+``batch``
+    ``{"scenarios": [...]}``: summaries of a list of scenarios.
+``sweep``
+    ``{"base": {...}, "grid": {"r0": [...], "pcont[1]": [...]}}``: summaries
+    over the cartesian product of the grid values.
+``montecarlo``
+    ``{"base": {...}, "n": 1000, "seed": 0, "params": {"r0": {"uniform": [3, 5]},
+    "pquar": {"normal": [0.8, 0.05]}}}``: summaries of random draws, with their
+    percentiles. Draws follow one of :data:`DISTRIBUTIONS`.
+``optimize``
+    ``{"base": {...}, "n": 64, "rounds": 4, "seed": 0}``: least restrictive
+    stage schedules within capacity, and the trade-off frontier, see
+    :func:`seiqhcdro.optimize.optimize`, solved in parallel. With ``"surrogate": true``,
+    candidates are pre-screened by the trained emulator, if any.
+``surrogate``
+    ``{"n": 400, "seed": 0, "force": false}``: train the emulator of
+    :mod:`seiqhcdro.surrogate` for the current model, unless it is already
+    trained, and report its held-out scores.
+
+New kinds are added with :func:`register`.
+"""
+
+import itertools
+import json
+import multiprocessing
+import multiprocessing.pool
+import os
+import re
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+
+from .scenario import Scenario
+from .simulate import SUMMARY_FIELDS
+
+# Where the queue and results are kept
+JOBS_DIR = os.environ.get(
+    "SEIQHCDRO_JOBS_DIR", os.path.join(tempfile.gettempdir(), "seiqhcdro-jobs")
+)
+
+# Largest number of jobs running at once, over all server workers
+MAX_RUNNING = int(
+    os.environ.get("SEIQHCDRO_JOBS_MAX_RUNNING", max(1, (os.cpu_count() or 2) - 1))
+)
+
+# Seconds finished jobs and their results are kept
+RETENTION = float(os.environ.get("SEIQHCDRO_JOBS_RETENTION", 7 * 24 * 3600))
+
+# Seconds between two heartbeats of a running job process
+HEARTBEAT = 30
+
+# Running jobs without heartbeat for this many seconds are requeued, unless
+# their process is known to be alive
+STALE = 4 * HEARTBEAT
+
+# Distributions of the Monte Carlo draws, with their number of parameters
+DISTRIBUTIONS = {"uniform": 2, "normal": 2, "lognormal": 2, "triangular": 3, "beta": 2}
+
+# Priority increment of job processes, so web workers are served first
+NICE = 10
+
+# Scenarios solved between two progress updates and cancellation checks
+CHUNK_SIZE = 32
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL,
+    progress REAL NOT NULL DEFAULT 0,
+    cancel INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created REAL NOT NULL,
+    started REAL,
+    updated REAL,
+    finished REAL,
+    host TEXT,
+    pid INTEGER,
+    heartbeat REAL
+)
+"""
+
+# Columns added since the first version of the schema
+MIGRATIONS = {"host": "TEXT", "pid": "INTEGER", "heartbeat": "REAL"}
+
+_kinds = {}
+
+
+class JobCancelled(Exception):
+    r"""
+    Raised inside a job when it has been cancelled.
+    """
+
+
+def register(kind):
+    r"""
+    Register a job kind.
+
+    The decorated function is called in a job process as ``fn(params, job)``,
+    where ``job`` is a :class:`JobContext`, and returns a dictionary of NumPy
+    arrays and JSON-serialisable values.
+    """
+
+    def decorator(fn):
+        _kinds[kind] = fn
+        return fn
+
+    return decorator
+
+
+@contextmanager
+def _connect(path):
+    r"""
+    Open an autocommit connection to the queue database.
+    """
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        yield conn
+    finally:
+        conn.close()
+
+
+def _alive(host, pid):
+    r"""
+    Whether the process owning a job is alive. Processes of other hosts
+    cannot be checked, and are assumed lost once their heartbeat stopped.
+    """
+    if pid is None or host != socket.gethostname():
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobContext:
+    r"""
+    Handle given to a running job, to report progress and honour cancellation.
+
+    While the job runs, a thread records a heartbeat every :data:`HEARTBEAT`
+    seconds, so that the queue can tell a slow job from a lost one.
+    """
+
+    def __init__(self, db, job_id):
+        self.db = db
+        self.id = job_id
+        self.owner = (socket.gethostname(), os.getpid())
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _owned(self, conn):
+        r"""
+        Whether this process still owns the job, i.e. it was not requeued.
+        """
+        row = conn.execute(
+            "SELECT host, pid, cancel FROM jobs WHERE id = ?", (self.id,)
+        ).fetchone()
+        return row is not None and (row["host"], row["pid"]) == self.owner, row
+
+    def start(self):
+        r"""
+        Record this process as the owner of the job, and start its heartbeat.
+        """
+        with _connect(self.db) as conn:
+            conn.execute(
+                "UPDATE jobs SET host = ?, pid = ?, heartbeat = ? WHERE id = ?",
+                self.owner + (time.time(), self.id),
+            )
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._beat, daemon=True)
+        self._thread.start()
+
+    def _beat(self):
+        while not self._stop.wait(HEARTBEAT):
+            with _connect(self.db) as conn:
+                conn.execute(
+                    "UPDATE jobs SET heartbeat = ? WHERE id = ? AND host = ? AND pid = ?",
+                    (time.time(), self.id) + self.owner,
+                )
+
+    def stop(self):
+        r"""
+        Stop the heartbeat.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def progress(self, fraction):
+        r"""
+        Record the progress of the job, and stop it if it has been cancelled
+        or handed to another process.
+
+        Raises
+        ------
+        JobCancelled
+            If the job has been cancelled or requeued.
+        """
+        with _connect(self.db) as conn:
+            conn.execute(
+                "UPDATE jobs SET progress = ?, updated = ?"
+                " WHERE id = ? AND host = ? AND pid = ?",
+                (float(fraction), time.time(), self.id) + self.owner,
+            )
+            owned, row = self._owned(conn)
+        if not owned or row["cancel"]:
+            raise JobCancelled()
+
+
+def _summaries(scenarios, job):
+    r"""
+    Solve scenarios chunk by chunk, reporting progress in between.
+
+    Returns
+    -------
+    summary : `numpy.ndarray`
+        ``(len(scenarios), 5)`` array of :data:`SUMMARY_FIELDS`.
+    """
+    from .batch import simulate_batch
+
+    out = np.empty((len(scenarios), len(SUMMARY_FIELDS)))
+    for k in range(0, len(scenarios), CHUNK_SIZE):
+        chunk = scenarios[k : k + CHUNK_SIZE]
+        for i, traj in enumerate(simulate_batch(chunk, parallel=False)):
+            summary = traj.summary()
+            out[k + i] = [summary[f] for f in SUMMARY_FIELDS]
+        job.progress((k + len(chunk)) / len(scenarios))
+    return out
+
+
+def _set(d, path, value):
+    r"""
+    Set a scenario value by name, or a stage value as ``name[index]``.
+    """
+    match = re.fullmatch(r"(\w+)\[(\d+)\]", path)
+    if match:
+        name, i = match.group(1), int(match.group(2))
+        values = list(d[name])
+        values[i] = value
+        d[name] = values
+    else:
+        d[path] = value
+
+
+@register("batch")
+def _batch_job(params, job):
+    scenarios = [Scenario.from_dict(s) for s in params["scenarios"]]
+    return {"summary": _summaries(scenarios, job), "columns": SUMMARY_FIELDS}
+
+
+@register("sweep")
+def _sweep_job(params, job):
+    base = Scenario.from_dict(params.get("base", {})).to_dict()
+    names = list(params["grid"])
+    points = list(itertools.product(*(params["grid"][n] for n in names)))
+    scenarios = []
+    for point in points:
+        d = dict(base)
+        for name, value in zip(names, point):
+            _set(d, name, value)
+        scenarios.append(Scenario.from_dict(d))
+    return {
+        "summary": _summaries(scenarios, job),
+        "columns": SUMMARY_FIELDS,
+        "names": names,
+        "points": np.array(points, dtype=float),
+    }
+
+
+@register("montecarlo")
+def _montecarlo_job(params, job):
+    rng = np.random.RandomState(params.get("seed"))
+    base = Scenario.from_dict(params.get("base", {})).to_dict()
+    n = int(params.get("n", 100))
+    names = list(params["params"])
+    draws = np.empty((n, len(names)))
+    for j, name in enumerate(names):
+        dist, args = next(iter(params["params"][name].items()))
+        if dist not in DISTRIBUTIONS:
+            raise ValueError(
+                f'Unknown distribution "{dist}", expected one of '
+                + ", ".join(DISTRIBUTIONS)
+            )
+        if len(args) != DISTRIBUTIONS[dist] or not all(
+            isinstance(a, (int, float)) for a in args
+        ):
+            raise ValueError(
+                f'Distribution "{dist}" takes {DISTRIBUTIONS[dist]} numbers'
+            )
+        draws[:, j] = getattr(rng, dist)(*args, size=n)
+    scenarios = []
+    for row in draws:
+        d = dict(base)
+        for name, value in zip(names, row):
+            _set(d, name, float(value))
+        scenarios.append(Scenario.from_dict(d))
+    summary = _summaries(scenarios, job)
+    return {
+        "summary": summary,
+        "columns": SUMMARY_FIELDS,
+        "names": names,
+        "points": draws,
+        "percentiles": np.percentile(summary, [5, 25, 50, 75, 95], axis=0),
+    }
+
+
+def _schedules(candidates):
+    r"""
+    Stage schedules and scores of optimisation candidates, as arrays.
+    """
+    return {
+        "day": np.array([c.scenario.day for c in candidates]),
+        "delta_r0": np.array([c.scenario.delta_r0 for c in candidates]),
+        "pcont": np.array([c.scenario.pcont for c in candidates]),
+        "restriction": np.array([c.restriction for c in candidates]),
+        "hospitalised": np.array([c.hospitalised for c in candidates]),
+        "quarantined": np.array([c.quarantined for c in candidates]),
+    }
+
+
+@register("optimize")
+def _optimize_job(params, job):
+    from .optimize import optimize
+    from .surrogate import get_surrogate
+
+    result = optimize(
+        Scenario.from_dict(params.get("base", {})),
+        n_candidates=int(params.get("n", 64)),
+        rounds=int(params.get("rounds", 4)),
+        seed=params.get("seed"),
+        parallel=True,
+        progress=job.progress,
+        surrogate=get_surrogate() if params.get("surrogate") else None,
+    )
+    arrays = {"evaluated": result.evaluated}
+    for name in ("best", "frontier"):
+        for k, v in _schedules(getattr(result, name)).items():
+            arrays[f"{name}_{k}"] = v
+    return arrays
+
+
+@register("surrogate")
+def _surrogate_job(params, job):
+    from .surrogate import TARGETS, ensure
+
+    surrogate = ensure(
+        n=int(params.get("n", 400)),
+        seed=params.get("seed", 0),
+        force=bool(params.get("force", False)),
+        progress=job.progress,
+    )
+    return {
+        "fingerprint": surrogate.fingerprint,
+        "n_train": surrogate.n_train,
+        "columns": TARGETS,
+        "score": np.array([surrogate.score.get(k, np.nan) for k in TARGETS]),
+    }
+
+
+_niced = False
+
+
+def _run(db, results_dir, job_id, kind, params):
+    r"""
+    Entry point of a job process.
+    """
+    global _niced
+    if not _niced and hasattr(os, "nice"):
+        os.nice(NICE)
+        _niced = True
+
+    job = JobContext(db, job_id)
+    job.start()
+    # Results are written aside, and only kept if this process still owns the
+    # job when it ends
+    tmp = os.path.join(results_dir, f"{job_id}.{os.getpid()}.tmp.npz")
+    try:
+        result = _kinds[kind](params, job)
+        arrays = {k: np.asarray(v) for k, v in result.items()}
+        np.savez_compressed(tmp, **arrays)
+        status, error = "done", None
+    except JobCancelled:
+        status, error = "cancelled", None
+    except Exception as e:
+        status, error = "failed", f"{type(e).__name__}: {e}"
+    finally:
+        job.stop()
+
+    now = time.time()
+    with _connect(db) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        owned, _ = job._owned(conn)
+        if owned:
+            if status == "done":
+                os.replace(tmp, os.path.join(results_dir, job_id + ".npz"))
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished = ?, updated = ?,"
+                " progress = CASE WHEN ? = 'done' THEN 1 ELSE progress END"
+                " WHERE id = ?",
+                (status, error, now, now, status, job_id),
+            )
+        conn.execute("COMMIT")
+    if os.path.exists(tmp):
+        os.remove(tmp)
+
+
+class _JobProcess(multiprocessing.get_context("spawn").Process):
+    r"""
+    Spawned job process, that may start a pool of its own to solve in
+    parallel, unlike the daemonic workers of :class:`multiprocessing.pool.Pool`.
+    """
+
+    @property
+    def daemon(self):
+        return False
+
+    @daemon.setter
+    def daemon(self, value):
+        pass
+
+
+class _JobContext(type(multiprocessing.get_context("spawn"))):
+    Process = _JobProcess
+
+
+class JobQueue:
+    r"""
+    SQLite-backed job queue with a local process pool.
+
+    Parameters
+    ----------
+    path : `str`
+        Directory of the database and result files.
+    max_running : `int`
+        Largest number of jobs running at once, shared by every process using
+        the same directory.
+    retention : `float`
+        Seconds finished jobs are kept.
+    """
+
+    def __init__(self, path=JOBS_DIR, max_running=MAX_RUNNING, retention=RETENTION):
+        self.path = path
+        self.results = os.path.join(path, "results")
+        self.db = os.path.join(path, "jobs.sqlite")
+        self.max_running = max_running
+        self.retention = retention
+        self._pool = None
+        self._wake = threading.Event()
+        self._thread = None
+        os.makedirs(self.results, exist_ok=True)
+        with _connect(self.db) as conn:
+            conn.execute(SCHEMA)
+            columns = {r["name"] for r in conn.execute("PRAGMA table_info(jobs)")}
+            for name, kind in MIGRATIONS.items():
+                if name not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {kind}")
+
+    def submit(self, kind, params):
+        r"""
+        Queue a job.
+
+        Returns
+        -------
+        job_id : `str`
+            Identifier of the new job.
+
+        Raises
+        ------
+        ValueError
+            If the job kind is unknown.
+        """
+        if kind not in _kinds:
+            raise ValueError(f'Unknown job kind "{kind}"')
+        job_id = uuid.uuid4().hex
+        with _connect(self.db) as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, params, status, created) VALUES (?, ?, ?, 'queued', ?)",
+                (job_id, kind, json.dumps(params), time.time()),
+            )
+        self.start()
+        self._wake.set()
+        return job_id
+
+    def get(self, job_id):
+        r"""
+        Status of a job, or `None` if it does not exist.
+        """
+        with _connect(self.db) as conn:
+            row = conn.execute(
+                "SELECT id, kind, status, progress, error, created, started, finished"
+                " FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def list(self, limit=100):
+        r"""
+        Status of the most recent jobs.
+        """
+        with _connect(self.db) as conn:
+            rows = conn.execute(
+                "SELECT id, kind, status, progress, error, created, started, finished"
+                " FROM jobs ORDER BY created DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [dict(r) for r in rows]
+
+    def cancel(self, job_id):
+        r"""
+        Cancel a job. Queued jobs stop at once, running jobs at their next
+        progress update.
+
+        Returns
+        -------
+        found : `bool`
+            Whether the job exists.
+        """
+        with _connect(self.db) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished = ?"
+                " WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id),
+            )
+            cur = conn.execute("UPDATE jobs SET cancel = 1 WHERE id = ?", (job_id,))
+        return cur.rowcount > 0
+
+    def result(self, job_id):
+        r"""
+        Path of the ``.npz`` result of a finished job, or `None`.
+        """
+        path = os.path.join(self.results, job_id + ".npz")
+        return path if os.path.exists(path) else None
+
+    def purge(self):
+        r"""
+        Remove finished jobs older than the retention period, and requeue jobs
+        whose process was lost: without heartbeat for :data:`STALE` seconds,
+        and not running on this host anymore. A job whose process never
+        started is lost once it was claimed :data:`STALE` seconds ago.
+        """
+        now = time.time()
+        with _connect(self.db) as conn:
+            old = conn.execute(
+                "SELECT id FROM jobs WHERE status IN ('done', 'failed', 'cancelled')"
+                " AND finished < ?",
+                (now - self.retention,),
+            ).fetchall()
+            for row in old:
+                path = os.path.join(self.results, row["id"] + ".npz")
+                if os.path.exists(path):
+                    os.remove(path)
+                conn.execute("DELETE FROM jobs WHERE id = ?", (row["id"],))
+            silent = conn.execute(
+                "SELECT id, host, pid FROM jobs WHERE status = 'running'"
+                " AND COALESCE(heartbeat, started) < ?",
+                (now - STALE,),
+            ).fetchall()
+            for row in silent:
+                if _alive(row["host"], row["pid"]):
+                    continue
+                conn.execute(
+                    "UPDATE jobs SET status = CASE WHEN cancel THEN 'cancelled'"
+                    " ELSE 'queued' END, finished = CASE WHEN cancel THEN ? END,"
+                    " started = NULL, host = NULL, pid = NULL, heartbeat = NULL"
+                    " WHERE id = ? AND pid IS ?",
+                    (now, row["id"], row["pid"]),
+                )
+
+    def _claim(self):
+        r"""
+        Atomically move the oldest queued job to running, if the limit allows.
+        """
+        with _connect(self.db) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            running = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = 'running'"
+            ).fetchone()[0]
+            row = None
+            if running < self.max_running:
+                row = conn.execute(
+                    "SELECT id, kind, params FROM jobs WHERE status = 'queued'"
+                    " ORDER BY created LIMIT 1"
+                ).fetchone()
+            if row is not None:
+                now = time.time()
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', started = ?, updated = ?,"
+                    " host = NULL, pid = NULL, heartbeat = NULL WHERE id = ?",
+                    (now, now, row["id"]),
+                )
+            conn.execute("COMMIT")
+        return row
+
+    def _dispatch(self):
+        r"""
+        Dispatcher loop, run in a daemon thread of each server worker.
+        """
+        while True:
+            self.purge()
+            while True:
+                row = self._claim()
+                if row is None:
+                    break
+                # Job processes are spawned, not forked, so that they do not
+                # inherit the open SQLite handles and threads of the server
+                if self._pool is None:
+                    self._pool = multiprocessing.pool.Pool(
+                        self.max_running, context=_JobContext()
+                    )
+                args = (self.db, self.results, row["id"], row["kind"])
+                self._pool.apply_async(
+                    _run,
+                    args + (json.loads(row["params"]),),
+                    callback=lambda _: self._wake.set(),
+                    error_callback=lambda e, job_id=row["id"]: self._failed(job_id, e),
+                )
+            self._wake.wait(timeout=5)
+            self._wake.clear()
+
+    def _failed(self, job_id, error):
+        r"""
+        Mark a job as failed if its process could not run it.
+        """
+        with _connect(self.db) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, finished = ? WHERE id = ?",
+                (repr(error), time.time(), job_id),
+            )
+        self._wake.set()
+
+    def start(self):
+        r"""
+        Start the dispatcher thread of this process, if not running yet.
+        """
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._dispatch, daemon=True)
+            self._thread.start()
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_queue():
+    r"""
+    Job queue of this process, created on first use.
+    """
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+            _queue.start()
+    return _queue
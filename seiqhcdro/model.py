@@ -0,0 +1,225 @@
+"""
+Core equations of the SEIQHCDRO model.
+
+This module only uses plain Python arithmetic, so it can be imported without
+any of the numerical or web dependencies of the application.
+"""
+
+# Order of the compartments in the state vector
+COMPARTMENTS = ("S", "E", "I", "Q", "H", "C", "D", "R", "O")
+
+# Arguments of SEIQHCDRO_model after the state, in order
+PARAMETERS = (
+    "R_0",
+    "T_inf",
+    "T_inc",
+    "T_hsp",
+    "T_crt",
+    "T_icu",
+    "T_quar",
+    "T_quar_hosp",
+    "T_rec",
+    "p_h",
+    "p_c",
+    "p_f",
+    "p_jrnl",
+    "p_quar",
+    "p_quar_hosp",
+    "p_cross_cont",
+)
+
+# Flows of SEIQHCDRO_model, as (source, target, rate, contact): each flow moves
+# rate * source, times the contact compartment if any, from source to target.
+# Rates are expressions of PARAMETERS, see seiqhcdro.compiler.
+FLOWS = (
+    ("S", "E", "R_0 * (1 / T_inf + (1 - p_h) / T_rec)", "I"),
+    ("E", "I", "1 / T_inc", None),
+    ("E", "Q", "p_quar / T_quar", None),
+    ("I", "H", "p_h / T_inf", None),
+    ("I", "O", "(1 - p_h) / T_rec", None),
+    ("Q", "H", "(p_quar_hosp + p_cross_cont) / T_quar_hosp", None),
+    ("H", "R", "(1 - p_c) / T_hsp", None),
+    ("H", "C", "p_c / T_crt", None),
+    ("H", "O", "p_h / T_rec", None),
+    ("C", "D", "p_f / (T_icu + T_crt)", None),
+    ("C", "R", "(1 - p_f) / (T_icu + T_crt)", None),
+)
+
+
+def R0_dynamic(t, r0, delta_r0, pcont, day):
+    r"""
+    Get R0 based on day and stage inputs.
+
+    Parameters
+    ----------
+    t : `int`
+        Number of days passed since initial outbreak.
+    r0 : `float`
+        Basic reproduction number before any policy stage.
+    delta_r0 : `list`
+        Reduction of R0 through each stage.
+    pcont : `list`
+        Containing proportion through each stage.
+    day : `list`
+        Starting day of each stage.
+
+    Returns
+    -------
+    r0 : `float`
+        Corresponding reproductive number.
+    """
+    # Default stage when created initially
+    if not delta_r0 or not pcont or not day:
+        return 4.1
+    # No change yet: Keep to default
+    elif t < day[0]:
+        return r0
+    else:
+        i = 0
+        # Check which stage t is in
+        while t >= day[i]:
+            if (i == len(day) - 1) or (t < day[i + 1]):
+                break
+            i += 1
+        # Initial stage
+        if i == 0:
+            return (
+                r0 * (1 - pcont[0])
+                - 2 * delta_r0[0] / 30 * (t - (day[0] - 1)) * pcont[0]
+            )
+        else:
+            # Recursively call the function, as R0 works in a similar fashion to Hidden Markov Model
+            prev = R0_dynamic(day[i] - 1, r0, delta_r0, pcont, day)
+            # If there is increase in proportion contamination (See formula for details)
+            if pcont[i] >= pcont[i - 1]:
+                return max(
+                    min(prev, r0 * (1 - pcont[i]))
+                    - 2 * delta_r0[i] / 30 * (t - (day[i] - 1)) * pcont[i],
+                    0,
+                )
+            # If there is decrease in proportion contamination (See formula for details)
+            else:
+                if min(prev, r0 * (1 - pcont[i])) > 0:
+                    return min(prev, r0 * (1 - pcont[i])) + 2 * delta_r0[i] / 30 * (
+                        t - (day[i] - 1)
+                    ) * (1 - pcont[i])
+                else:
+                    return 0.0
+
+
+def SEIQHCDRO_model(
+    t,
+    y,
+    R_0,
+    T_inf,
+    T_inc,
+    T_hsp,
+    T_crt,
+    T_icu,
+    T_quar,
+    T_quar_hosp,
+    T_rec,
+    p_h,
+    p_c,
+    p_f,
+    p_jrnl,
+    p_quar,
+    p_quar_hosp,
+    p_cross_cont,
+):
+    """
+    Main function of SEIQHCDRO model.
+
+    Parameters:
+    ---
+    t: time step for solve_ivp
+    y: solution of previous timestep (or initial solution)
+    R_0: basic reproduction number. This can be a constant, or a function with respect to time. These two cases are handled using an if condition of the callability of R_0.
+    Every other parameter may be a function of time as well, e.g. a seiqhcdro.schedule.Lookup.
+    T_inf: infectious period of an infected agent
+    T_inc: incubation time
+    T_hsp: duration for an infected agent to check into a health agency
+    T_crt: duration for a hospitalised person to turn into a critical case since the initial check-in
+    T_icu: duration for a person to stay in the Intensive Care Unit until a clinical outcome has been decided (Recovered or Death)
+    T_quar: duration of quarantine, indicated by the government
+    T_quar_hosp: duration from the start of quarantine until the patient get tested positive for COVID-19 and hospitalised
+    T_rec: recovery time
+    p_h: proportion of hospitalised patients
+    p_c: proportion of hospitalised patients who switched to a critical case
+    p_f: proportion of critical cases resulting in death
+    p_jrnl: the reduced percentage of contact tracing between individuals in the population due to policy measures. The percentage of p_jrnl are kept constant, since COVID-19 news, policies and activities are updated everyday, regardless whether there is an outbreak.
+    p_quar: proportion of exposed individual who are quarantined, either at home or at a facility under the supervision of local authority
+    p_quar_hosp: proportion of quarantined individuals who are infected with COVID-19 and hospitalised
+    p_cross_cont: cross contamination ratio within quarantined facility under the supervision of local authority
+
+    Returns
+    ---
+    dy_dt: `list`
+        List of numerical derivatives calculated.
+    """
+
+    # Check if R is constant or not
+    R_t = R_0(t) if callable(R_0) else R_0
+
+    # Scheduled parameters are functions of time as well
+    (
+        T_inf,
+        T_inc,
+        T_hsp,
+        T_crt,
+        T_icu,
+        T_quar,
+        T_quar_hosp,
+        T_rec,
+        p_h,
+        p_c,
+        p_f,
+        p_jrnl,
+        p_quar,
+        p_quar_hosp,
+        p_cross_cont,
+    ) = [
+        p(t) if callable(p) else p
+        for p in (
+            T_inf,
+            T_inc,
+            T_hsp,
+            T_crt,
+            T_icu,
+            T_quar,
+            T_quar_hosp,
+            T_rec,
+            p_h,
+            p_c,
+            p_f,
+            p_jrnl,
+            p_quar,
+            p_quar_hosp,
+            p_cross_cont,
+        )
+    ]
+
+    S, E, I, Q, H, C, D, R, O = y
+
+    dS_dt = -R_t * (1 / T_inf + (1 - p_h) / T_rec) * I * S
+    dE_dt = (
+        R_t * (1 / T_inf + (1 - p_h) / T_rec) * I * S
+        - 1 / T_inc * E
+        - p_quar * (E) / T_quar
+    )
+    dI_dt = 1 / T_inc * E - (p_h / T_inf + (1 - p_h) / T_rec) * I
+    dQ_dt = p_quar * (E) / T_quar - (p_quar_hosp + p_cross_cont) * Q / T_quar_hosp
+    dH_dt = (
+        p_h / T_inf * I
+        - (1 - p_c) / T_hsp * H
+        - p_c / T_crt * H
+        - p_h / T_rec * H
+        + (p_quar_hosp + p_cross_cont) * Q / T_quar_hosp
+    )
+    dC_dt = p_c / T_crt * H - C / (T_icu + T_crt)
+    dD_dt = p_f / (T_icu + T_crt) * C
+    dR_dt = (1 - p_c) / T_hsp * H + (1 - p_f) / (T_icu + T_crt) * C
+    dO_dt = (1 - p_h) / T_rec * I + p_h / T_rec * H
+
+    dy_dt = [dS_dt, dE_dt, dI_dt, dQ_dt, dH_dt, dC_dt, dD_dt, dR_dt, dO_dt]
+    return dy_dt
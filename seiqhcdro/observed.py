@@ -0,0 +1,396 @@
+"""
+Observed statistics uploaded for comparison with the model.
+
+Uploaded files are parsed once and stored on disk in a columnar layout, keyed
+by the SHA-256 hash of their content. Callbacks only pass the key around, and
+loading a stored dataset memory-maps its columns instead of touching the
+original CSV again.
+
+File format
+-----------
+A CSV file with any of the :data:`COLUMNS`. With a ``date`` column, rows are
+placed on the calendar and resampled to daily values. The counts of
+:data:`FLOW_COLUMNS` are new cases since the previous row of the column, so
+weekly or irregular counts are spread evenly over the days they cover; the
+other columns are totals on the day, and are interpolated linearly between
+rows. Without a ``date`` column, the first row is the first day of the
+outbreak and each row is one day.
+
+With a ``region`` column, the rows of each region are resampled on their own,
+or counted from the first day of the outbreak without a ``date`` column, and
+then summed day by day over the regions. Each region is also kept apart, to be
+loaded with ``region=``.
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+# Where parsed datasets are kept, shared by every server worker
+DATA_DIR = os.environ.get(
+    "SEIQHCDRO_DATA_DIR", os.path.join(tempfile.gettempdir(), "seiqhcdro-data")
+)
+
+# Columns that can be compared with the model output
+COLUMNS = (
+    "infected",
+    "daily_infected",
+    "active_critical",
+    "active_quarantined",
+    "deaths",
+)
+
+# Columns counting new cases over the period since their previous row
+FLOW_COLUMNS = ("daily_infected",)
+
+# Rows parsed at once, to bound memory on large files
+CHUNK_ROWS = 100000
+
+# Version of the stored layout, bumped when parsing changes so that files are
+# parsed again
+FORMAT = 3
+
+_KEY = re.compile(r"[0-9a-f]{64}")
+
+
+class Dataset(NamedTuple):
+    r"""
+    Daily observed statistics.
+
+    ``start`` is the date of the first row, or `None` if the rows are counted
+    from the first day of the outbreak. ``columns`` maps each available column
+    of :data:`COLUMNS` to its daily values, with NaN where nothing is known.
+    """
+
+    start: Optional[str]
+    columns: dict
+
+    def align(self, date, ndate):
+        r"""
+        Place the observations on the days of a scenario.
+
+        Parameters
+        ----------
+        date : `str`
+            Start date of the scenario.
+        ndate : `int`
+            Number of days of the scenario.
+
+        Returns
+        -------
+        columns : `dict`
+            Array of ``ndate + 1`` values per column, one per scenario day, with
+            NaN outside the observed period.
+        """
+        offset = 0
+        if self.start is not None:
+            offset = int(
+                (np.datetime64(self.start, "D") - np.datetime64(date[:10], "D"))
+                / np.timedelta64(1, "D")
+            )
+        aligned = {}
+        for k, v in self.columns.items():
+            out = np.full(ndate + 1, np.nan)
+            lo, hi = max(0, offset), min(ndate + 1, offset + len(v))
+            if lo < hi:
+                out[lo:hi] = v[lo - offset : hi - offset]
+            aligned[k] = out
+        return aligned
+
+
+def content_key(source):
+    r"""
+    Key of an uploaded file, i.e. the SHA-256 hash of its content.
+
+    Parameters
+    ----------
+    source : `bytes` or `str`
+        Raw file content, or the name of the file.
+
+    Returns
+    -------
+    key : `str`
+        Hexadecimal digest.
+    """
+    if isinstance(source, bytes):
+        return hashlib.sha256(source).hexdigest()
+    h = hashlib.sha256()
+    with open(source, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _path(key, path=DATA_DIR):
+    r"""
+    Directory of a stored dataset, checking that the key is a valid digest.
+    """
+    if not isinstance(key, str) or not _KEY.fullmatch(key):
+        raise ValueError(f'Invalid dataset key "{key}"')
+    return os.path.join(path, f"v{FORMAT}", key)
+
+
+def _daily(frame):
+    r"""
+    Daily values of a frame of rows indexed by sorted dates.
+    """
+    import pandas as pd
+
+    daily = frame.asfreq("D")
+    for k in daily.columns:
+        if k not in FLOW_COLUMNS:
+            daily[k] = daily[k].interpolate(limit_area="inside")
+            continue
+        # Each count covers the days since the previous count of the column
+        counts = frame[k].dropna()
+        out = np.full(len(daily), np.nan)
+        if len(counts):
+            days = ((counts.index - daily.index[0]) / pd.Timedelta(days=1)).astype(int)
+            days = np.asarray(days)
+            gaps = np.diff(days, prepend=days[0] - 1)
+            out[days[0] : days[-1] + 1] = np.repeat(counts.to_numpy() / gaps, gaps)
+        daily[k] = out
+    return daily
+
+
+def _parse(source, chunk_rows=CHUNK_ROWS):
+    r"""
+    Read a CSV file into daily values, over all regions and by region.
+
+    Returns
+    -------
+    datasets : `dict`
+        :class:`Dataset` of all regions under `None`, and of each region
+        under its name.
+    """
+    import io
+
+    import pandas as pd
+
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    reader = pd.read_csv(
+        source,
+        usecols=lambda c: c in COLUMNS or c in ("date", "region"),
+        dtype=dict({k: "float64" for k in COLUMNS}, date=str, region=str),
+        chunksize=chunk_rows,
+    )
+
+    parts = []
+    dated = None
+    for chunk in reader:
+        if dated is None:
+            dated = "date" in chunk.columns
+        values = chunk[[k for k in COLUMNS if k in chunk.columns]]
+        region = chunk["region"] if "region" in chunk.columns else None
+        region = pd.Series("", index=chunk.index) if region is None else region
+        region = region.fillna("").str.strip()
+        if dated:
+            # Reduce each chunk to one row per region and date as it is read
+            index = pd.to_datetime(chunk["date"], errors="coerce")
+            valid = index.notna().to_numpy()
+            keys = [region[valid].to_numpy(), index[valid].dt.normalize().to_numpy()]
+            values = values[valid].groupby(keys).sum(min_count=1)
+        else:
+            values = values.set_index(region.to_numpy())
+        parts.append(values)
+
+    if not parts:
+        return {None: Dataset(None, {})}
+    frame = pd.concat(parts)
+    if frame.empty:
+        return {None: Dataset(None, {})}
+
+    # Each region is made daily on its own dates, then the regions are summed
+    # day by day, so that regions reporting on different days add up
+    if dated:
+        frame = frame.groupby(level=[0, 1]).sum(min_count=1)
+        frames = {
+            region: _daily(rows.droplevel(0).sort_index())
+            for region, rows in frame.groupby(level=0)
+        }
+    else:
+        # Without dates, the rows of each region count days from the outbreak
+        frames = {
+            region: rows.reset_index(drop=True)
+            for region, rows in frame.groupby(level=0, sort=False)
+        }
+    total = pd.concat(frames.values()).groupby(level=0).sum(min_count=1)
+    if dated:
+        total = total.asfreq("D")
+    frames = {region: rows for region, rows in frames.items() if region}
+    frames[None] = total
+
+    out = {}
+    for region, daily in frames.items():
+        start = str(daily.index[0].date()) if dated else None
+        out[region] = Dataset(start, {k: daily[k].to_numpy() for k in daily.columns})
+    return out
+
+
+def parse_csv(source, chunk_rows=CHUNK_ROWS, region=None):
+    r"""
+    Read the comparable columns of a CSV file into daily values.
+
+    Parameters
+    ----------
+    source : `bytes` or `str`
+        Raw CSV content, or the name of the file.
+    chunk_rows : `int`
+        Rows parsed at once.
+    region : `str`
+        Only read the rows of this region, by default those of all regions.
+
+    Returns
+    -------
+    dataset : :class:`Dataset`
+        Daily values of each column of :data:`COLUMNS` found in the file.
+
+    Raises
+    ------
+    ValueError
+        If the file has no rows of the region.
+    """
+    datasets = _parse(source, chunk_rows)
+    return datasets[_region(datasets, region)]
+
+
+def _region(names, region):
+    r"""
+    Name of a region among those of a file, ignoring case, or `None`.
+    """
+    if region is None:
+        return None
+    for name in names:
+        if name is not None and name.lower() == region.strip().lower():
+            return name
+    raise ValueError(f'No rows of region "{region}"')
+
+
+def _write(dataset, directory):
+    r"""
+    Write the columns of a dataset and its ``meta.json`` to a directory.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for k, v in dataset.columns.items():
+        np.save(os.path.join(directory, k + ".npy"), v)
+    with open(os.path.join(directory, "meta.json"), "w") as f:
+        json.dump({"start": dataset.start, "columns": list(dataset.columns)}, f)
+
+
+def _read(directory):
+    r"""
+    Read a dataset written by :func:`_write`, with its columns memory-mapped.
+    """
+    with open(os.path.join(directory, "meta.json")) as f:
+        meta = json.load(f)
+    columns = {
+        k: np.load(os.path.join(directory, k + ".npy"), mmap_mode="r")
+        for k in meta["columns"]
+    }
+    return Dataset(meta["start"], columns)
+
+
+def ingest(source, path=DATA_DIR):
+    r"""
+    Parse a CSV file and store it, unless it is already stored.
+
+    Parameters
+    ----------
+    source : `bytes` or `str`
+        Raw CSV content, or the name of the file.
+    path : `str`
+        Directory of the stored datasets.
+
+    Returns
+    -------
+    key : `str`
+        Key to :func:`load` the dataset with.
+    """
+    key = content_key(source)
+    target = _path(key, path)
+    if os.path.exists(target):
+        return key
+
+    datasets = _parse(source)
+    regions = sorted(k for k in datasets if k is not None)
+    parent = os.path.dirname(target)
+    os.makedirs(parent, exist_ok=True)
+    # Write to a temporary directory first, so readers never see a partial one
+    tmp = tempfile.mkdtemp(dir=parent)
+    _write(datasets[None], tmp)
+    # Each region in a numbered directory, as names need not be valid paths
+    for i, region in enumerate(regions):
+        _write(datasets[region], os.path.join(tmp, "regions", str(i)))
+    with open(os.path.join(tmp, "regions.json"), "w") as f:
+        json.dump(regions, f)
+    try:
+        os.rename(tmp, target)
+    except OSError:
+        # Stored concurrently by another worker
+        shutil.rmtree(tmp, ignore_errors=True)
+    return key
+
+
+def regions(key, path=DATA_DIR):
+    r"""
+    Regions of a stored dataset.
+
+    Parameters
+    ----------
+    key : `str`
+        Key returned by :func:`ingest`.
+    path : `str`
+        Directory of the stored datasets.
+
+    Returns
+    -------
+    regions : `list`
+        Names of the regions found in the ``region`` column, sorted, or an
+        empty list if the file has none.
+    """
+    with open(os.path.join(_path(key, path), "regions.json")) as f:
+        return json.load(f)
+
+
+@lru_cache(maxsize=16)
+def load(key, region=None, path=DATA_DIR):
+    r"""
+    Load a stored dataset, with its columns memory-mapped.
+
+    Parameters
+    ----------
+    key : `str`
+        Key returned by :func:`ingest`.
+    region : `str`
+        Only the rows of this region, ignoring case, by default the sum over
+        all regions.
+    path : `str`
+        Directory of the stored datasets.
+
+    Returns
+    -------
+    dataset : :class:`Dataset`
+        Stored dataset, read-only.
+
+    Raises
+    ------
+    ValueError
+        If the key is not a valid digest, or the file has no rows of the
+        region.
+    FileNotFoundError
+        If no dataset is stored under this key.
+    """
+    target = _path(key, path)
+    if region is None:
+        return _read(target)
+    names = regions(key, path)
+    index = names.index(_region(names, region))
+    return _read(os.path.join(target, "regions", str(index)))
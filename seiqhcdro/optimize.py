@@ -0,0 +1,297 @@
+"""
+Search of policy stage schedules against hospital and quarantine capacity.
+
+Candidate schedules are drawn around the current one, screened in vectorized
+batches and refined over a few rounds. A candidate is feasible when its worst
+hospitalised and quarantined counts, as reported in the summary export, stay
+within ``hcap`` and ``hqar``. Screening integrates in windows and drops every
+candidate as soon as it crosses capacity, so infeasible schedules only cost
+the days until their breach. With an emulator of :mod:`seiqhcdro.surrogate`,
+candidates that it confidently predicts over capacity are not solved at all.
+
+The least restrictive schedule is the one with the smallest
+:func:`restriction`, i.e. the smallest average relative reduction of R0 over
+the horizon.
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+
+from .batch import (
+    CHUNK_SIZE,
+    R0Table,
+    _model_params,
+    _pool,
+    _stacked_jac,
+    _stacked_model,
+)
+from .model import COMPARTMENTS
+from .scenario import Scenario
+from .simulate import ATOL_PEOPLE, RTOL, Trajectory
+
+# Days integrated between two capacity checks
+WINDOW = 30
+
+
+class Candidate(NamedTuple):
+    r"""
+    Evaluated stage schedule.
+
+    ``hospitalised`` and ``quarantined`` are the worst-day counts of feasible
+    candidates, and NaN for candidates dropped at ``breach``, the first day
+    over capacity.
+    """
+
+    scenario: Scenario
+    restriction: float
+    hospitalised: float
+    quarantined: float
+    breach: float
+
+    @property
+    def feasible(self):
+        r"""
+        Whether the schedule stays within capacity over the whole horizon.
+        """
+        return self.breach == np.inf
+
+
+class Optimization(NamedTuple):
+    r"""
+    Result of :func:`optimize`.
+
+    ``best`` holds the least restrictive feasible schedules, ``frontier`` the
+    feasible schedules for which no other is both less restrictive and less
+    demanding on hospitals, by increasing restriction.
+    """
+
+    best: list
+    frontier: list
+    evaluated: int
+
+
+def restriction(scenario):
+    r"""
+    Average relative reduction of R0 over the horizon of a scenario.
+    """
+    r0 = np.array([scenario.R0(t) for t in range(scenario.ndate + 1)])
+    return float(np.mean(1 - r0 / scenario.r0))
+
+
+def _screen_chunk(scenarios, window=WINDOW):
+    r"""
+    Solve scenarios sharing the same ``ndate``, dropping each one at its first
+    capacity breach.
+
+    Returns
+    -------
+    y : `numpy.ndarray`
+        Solution of shape ``(len(scenarios), 9, ndate + 1)``, valid up to the
+        breach of each scenario.
+    breach : `numpy.ndarray`
+        First day over capacity of each scenario, ``inf`` if none.
+    """
+    from scipy.integrate import solve_ivp
+
+    n, k = len(scenarios), len(COMPARTMENTS)
+    ndate = scenarios[0].ndate
+    population = np.array([s.N for s in scenarios], dtype=float)
+    hcap = np.array([s.hcap for s in scenarios], dtype=float)
+    hqar = np.array([s.hqar for s in scenarios], dtype=float)
+
+    y = np.full((n, k, ndate + 1), np.nan)
+    y[:, :, 0] = [s.initial_state() for s in scenarios]
+    breach = np.full(n, np.inf)
+    active = np.arange(n)
+    t0 = 0
+    while t0 < ndate and len(active):
+        t1 = min(t0 + window, ndate)
+        sub = [scenarios[i] for i in active]
+        m = len(sub)
+        params = _model_params(sub)
+        sol = solve_ivp(
+            _stacked_model,
+            [t0, t1],
+            y[active, :, t0].T.ravel(),
+            args=(R0Table.compile(sub), params),
+            t_eval=np.arange(t0 + 1, t1 + 1),
+            method="Radau",
+            rtol=RTOL,
+            atol=np.tile(ATOL_PEOPLE / population[active], k),
+            jac=_stacked_jac,
+        )
+        ys = sol.y.reshape(k, m, -1).transpose(1, 0, 2)
+        y[active, :, t0 + 1 : t1 + 1] = ys
+
+        # Same counts as the summary export. Hospitalised counts are reported
+        # with a one day lag, so the last day cannot breach.
+        S, E, I, Q, H, C, D, R, O = ys.transpose(1, 0, 2)
+        N = population[active, None]
+        hsp = np.round((H + C + D + R) * N)
+        qar = np.round((E + I + Q + H + C + D) * N)
+        days = np.arange(t0 + 1, t1 + 1)
+        over = (hsp > hcap[active, None]) & (days < ndate) | (qar > hqar[active, None])
+        hit = over.any(axis=1)
+        breach[active[hit]] = days[np.argmax(over[hit], axis=1)]
+        active = active[~hit]
+        t0 = t1
+    return y, breach
+
+
+def evaluate(scenarios, parallel=None, chunk_size=CHUNK_SIZE):
+    r"""
+    Screen stage schedules against capacity.
+
+    Parameters
+    ----------
+    scenarios : :class:`list`
+        List of :class:`Scenario` with the same ``ndate``.
+    parallel : `bool`
+        Whether to spread chunks over the process pool. By default, only
+        batches of more than one chunk are run in parallel.
+    chunk_size : `int`
+        Number of scenarios screened together in one vectorized system.
+
+    Returns
+    -------
+    candidates : :class:`list`
+        One :class:`Candidate` per scenario, in the input order.
+    """
+    chunks = [
+        scenarios[k : k + chunk_size] for k in range(0, len(scenarios), chunk_size)
+    ]
+    if parallel is None:
+        parallel = len(chunks) > 1
+    results = (
+        _pool().map(_screen_chunk, chunks) if parallel else map(_screen_chunk, chunks)
+    )
+
+    candidates = []
+    for chunk, (y, breach) in zip(chunks, results):
+        for s, yi, b in zip(chunk, y, breach):
+            hospitalised = quarantined = np.nan
+            if b == np.inf:
+                summary = Trajectory(np.arange(s.ndate + 1), yi, s).summary()
+                hospitalised = float(summary["hospitalised"])
+                quarantined = float(summary["quarantined"])
+            candidates.append(
+                Candidate(s, restriction(s), hospitalised, quarantined, float(b))
+            )
+    return candidates
+
+
+def _propose(center, rng, n, spread):
+    r"""
+    Draw ``n`` stage schedules around the one of ``center``.
+    """
+    k = len(center.day)
+    pcont = np.clip(np.array(center.pcont) + rng.normal(0, spread, (n, k)), 0, 1)
+    delta_r0 = np.array(center.delta_r0) * np.exp(rng.normal(0, spread, (n, k)))
+    day = np.array(center.day) + rng.normal(0, 30 * spread, (n, k))
+    day = np.sort(np.clip(np.round(day), 1, center.ndate), axis=1)
+    return [
+        center._replace(
+            pcont=tuple(np.round(p, 2).tolist()),
+            delta_r0=tuple(np.round(d, 2).tolist()),
+            day=tuple(int(i) for i in t),
+        )
+        for p, d, t in zip(pcont, delta_r0, day)
+    ]
+
+
+def optimize(
+    scenario,
+    n_candidates=64,
+    rounds=4,
+    spread=0.2,
+    keep=5,
+    seed=None,
+    parallel=None,
+    progress=None,
+    surrogate=None,
+):
+    r"""
+    Search the least restrictive stage schedule that stays within capacity.
+
+    The stage days, R0 reductions and contained proportions are varied, while
+    the number of stages and every other input are kept.
+
+    Parameters
+    ----------
+    scenario : :class:`Scenario` or `dict`
+        Starting scenario, with at least one stage.
+    n_candidates : `int`
+        Schedules screened per round.
+    rounds : `int`
+        Number of rounds. Each round draws around the least restrictive
+        feasible schedule found so far, with a smaller spread.
+    spread : `float`
+        Initial spread of the draws, as a contained proportion. Days vary by 30
+        times as much.
+    keep : `int`
+        Number of schedules returned in ``best``.
+    seed : `int`
+        Seed of the random draws.
+    parallel : `bool`
+        Whether to spread the screening over the process pool, see
+        :func:`evaluate`.
+    progress : `callable`
+        Called with the completed fraction after each round.
+    surrogate : :class:`seiqhcdro.surrogate.Surrogate`
+        Emulator used to skip candidates whose low estimate is already over
+        capacity.
+
+    Returns
+    -------
+    result : :class:`Optimization`
+        Best schedules and trade-off frontier.
+
+    Raises
+    ------
+    ValueError
+        If the scenario has no stage.
+    """
+    if not isinstance(scenario, Scenario):
+        scenario = Scenario.from_dict(scenario)
+    if not scenario.day:
+        raise ValueError("At least one stage is needed to optimise")
+
+    rng = np.random.RandomState(seed)
+    seen = {}
+    center = scenario
+    for r in range(rounds):
+        proposals = _propose(center, rng, n_candidates, spread * 0.6**r)
+        if surrogate is not None:
+            previews = surrogate.predict(proposals)
+            proposals = [
+                s
+                for s, p in zip(proposals, previews)
+                if p is None
+                or (p.low["hospitalised"] <= s.hcap and p.low["quarantined"] <= s.hqar)
+            ]
+        if r == 0:
+            proposals.insert(0, scenario)
+        proposals = [s for s in dict.fromkeys(proposals) if s not in seen]
+        for c in evaluate(proposals, parallel=parallel):
+            seen[c.scenario] = c
+
+        feasible = [c for c in seen.values() if c.feasible]
+        if feasible:
+            center = min(feasible, key=lambda c: c.restriction).scenario
+        else:
+            # Move towards feasibility: latest breach, then most restrictive
+            center = max(
+                seen.values(), key=lambda c: (c.breach, c.restriction)
+            ).scenario
+        if progress is not None:
+            progress((r + 1) / rounds)
+
+    feasible = sorted(
+        (c for c in seen.values() if c.feasible), key=lambda c: c.restriction
+    )
+    frontier = []
+    for c in feasible:
+        if not frontier or c.hospitalised < frontier[-1].hospitalised:
+            frontier.append(c)
+    return Optimization(feasible[:keep], frontier, len(seen))
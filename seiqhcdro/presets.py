@@ -0,0 +1,236 @@
+"""
+Registry of preset scenarios, parsed once and solved ahead of use.
+
+Presets come from the ``sample`` module and from any JSON files stored under
+``SEIQHCDRO_PRESETS_DIR``, one scenario per file in the ``btn_ipt`` export
+schema, with optional ``name`` and ``region`` keys. They are indexed by key
+and by region, and :meth:`PresetRegistry.warm` solves them in a background
+thread so that selecting a preset only looks its solution up.
+"""
+
+import glob
+import os
+import threading
+from collections import defaultdict
+from typing import NamedTuple, Optional
+
+from .scenario import Scenario
+from .simulate import simulate
+
+# Directory of additional stored presets, if any
+PRESETS_DIR = os.environ.get("SEIQHCDRO_PRESETS_DIR")
+
+# Whether server workers solve the presets when they start
+WARM = os.environ.get("SEIQHCDRO_PRESETS_WARM", "1") != "0"
+
+
+class Preset(NamedTuple):
+    r"""
+    Named scenario. ``region`` is the place it was calibrated for, by default
+    the part of the name before the first comma or parenthesis.
+    """
+
+    key: str
+    name: str
+    region: Optional[str]
+    scenario: Scenario
+
+
+def _region(name):
+    r"""
+    Region of a preset name such as ``"Hai Duong, Vietnam (1/2021-3/2021)"``.
+    """
+    return name.split(",")[0].split("(")[0].strip() or None
+
+
+class PresetRegistry:
+    r"""
+    Preset scenarios, with their solutions once solved.
+    """
+
+    def __init__(self):
+        self._presets = {}
+        self._regions = defaultdict(list)
+        self._keys = {}
+        self._solved = {}
+        self._lock = threading.Lock()
+
+    def add(self, key, scenario, name=None, region=None):
+        r"""
+        Register a preset, replacing any preset with the same key.
+
+        Parameters
+        ----------
+        key : `str`
+            Identifier, e.g. the value of the sample picker.
+        scenario : :class:`Scenario`, `dict` or `str`
+            Scenario, as an object, a dictionary or a JSON string.
+        name : `str`
+            Displayed name, the key by default.
+        region : `str`
+            Region, see :class:`Preset`.
+
+        Returns
+        -------
+        preset : :class:`Preset`
+            Registered preset.
+        """
+        if isinstance(scenario, (str, bytes)):
+            scenario = Scenario.from_json(scenario)
+        elif not isinstance(scenario, Scenario):
+            scenario = Scenario.from_dict(scenario)
+        name = name or key
+        preset = Preset(key, name, region or _region(name), scenario)
+        with self._lock:
+            if key in self._presets:
+                self._remove(self._presets[key])
+            self._presets[key] = preset
+            self._regions[(preset.region or "").lower()].append(key)
+            self._keys[scenario] = key
+        return preset
+
+    def _remove(self, preset):
+        r"""
+        Drop a preset from the indexes, with the lock held.
+        """
+        self._regions[(preset.region or "").lower()].remove(preset.key)
+        self._keys.pop(preset.scenario, None)
+        self._solved.pop(preset.key, None)
+
+    def load_module(self, module):
+        r"""
+        Register the presets of a module with ``loc`` and ``name`` mappings,
+        such as ``sample``.
+        """
+        for key, text in module.loc.items():
+            self.add(key, text, module.name.get(key))
+
+    def load_dir(self, path):
+        r"""
+        Register every ``.json`` file of a directory, keyed by file name.
+
+        Returns
+        -------
+        count : `int`
+            Number of presets registered.
+        """
+        import json
+
+        files = sorted(glob.glob(os.path.join(path, "*.json")))
+        for filename in files:
+            with open(filename) as f:
+                d = json.load(f)
+            key = os.path.splitext(os.path.basename(filename))[0]
+            self.add(key, d, d.get("name"), d.get("region"))
+        return len(files)
+
+    def __contains__(self, key):
+        return key in self._presets
+
+    def __iter__(self):
+        return iter(list(self._presets.values()))
+
+    def __len__(self):
+        return len(self._presets)
+
+    def get(self, key):
+        r"""
+        Preset of a key.
+
+        Raises
+        ------
+        KeyError
+            If no preset has this key.
+        """
+        return self._presets[key]
+
+    def regions(self):
+        r"""
+        Regions with at least one preset, sorted.
+        """
+        return sorted({p.region for p in self if p.region})
+
+    def find(self, text=None, region=None):
+        r"""
+        Presets whose name contains some text and that belong to a region, in
+        registration order. Both criteria are case-insensitive and optional.
+        """
+        if region is not None:
+            keys = self._regions.get(region.lower(), [])
+            presets = [self._presets[k] for k in keys]
+        else:
+            presets = list(self)
+        if text:
+            presets = [p for p in presets if text.lower() in p.name.lower()]
+        return presets
+
+    def trajectory(self, key):
+        r"""
+        Solution of a preset, solved now if it is not yet.
+        """
+        preset = self.get(key)
+        traj = self._solved.get(key)
+        if traj is None:
+            traj = simulate(preset.scenario)
+            with self._lock:
+                if self._presets.get(key) is preset:
+                    self._solved[key] = traj
+        return traj
+
+    def lookup(self, scenario):
+        r"""
+        Solution of a scenario if it is a solved preset, else `None`.
+        """
+        key = self._keys.get(scenario)
+        return None if key is None else self._solved.get(key)
+
+    def warm(self, background=True):
+        r"""
+        Solve every preset that is not solved yet.
+
+        Parameters
+        ----------
+        background : `bool`
+            Whether to solve in a daemon thread and return at once.
+
+        Returns
+        -------
+        thread : :class:`threading.Thread`
+            Solving thread, or `None` if solved in the foreground.
+        """
+
+        def solve_all():
+            for preset in self:
+                try:
+                    self.trajectory(preset.key)
+                except Exception as e:
+                    print(f'Preset "{preset.key}" could not be solved: {e}')
+
+        if not background:
+            solve_all()
+            return None
+        thread = threading.Thread(target=solve_all, name="preset-warmup", daemon=True)
+        thread.start()
+        return thread
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    r"""
+    Presets of this process: the sample regions, then the files of
+    :data:`PRESETS_DIR`. Created on first use.
+    """
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            import sample
+
+            registry = PresetRegistry()
+            registry.load_module(sample)
+            if PRESETS_DIR:
+                registry.load_dir(PRESETS_DIR)
+            _registry = registry
+    return _registry
@@ -0,0 +1,317 @@
+"""
+Opt-in memory profiling of the Dash callbacks and of their stages.
+
+With ``SEIQHCDRO_PROFILE=1``, :mod:`tracemalloc` traces the allocations of the
+process, and each profiled section, a callback or a stage of one, records its
+peak allocation above the memory in use when it started, the memory it still
+holds when it ends, and, every ``SEIQHCDRO_PROFILE_SITES_EVERY`` calls, the
+code lines that allocated the memory it holds. :func:`report` aggregates
+them over all calls, and ``GET /api/v1/profile`` serves the report of the
+worker answering. Tracing slows every allocation down, so it is off by
+default and every helper is then a no-op.
+
+Peaks are those of the whole process, so concurrent requests of a threaded
+worker add up. Before Python 3.9 the peak of :mod:`tracemalloc` cannot be
+reset, and peaks are only sampled at the start and end of sections.
+"""
+
+import os
+import threading
+import tracemalloc
+from collections import Counter, defaultdict
+from functools import wraps
+
+# Whether the callbacks are profiled
+ENABLED = os.environ.get("SEIQHCDRO_PROFILE", "0") != "0"
+
+# Frames stored per traced allocation
+FRAMES = int(os.environ.get("SEIQHCDRO_PROFILE_FRAMES", 1))
+
+# Calls of a section between two records of its allocation sites, which
+# take two snapshots of the whole traced heap
+SITES_EVERY = int(os.environ.get("SEIQHCDRO_PROFILE_SITES_EVERY", 10))
+
+# Allocation sites kept per section in reports
+TOP = 10
+
+# Whether the peak of tracemalloc can be reset, from Python 3.9
+_RESETTABLE = hasattr(tracemalloc, "reset_peak")
+
+# Files of the allocations of the profiler itself
+_IGNORED = (tracemalloc.__file__, __file__)
+
+_local = threading.local()
+_lock = threading.Lock()
+_stats = {}
+
+
+class _Stats:
+    r"""
+    Totals of a section over its calls.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.sampled = 0
+        self.peak = 0
+        self.peak_max = 0
+        self.held = 0
+        self.held_max = 0
+        self.sites = defaultdict(lambda: [0, 0])
+
+
+class _Frame:
+    __slots__ = ("name", "start", "peak", "snapshot")
+
+    def __init__(self, name, start, snapshot):
+        self.name = name
+        self.start = start
+        self.peak = start
+        self.snapshot = snapshot
+
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+def _held_sites(before, after):
+    r"""
+    Allocation sites of the traces of a snapshot that are not in an earlier
+    one, largest first.
+
+    Comparing the raw traces only groups the new ones by line, which is much
+    faster than :meth:`tracemalloc.Snapshot.compare_to` on a large heap.
+    """
+    new = Counter(after.traces._traces)
+    new.subtract(before.traces._traces)
+    traces = [trace for trace, n in new.items() for _ in range(n)]
+    stats = tracemalloc.Snapshot(traces, after.traceback_limit).statistics("lineno")
+    return [s for s in stats if s.traceback[0].filename not in _IGNORED]
+
+
+def _sample_peak():
+    r"""
+    Peak traced memory since the last reset, and reset it.
+    """
+    current, peak = tracemalloc.get_traced_memory()
+    if not _RESETTABLE:
+        return current
+    tracemalloc.reset_peak()
+    return peak
+
+
+def _enter(name):
+    r"""
+    Start a section, returning the depth to unwind to when it ends.
+    """
+    stack = _stack()
+    peak = _sample_peak()
+    if stack:
+        stack[-1].peak = max(stack[-1].peak, peak)
+    depth = len(stack)
+    with _lock:
+        calls = _stats[name].calls if name in _stats else 0
+    snapshot = tracemalloc.take_snapshot() if calls % SITES_EVERY == 0 else None
+    stack.append(_Frame(name, tracemalloc.get_traced_memory()[0], snapshot))
+    return depth
+
+
+def _exit(depth):
+    r"""
+    End the sections above a depth, innermost first, and record them.
+    """
+    stack = _stack()
+    while len(stack) > depth:
+        frame = stack.pop()
+        peak = max(frame.peak, _sample_peak())
+        current = tracemalloc.get_traced_memory()[0]
+        sites = []
+        if frame.snapshot is not None:
+            sites = _held_sites(frame.snapshot, tracemalloc.take_snapshot())
+            # Do not count the comparison in the peak of the enclosing section
+            if _RESETTABLE:
+                tracemalloc.reset_peak()
+        if stack:
+            stack[-1].peak = max(stack[-1].peak, peak)
+
+        with _lock:
+            stats = _stats.setdefault(frame.name, _Stats())
+            stats.calls += 1
+            stats.peak += peak - frame.start
+            stats.peak_max = max(stats.peak_max, peak - frame.start)
+            stats.held += current - frame.start
+            stats.held_max = max(stats.held_max, current - frame.start)
+            stats.sampled += frame.snapshot is not None
+            for stat in sites[:TOP]:
+                line = stat.traceback[0]
+                site = stats.sites[f"{line.filename}:{line.lineno}"]
+                site[0] += stat.size
+                site[1] += stat.count
+
+
+class section:
+    r"""
+    Context manager profiling the code it runs under a name, when profiling is
+    enabled. Sections nest, and a section ends the sections still open inside
+    it, e.g. when an exception is raised.
+    """
+
+    __slots__ = ("name", "depth")
+
+    def __init__(self, name):
+        self.name = name
+        self.depth = None
+
+    def __enter__(self):
+        if ENABLED:
+            self.depth = _enter(self.name)
+        return self
+
+    def __exit__(self, *exc):
+        if self.depth is not None:
+            _exit(self.depth)
+            self.depth = None
+        return False
+
+
+class Stages:
+    r"""
+    Consecutive stages of a callback, profiled as sections named
+    ``"<prefix>.<stage>"``. Calling it with the name of a stage ends the
+    current stage and starts the next one, without indenting the code::
+
+        stage = Stages("update_graph")
+        stage("solve")
+        ...
+        stage("figures")
+        ...
+        stage.close()
+
+    Stages still open end with the section around them.
+    """
+
+    __slots__ = ("prefix", "depth")
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.depth = None
+
+    def __call__(self, name):
+        if ENABLED:
+            self.close()
+            self.depth = _enter(f"{self.prefix}.{name}")
+
+    def close(self):
+        if self.depth is not None:
+            _exit(self.depth)
+            self.depth = None
+
+
+def profiled(name=None):
+    r"""
+    Decorator profiling each call of a function as a section, by default
+    named after the function. Returns the function unchanged when profiling
+    is disabled.
+    """
+
+    def decorate(func):
+        if not ENABLED:
+            return func
+        label = name or func.__name__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with section(label):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def report(top=TOP):
+    r"""
+    Aggregate memory profile of this process.
+
+    Parameters
+    ----------
+    top : `int`
+        Largest number of allocation sites per section.
+
+    Returns
+    -------
+    report : `dict`
+        ``enabled``, ``pid``, the ``traced`` and ``peak`` memory of the
+        process in bytes, and the ``sections`` sorted by largest peak, each
+        with its ``calls``, mean and largest ``peak`` and ``held`` bytes, and
+        the ``sites`` holding the most memory at its end, with their mean
+        ``size`` and ``count`` of blocks per sampled call.
+    """
+    out = {"enabled": ENABLED, "pid": os.getpid(), "sections": []}
+    if tracemalloc.is_tracing():
+        out["traced"], out["peak"] = tracemalloc.get_traced_memory()
+    with _lock:
+        for name, s in _stats.items():
+            sites = sorted(s.sites.items(), key=lambda i: -i[1][0])[:top]
+            out["sections"].append(
+                {
+                    "name": name,
+                    "calls": s.calls,
+                    "peak_mean": s.peak / s.calls,
+                    "peak_max": s.peak_max,
+                    "held_mean": s.held / s.calls,
+                    "held_max": s.held_max,
+                    "sites": [
+                        {
+                            "site": k,
+                            "size": v[0] / s.sampled,
+                            "count": v[1] / s.sampled,
+                        }
+                        for k, v in sites
+                    ],
+                }
+            )
+    out["sections"].sort(key=lambda s: -s["peak_max"])
+    return out
+
+
+def format_report(report):
+    r"""
+    Plain text table of a :func:`report`.
+    """
+
+    def kib(size):
+        return f"{size / 1024:10.1f}"
+
+    lines = [
+        f"Memory profile of process {report['pid']}"
+        + ("" if report["enabled"] else " (profiling disabled)"),
+        f"{'section':40} {'calls':>6} {'peak KiB':>10} {'max':>10}"
+        f" {'held KiB':>10} {'max':>10}",
+    ]
+    for s in report["sections"]:
+        lines.append(
+            f"{s['name']:40} {s['calls']:6d} {kib(s['peak_mean'])} "
+            f"{kib(s['peak_max'])} {kib(s['held_mean'])} {kib(s['held_max'])}"
+        )
+        for site in s["sites"]:
+            path = site["site"].split(os.sep)
+            lines.append(
+                f"    {os.path.join(*path[-3:]):58} {kib(site['size'])} KiB"
+                f" {site['count']:8.0f} blocks"
+            )
+    return "\n".join(lines)
+
+
+def reset():
+    r"""
+    Forget the recorded sections.
+    """
+    with _lock:
+        _stats.clear()
+
+
+if ENABLED and not tracemalloc.is_tracing():
+    tracemalloc.start(FRAMES)
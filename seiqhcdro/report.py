@@ -0,0 +1,632 @@
+"""
+Summary reports of many scenarios, as text, JSON and static HTML.
+
+:func:`build` solves a list of scenarios together, reusing the solutions of
+solved presets and of a :class:`~seiqhcdro.batch.TrajectoryCache` over the
+process pool of :mod:`seiqhcdro.batch`, then locates their events on the
+solutions, see :func:`~seiqhcdro.events.locate`.
+:func:`write` then renders every :class:`Report` in parallel into a
+directory, with an index of the pack. The HTML reports draw their charts as
+inline SVG, so they open offline and print as they are.
+
+The whole pack comes out of one command::
+
+    python -m seiqhcdro.report scenarios/ --presets --vary r0=3.5,4.5 -o pack/
+
+Each input is a scenario file in the ``btn_ipt`` export schema, with optional
+``name`` and ``region`` keys, a list of them, or a directory of them.
+"""
+
+import html
+import json
+import os
+import re
+from itertools import product
+from typing import NamedTuple
+
+import numpy as np
+
+from .scenario import Scenario
+
+# Formats rendered by default
+FORMATS = ("txt", "json", "html")
+
+# Events located for each report
+EVENTS = ("hospital_capacity", "quarantine_capacity", "peak", "rt_below_1")
+
+# Reports rendered by one task of the process pool
+CHUNK_SIZE = 8
+
+# Points of each chart line, see :func:`seiqhcdro.downsample.lttb`
+CHART_POINTS = 400
+
+CREDITS = (
+    "Generated by SEIQHCDRO COVID-19 Modelling Team for Vietnam: "
+    "Hoang-Anh NGO, Tuan Khoi NGUYEN and Thu-Anh NGUYEN"
+)
+
+# Charts of the HTML report: title, series as (attribute, label, colour), and
+# the scenario field drawn as a capacity line, if any
+CHARTS = (
+    (
+        "Daily incidence",
+        (
+            ("daily_infected", "Daily Infected Incidence", "#1f77b4"),
+            ("daily_hospitalised", "Daily Hospital Incidence", "#ff7f0e"),
+        ),
+        None,
+    ),
+    ("Infected", (("infected", "Total Infected", "#1f77b4"),), None),
+    ("Hospitalised", (("hospitalised", "Total Hospitalised", "#ff7f0e"),), "hcap"),
+    (
+        "Critical cases and deaths",
+        (
+            ("active_icu", "Active ICU", "#2ca02c"),
+            ("deaths", "Deaths", "#d62728"),
+        ),
+        None,
+    ),
+    ("Quarantined", (("quarantined", "Total quarantined", "#9467bd"),), "hqar"),
+    (
+        "Effective reproduction number",
+        (("r0", "Effective Reproduction Number", "#8c564b"),),
+        None,
+    ),
+)
+
+
+class Report(NamedTuple):
+    r"""
+    Solved scenario with its events, ready to render.
+
+    ``key`` names its files, and ``name`` titles it.
+    """
+
+    key: str
+    name: str
+    trajectory: object
+    events: object
+
+    @property
+    def scenario(self):
+        return self.trajectory.scenario
+
+    def _date(self, t):
+        return str(np.datetime64(self.scenario.date[:10], "D") + int(np.floor(t)))
+
+    def _on(self, name):
+        t = self.events.first(name)
+        if t is None:
+            return "never"
+        return f"on day {t:.1f} ({self._date(t)})"
+
+    def to_dict(self):
+        r"""
+        Summary of the report, for a JSON file.
+
+        Returns
+        -------
+        summary : `dict`
+            Inputs, worst-day counts and their days, capacity verdicts and
+            first day of each event, as plain Python.
+        """
+        traj, s = self.trajectory, self.scenario
+        peaks = {}
+        for k, v in traj.summary().items():
+            day = int(np.argmax(getattr(traj, k)))
+            peaks[k] = {"value": float(v), "day": day, "date": self._date(day)}
+        events = {}
+        for name in EVENTS:
+            t = self.events.first(name)
+            events[name] = None if t is None else {"day": t, "date": self._date(t)}
+        return {
+            "key": self.key,
+            "name": self.name,
+            "scenario": s.to_dict(),
+            "peaks": peaks,
+            "capacity": {
+                "hospital": s.hcap >= np.max(traj.hospitalised),
+                "quarantine": s.hqar >= np.max(traj.quarantined),
+            },
+            "events": events,
+        }
+
+    def text(self):
+        r"""
+        Plain text summary, as exported by ``btn_sum``.
+        """
+        s, traj = self.scenario, self.trajectory
+        hsp, qar = np.max(traj.hospitalised), np.max(traj.quarantined)
+        peaks = traj.summary()
+        return f"""
+{CREDITS}
+
+{self.name}
+
+Population: {s.N} people
+The outbreak is assumed to begin on {s.date}, with R0 = {s.r0}
+
+The outbreak has {s.n_r0} stages, starting on days {list(s.day)}:
+_Reduction of R0 through each stage: {list(s.delta_r0)}
+_Containing proportion through each stage: {list(s.pcont)}
+
+Infectious period: {s.tinf} days
+Incubated period: {s.tinc} days
+Hospitalised Duration: {s.thsp} days
+Critical Status Duration: {s.tcrt} days
+Intensive Care Duration: {s.ticu} days
+Quarantine Duration: {s.tqar} days
+Quarantine in Hospital Duration: {s.tqah} days
+Recovery time: {s.trec} days
+
+Quarantined proportion: {s.pquar}
+Cross-contamination proportion: {s.pcross}
+Quarantined & Hospitalised proportion {s.pqhsp}
+Journal impact level: {s.pj*100}%
+Hospitalised rate: {s.ph*100}%
+Critical rate: {s.pc*100}%
+Death rate: {s.pf*100}%
+
+Hospital capacity is {s.hcap}, which is {'not enough' if s.hcap<hsp else 'sufficient'} for the worst day of the outbreak, with {hsp:.0f} hospital patients.
+Quarantine capacity is {s.hqar}, which is {'not enough' if s.hqar<qar else 'sufficient'} for the worst day of the outbreak, with {qar:.0f} quarantined individuals.
+
+Hospital capacity is first exceeded: {self._on("hospital_capacity")}
+Quarantine capacity is first exceeded: {self._on("quarantine_capacity")}
+Infectious cases peak: {self._on("peak")}
+Effective reproduction number first falls below 1: {self._on("rt_below_1")}
+
+The final outcome of the outbreak is
+_{peaks["infected"]:.0f} COVID-19 positive cases
+_{peaks["quarantined"]:.0f} quarantined individuals
+_{peaks["hospitalised"]:.0f} hospitalised patients
+_{peaks["critical"]:.0f} in critical condition
+_{peaks["deaths"]:.0f} deceased
+"""
+
+    def html(self):
+        r"""
+        Standalone HTML page of the report, with its charts.
+        """
+        charts = "\n".join(
+            svg_chart(self.trajectory, title, series, capacity)
+            for title, series, capacity in CHARTS
+        )
+        return _page(
+            self.name,
+            f"<h1>{html.escape(self.name)}</h1>\n"
+            f"{charts}\n<pre>{html.escape(self.text().strip())}</pre>",
+        )
+
+
+def _ticks(lo, hi, n=5):
+    r"""
+    Round tick values covering ``[lo, hi]``.
+    """
+    if hi <= lo:
+        hi = lo + 1
+    step = 10 ** np.floor(np.log10((hi - lo) / n))
+    for m in (1, 2, 5, 10):
+        if (hi - lo) / (m * step) <= n:
+            step *= m
+            break
+    return np.arange(np.ceil(lo / step) * step, hi + step / 2, step)
+
+
+def _number(v):
+    if abs(v) >= 1e6:
+        return f"{v / 1e6:g}M"
+    if abs(v) >= 1e3:
+        return f"{v / 1e3:g}k"
+    return f"{v:g}"
+
+
+def svg_chart(traj, title, series, capacity=None, width=720, height=260):
+    r"""
+    Line chart of daily series of a trajectory, as inline SVG.
+
+    Parameters
+    ----------
+    traj : :class:`~seiqhcdro.simulate.Trajectory`
+        Solution of a scenario.
+    title : `str`
+        Title of the chart.
+    series : `tuple`
+        ``(attribute, label, colour)`` of each line.
+    capacity : `str`
+        Scenario field drawn as a dashed horizontal line, e.g. ``"hcap"``.
+
+    Returns
+    -------
+    svg : `str`
+        SVG element, with at most :data:`CHART_POINTS` points per line.
+    """
+    from .downsample import lttb
+
+    left, right, top, bottom = 56, 12, 28, 40
+    w, h = width - left - right, height - top - bottom
+    t = np.asarray(traj.t, dtype=float)
+    values = [np.asarray(getattr(traj, k), dtype=float) for k, _, _ in series]
+    limit = getattr(traj.scenario, capacity) if capacity else None
+    ymax = max([np.nanmax(v) for v in values] + [limit or 0])
+    yticks = _ticks(0, ymax)
+    ymax = max(yticks[-1], ymax, 1)
+    t0, t1 = t[0], max(t[-1], t[0] + 1)
+
+    def x(v):
+        return left + (v - t0) / (t1 - t0) * w
+
+    def y(v):
+        return top + h - v / ymax * h
+
+    out = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {width} {height}" '
+        f'width="{width}" height="{height}" role="img">',
+        f'<text x="{left}" y="18" class="title">{html.escape(title)}</text>',
+    ]
+    for v in yticks:
+        out.append(
+            f'<line x1="{left}" x2="{left + w}" y1="{y(v):.1f}" y2="{y(v):.1f}" '
+            f'class="grid"/><text x="{left - 6}" y="{y(v) + 4:.1f}" '
+            f'text-anchor="end">{_number(v)}</text>'
+        )
+    start = np.datetime64(traj.scenario.date[:10], "D")
+    for v in _ticks(t0, t1, 6):
+        if v > t1:
+            continue
+        out.append(
+            f'<text x="{x(v):.1f}" y="{top + h + 16}" text-anchor="middle">'
+            f"{start + int(v)}</text>"
+        )
+    if limit:
+        out.append(
+            f'<line x1="{left}" x2="{left + w}" y1="{y(limit):.1f}" '
+            f'y2="{y(limit):.1f}" class="capacity"/>'
+        )
+    legend = left
+    for (_, label, colour), v in zip(series, values):
+        keep = lttb(t, v, CHART_POINTS)
+        points = " ".join(f"{x(a):.1f},{y(b):.1f}" for a, b in zip(t[keep], v[keep]))
+        out.append(
+            f'<polyline points="{points}" fill="none" stroke="{colour}" '
+            f'stroke-width="1.5"/>'
+        )
+        out.append(
+            f'<rect x="{legend}" y="{height - 14}" width="10" height="10" '
+            f'fill="{colour}"/><text x="{legend + 14}" y="{height - 5}">'
+            f"{html.escape(label)}</text>"
+        )
+        legend += 24 + 7 * len(label)
+    out.append("</svg>")
+    return "\n".join(out)
+
+
+_STYLE = """
+body { font-family: sans-serif; margin: 2em auto; max-width: 760px; }
+svg { display: block; margin: 1em 0; font-size: 11px; }
+svg .title { font-size: 14px; font-weight: bold; }
+svg .grid { stroke: #ddd; }
+svg .capacity { stroke: #d62728; stroke-dasharray: 6 4; }
+pre { white-space: pre-wrap; }
+table { border-collapse: collapse; }
+td, th { border-bottom: 1px solid #ddd; padding: 4px 8px; text-align: right; }
+td:first-child, th:first-child { text-align: left; }
+"""
+
+
+def _page(title, body):
+    return (
+        '<!DOCTYPE html>\n<html lang="en">\n<head>\n<meta charset="utf-8">\n'
+        f"<title>{html.escape(title)}</title>\n<style>{_STYLE}</style>\n"
+        f"</head>\n<body>\n{body}\n</body>\n</html>\n"
+    )
+
+
+def _slug(name):
+    return re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-") or "scenario"
+
+
+def build(scenarios, names=None, cache=None, registry=None, parallel=None):
+    r"""
+    Solve scenarios and locate their events.
+
+    Parameters
+    ----------
+    scenarios : :class:`list`
+        List of :class:`Scenario` or dictionaries in the JSON schema.
+    names : :class:`list`
+        Title of each report, by default ``"Scenario <i>"``.
+    cache : :class:`~seiqhcdro.batch.TrajectoryCache`
+        Cache solving the scenarios, if any.
+    registry : :class:`~seiqhcdro.presets.PresetRegistry`
+        Presets whose solutions are reused, if any.
+    parallel : `bool`
+        Whether to spread the solves over the process pool, see
+        :func:`~seiqhcdro.batch.simulate_batch`.
+
+    Returns
+    -------
+    reports : :class:`list`
+        One :class:`Report` per scenario, with distinct keys.
+    """
+    from .batch import simulate_batch
+    from .events import locate
+
+    scenarios = [
+        s if isinstance(s, Scenario) else Scenario.from_dict(s) for s in scenarios
+    ]
+    names = names or [f"Scenario {i + 1}" for i in range(len(scenarios))]
+    found = {}
+    if registry is not None:
+        for s in scenarios:
+            traj = registry.lookup(s)
+            if traj is not None:
+                found[s] = traj
+    missing = [s for s in dict.fromkeys(scenarios) if s not in found]
+    if cache is not None:
+        solved = cache.solve(missing, parallel=bool(parallel))
+    else:
+        solved = simulate_batch(missing, parallel=parallel)
+    found.update(zip(missing, solved))
+    events = {s: locate(found[s], EVENTS) for s in dict.fromkeys(scenarios)}
+
+    reports, keys = [], set()
+    for s, name in zip(scenarios, names):
+        key = base = _slug(name)
+        i = 1
+        while key in keys:
+            i += 1
+            key = f"{base}-{i}"
+        keys.add(key)
+        reports.append(Report(key, name, found[s], events[s]))
+    return reports
+
+
+def _render(reports, directory, formats):
+    r"""
+    Write the files of some reports, in one process.
+    """
+    paths = []
+    for report in reports:
+        for fmt in formats:
+            if fmt == "json":
+                content = json.dumps(report.to_dict(), indent=2, default=_plain)
+            elif fmt == "txt":
+                content = report.text()
+            else:
+                content = report.html()
+            path = os.path.join(directory, f"{report.key}.{fmt}")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(content)
+            paths.append(path)
+    return paths
+
+
+def _plain(value):
+    r"""
+    Plain Python value of a NumPy scalar, for :func:`json.dumps`.
+    """
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _index(reports, formats):
+    r"""
+    Overview page of a pack: worst-day counts and first hospital breach of
+    each report, with links to its files.
+    """
+    from .simulate import SUMMARY_FIELDS
+
+    rows = []
+    for report in reports:
+        peaks = report.trajectory.summary()
+        title = html.escape(report.name)
+        if "html" in formats:
+            title = f'<a href="{report.key}.html">{title}</a>'
+        links = " ".join(
+            f'<a href="{report.key}.{fmt}">{fmt}</a>'
+            for fmt in formats
+            if fmt != "html"
+        )
+        rows.append(
+            f"<tr><td>{title}</td>"
+            + "".join(f"<td>{peaks[k]:,.0f}</td>" for k in SUMMARY_FIELDS)
+            + f"<td>{report._on('hospital_capacity')}</td><td>{links}</td></tr>"
+        )
+    header = "".join(f"<th>{k.capitalize()}</th>" for k in SUMMARY_FIELDS)
+    return _page(
+        "Scenario reports",
+        "<h1>Scenario reports</h1>\n<table>\n"
+        f"<tr><th>Scenario</th>{header}<th>Hospital capacity exceeded</th>"
+        "<th></th></tr>\n" + "\n".join(rows) + "\n</table>",
+    )
+
+
+def write(reports, directory, formats=FORMATS, parallel=None):
+    r"""
+    Render reports into a directory, with an ``index.html`` and an
+    ``index.json`` of the pack.
+
+    Parameters
+    ----------
+    reports : :class:`list`
+        Reports returned by :func:`build`.
+    directory : `str`
+        Output directory, created if needed.
+    formats : `tuple`
+        Formats of each report, from :data:`FORMATS`.
+    parallel : `bool`
+        Whether to render over the process pool. By default, only packs of
+        more than one chunk of :data:`CHUNK_SIZE` reports are.
+
+    Returns
+    -------
+    paths : :class:`list`
+        Written files, the indexes first.
+
+    Raises
+    ------
+    ValueError
+        If a format is unknown.
+    """
+    from .batch import _pool
+
+    unknown = set(formats) - set(FORMATS)
+    if unknown:
+        raise ValueError(f'Unknown report formats "{", ".join(sorted(unknown))}"')
+    formats = tuple(formats)
+    os.makedirs(directory, exist_ok=True)
+    chunks = [reports[k : k + CHUNK_SIZE] for k in range(0, len(reports), CHUNK_SIZE)]
+    if parallel is None:
+        parallel = len(chunks) > 1
+    args = (chunks, [directory] * len(chunks), [formats] * len(chunks))
+    results = _pool().map(_render, *args) if parallel else map(_render, *args)
+    paths = [p for chunk in results for p in chunk]
+
+    index = [
+        os.path.join(directory, "index.html"),
+        os.path.join(directory, "index.json"),
+    ]
+    with open(index[0], "w", encoding="utf-8") as f:
+        f.write(_index(reports, formats))
+    with open(index[1], "w", encoding="utf-8") as f:
+        pack = [
+            {"key": r.key, "name": r.name, "files": [f"{r.key}.{x}" for x in formats]}
+            for r in reports
+        ]
+        json.dump(pack, f, indent=2)
+    return index + paths
+
+
+def read(paths):
+    r"""
+    Scenarios of input files.
+
+    Parameters
+    ----------
+    paths : :class:`list`
+        Scenario files, files of a list of scenarios, or directories of
+        scenario files.
+
+    Returns
+    -------
+    scenarios : :class:`list`
+        ``(name, dictionary)`` of each scenario, named by its ``name`` key or
+        its file name.
+    """
+    import glob
+
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "*.json"))))
+        else:
+            files.append(path)
+    out = []
+    for filename in files:
+        with open(filename) as f:
+            d = json.load(f)
+        stem = os.path.splitext(os.path.basename(filename))[0]
+        items = d if isinstance(d, list) else [d]
+        for i, item in enumerate(items):
+            default = stem if len(items) == 1 else f"{stem} {i + 1}"
+            out.append((item.get("name") or default, item))
+    return out
+
+
+def variants(scenarios, vary):
+    r"""
+    Cartesian product of scenarios and varied inputs.
+
+    Parameters
+    ----------
+    scenarios : :class:`list`
+        ``(name, dictionary)`` of each scenario.
+    vary : `dict`
+        Values of each varied input, by name or as ``name[index]`` for a
+        stage.
+
+    Returns
+    -------
+    scenarios : :class:`list`
+        ``(name, dictionary)`` of each variant, with the varied values in
+        its name.
+    """
+    from .jobs import _set
+
+    if not vary:
+        return list(scenarios)
+    out = []
+    for name, d in scenarios:
+        d = Scenario.from_dict(d).to_dict()
+        for point in product(*vary.values()):
+            v = dict(d)
+            for path, value in zip(vary, point):
+                _set(v, path, value)
+            label = ", ".join(f"{p}={x:g}" for p, x in zip(vary, point))
+            out.append((f"{name} ({label})", v))
+    return out
+
+
+def main(argv=None):
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(
+        prog="python -m seiqhcdro.report",
+        description="Summary reports of many scenarios.",
+    )
+    parser.add_argument("inputs", nargs="*", help="scenario files or directories")
+    parser.add_argument("-o", "--output", default="reports")
+    parser.add_argument("--presets", action="store_true", help="add every preset")
+    parser.add_argument(
+        "--vary",
+        action="append",
+        default=[],
+        metavar="NAME=V1,V2",
+        help="report each scenario with each value of an input",
+    )
+    parser.add_argument("--formats", default=",".join(FORMATS))
+    parser.add_argument("--serial", action="store_true", help="use one process")
+    args = parser.parse_args(argv)
+
+    scenarios = read(args.inputs)
+    if args.presets:
+        from .presets import get_registry
+
+        scenarios += [(p.name, p.scenario) for p in get_registry()]
+    if not scenarios:
+        parser.error("no scenario given")
+    vary = {}
+    for item in args.vary:
+        name, _, values = item.partition("=")
+        try:
+            vary[name] = [float(v) for v in values.split(",")]
+        except ValueError:
+            parser.error(f"invalid --vary {item}")
+    try:
+        scenarios = variants(
+            [(n, s.to_dict() if isinstance(s, Scenario) else s) for n, s in scenarios],
+            vary,
+        )
+        start = time.perf_counter()
+        parallel = False if args.serial else None
+        names, dicts = zip(*scenarios)
+        reports = build(list(dicts), list(names), parallel=parallel)
+        solved = time.perf_counter()
+        paths = write(reports, args.output, args.formats.split(","), parallel)
+    except (KeyError, IndexError, ValueError) as e:
+        print(f"error: {e}")
+        return 1
+    end = time.perf_counter()
+    print(
+        f"{len(reports)} reports, {len(paths)} files in {args.output}: "
+        f"solved in {solved - start:.1f} s, rendered in {end - solved:.1f} s"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+
+    sys.exit(main())
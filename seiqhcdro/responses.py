@@ -0,0 +1,214 @@
+"""
+HTTP response layer of the Dash server.
+
+Callback, layout and static responses are gzip-compressed for clients that
+accept it, like the JSON API. Static files, i.e. the bundles of the Dash
+components and the files of ``assets/``, are compressed once per path and
+version and kept in a bounded :class:`ResponseCache`, and are served with long-lived cache headers when their URL carries a
+version, a fingerprint or a modification time, so that browsers only fetch
+them again after an upgrade or an edit.
+
+Callbacks whose output only depends on the request are answered from a
+:class:`ResponseCache`, keyed by the hash of the request body: the inputs,
+states and triggering properties. The same inputs sent again, e.g. by another
+analyst loading the same sample region, are answered without running the
+callback, and without compressing again.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from flask import Response, g, request
+
+from .api import GZIP_MIN_SIZE, gzip_response
+
+# Memory of the cached callback responses of each worker, compressed
+CACHE_BYTES = int(float(os.environ.get("SEIQHCDRO_RESPONSE_CACHE_MB", 64)) * 2**20)
+
+# Memory of the compressed static files of each worker
+STATIC_BYTES = int(float(os.environ.get("SEIQHCDRO_STATIC_CACHE_MB", 16)) * 2**20)
+
+# Lifetime of versioned static files in browser caches, in seconds
+STATIC_MAX_AGE = 365 * 24 * 3600
+
+# Query parameters Dash adds to versioned static URLs
+_VERSIONS = ("m", "v")
+
+_LONG_LIVED = f"public, max-age={STATIC_MAX_AGE}, immutable"
+
+
+class ResponseCache:
+    r"""
+    Compressed callback responses by request key, least recently used first
+    out once they exceed a total size.
+
+    Parameters
+    ----------
+    maxbytes : `int`
+        Total size of the kept bodies. 0 disables the cache.
+    """
+
+    def __init__(self, maxbytes=CACHE_BYTES):
+        self.maxbytes = maxbytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        r"""
+        Cached ``(mimetype, gzip body)`` of a key, or `None`.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, mimetype, body):
+        r"""
+        Keep the compressed body of a response, unless it alone exceeds the
+        size of the cache.
+        """
+        if len(body) > self.maxbytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old[1])
+            self._entries[key] = (mimetype, body)
+            self.size += len(body)
+            while self.size > self.maxbytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        r"""
+        Drop every cached response.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+
+def _accepts_gzip():
+    return "gzip" in request.headers.get("Accept-Encoding", "").lower()
+
+
+def _from_gzip(mimetype, body):
+    r"""
+    Response of a gzip body, decompressed for clients that do not accept it.
+    """
+    if not _accepts_gzip():
+        return Response(gzip.decompress(body), mimetype=mimetype)
+    response = Response(body, mimetype=mimetype)
+    response.headers["Content-Encoding"] = "gzip"
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def install(server, cached=(), cache=None, prefix="/"):
+    r"""
+    Add the response layer to the Flask server of a Dash application.
+
+    Parameters
+    ----------
+    server : `flask.Flask`
+        Server of the application.
+    cached : `tuple`
+        Outputs, as ``"<id>.<property>"``, of the callbacks whose responses
+        are cached. They must only depend on their inputs and states.
+    cache : :class:`ResponseCache`
+        Cache of the callback responses, by default a new one.
+    prefix : `str`
+        Path prefix of the Dash routes.
+
+    Returns
+    -------
+    cache : :class:`ResponseCache`
+        Cache of the callback responses.
+    """
+    cache = ResponseCache() if cache is None else cache
+    update = f"{prefix}_dash-update-component"
+    dash_routes = (
+        prefix,
+        update,
+        f"{prefix}_dash-layout",
+        f"{prefix}_dash-dependencies",
+    )
+    static_prefixes = (f"{prefix}_dash-component-suites/", f"{prefix}assets/")
+    static = ResponseCache(STATIC_BYTES)
+
+    @server.before_request
+    def _cached_callback():
+        if request.path != update or request.method != "POST" or not cache.maxbytes:
+            return None
+        body = request.get_data(cache=True)
+        try:
+            output = json.loads(body).get("output", "")
+        except (ValueError, AttributeError):
+            return None
+        if not any(o in output for o in cached):
+            return None
+        key = hashlib.sha256(body).hexdigest()
+        entry = cache.get(key)
+        if entry is None:
+            g.response_key = key
+            return None
+        response = _from_gzip(*entry)
+        response.headers["X-Response-Cache"] = "hit"
+        return response
+
+    @server.after_request
+    def _compress(response):
+        path = request.path
+        if response.status_code != 200 or "Content-Encoding" in response.headers:
+            return response
+
+        if path.startswith(static_prefixes):
+            versioned = any(k in request.args for k in _VERSIONS)
+            if versioned or response.cache_control.max_age:
+                response.headers["Cache-Control"] = _LONG_LIVED
+            if not _accepts_gzip():
+                return response
+            # Other query parameters do not change the file, and would let
+            # clients fill the cache with copies of it
+            key = (path,) + tuple(request.args.get(k) for k in _VERSIONS)
+            entry = static.get(key)
+            if entry is None:
+                response.direct_passthrough = False
+                data = response.get_data()
+                if len(data) < GZIP_MIN_SIZE:
+                    return response
+                body = gzip.compress(data, compresslevel=9)
+                static.put(key, response.mimetype, body)
+            else:
+                body = entry[1]
+            response.direct_passthrough = False
+            response.set_data(body)
+            response.headers["Content-Encoding"] = "gzip"
+            response.vary.add("Accept-Encoding")
+            return response
+
+        if path == f"{prefix}_favicon.ico" and "v" in request.args:
+            response.headers["Cache-Control"] = _LONG_LIVED
+            return response
+
+        key = g.pop("response_key", None)
+        if key is not None and not response.direct_passthrough:
+            body = gzip.compress(response.get_data(), compresslevel=6)
+            cache.put(key, response.mimetype, body)
+            return _from_gzip(response.mimetype, body)
+        if path in dash_routes:
+            return gzip_response(response)
+        return response
+
+    return cache
@@ -0,0 +1,285 @@
+"""
+Scenario parameters of the SEIQHCDRO model.
+
+A :class:`Scenario` holds every input of the web application and follows the
+same JSON schema as the files in ``sample.loc`` and the ``btn_ipt`` export.
+Any parameter of the model but R0 may also follow a
+:class:`~seiqhcdro.schedule.Schedule`, given under an optional ``schedules``
+key, e.g. ``"schedules": {"pquar": {"day": [60], "value": [0.5]}}``.
+"""
+
+import json
+import math
+from datetime import datetime
+from numbers import Real
+from typing import NamedTuple, Tuple
+
+from .model import R0_dynamic
+from .schedule import Schedule
+
+# Keys describing the policy stages
+STAGE_FIELDS = ("delta_r0", "pcont", "day")
+
+# Fields passed to SEIQHCDRO_model after R0, in order. Each may be scheduled.
+MODEL_FIELDS = (
+    "tinf",
+    "tinc",
+    "thsp",
+    "tcrt",
+    "ticu",
+    "tqar",
+    "tqah",
+    "trec",
+    "ph",
+    "pc",
+    "pf",
+    "pj",
+    "pquar",
+    "pqhsp",
+    "pcross",
+)
+
+# Durations in days, which must be positive
+DURATION_FIELDS = ("tinf", "tinc", "thsp", "tcrt", "ticu", "tqar", "tqah", "trec")
+
+# Proportions, which must lie in [0, 1]
+PROPORTION_FIELDS = ("ph", "pc", "pf", "pj", "pquar", "pqhsp", "pcross")
+
+
+def _number(name, value, low=None, high=None, low_open=False):
+    r"""
+    Check that an input is a finite number within bounds.
+
+    Raises
+    ------
+    ValueError
+        If it is not.
+    """
+    if (
+        isinstance(value, bool)
+        or not isinstance(value, Real)
+        or not math.isfinite(value)
+    ):
+        raise ValueError(f'Input "{name}" must be a number')
+    if low is not None and (value <= low if low_open else value < low):
+        bound = f"greater than {low}" if low_open else f"at least {low}"
+        raise ValueError(f'Input "{name}" must be {bound}')
+    if high is not None and value > high:
+        raise ValueError(f'Input "{name}" must be at most {high}')
+
+
+def _bounds(name):
+    r"""
+    Bounds of a model parameter, as keyword arguments of :func:`_number`.
+    """
+    if name in DURATION_FIELDS:
+        return {"low": 0, "low_open": True}
+    if name in PROPORTION_FIELDS:
+        return {"low": 0, "high": 1}
+    return {}
+
+
+def _integer(name, value, low):
+    r"""
+    Check that an input is a whole number of at least ``low``, and return it
+    as an `int`.
+    """
+    _number(name, value, low)
+    if value != int(value):
+        raise ValueError(f'Input "{name}" must be a whole number')
+    return int(value)
+
+
+def _check(values):
+    r"""
+    Check the types and ranges of scenario inputs, before building the
+    scenario, and convert the counts of days and stages to `int`.
+
+    Raises
+    ------
+    ValueError
+        If an input has the wrong type or is out of range.
+    """
+    if "N" in values:
+        _number("N", values["N"], 0, low_open=True)
+    if "ndate" in values:
+        values["ndate"] = _integer("ndate", values["ndate"], 1)
+    if "n_r0" in values:
+        values["n_r0"] = _integer("n_r0", values["n_r0"], 0)
+    for name in ("r0", "hcap", "hqar"):
+        if name in values:
+            _number(name, values[name], 0)
+    for name in MODEL_FIELDS:
+        if name in values:
+            _number(name, values[name], **_bounds(name))
+    if "date" in values:
+        try:
+            datetime.strptime(str(values["date"])[:10], "%Y-%m-%d")
+        except ValueError:
+            raise ValueError(f'Input "date" must be a date, not "{values["date"]}"')
+    for name in STAGE_FIELDS:
+        if name not in values:
+            continue
+        stages = values[name] or ()
+        if not isinstance(stages, (list, tuple)):
+            raise ValueError(f'Input "{name}" must be a list of numbers')
+        for value in stages:
+            _number(name, value, 0, 1 if name == "pcont" else None)
+        values[name] = tuple(stages)
+
+
+def _schedules(d):
+    r"""
+    Parse the ``schedules`` of a scenario dictionary into sorted pairs of
+    field name and :class:`Schedule`.
+    """
+    if d is None:
+        return ()
+    if not isinstance(d, dict):
+        raise ValueError('Input "schedules" must map input names to schedules')
+    out = []
+    for name, schedule in d.items():
+        if name not in MODEL_FIELDS:
+            raise ValueError(f'Input "{name}" cannot be scheduled')
+        if not isinstance(schedule, Schedule):
+            schedule = Schedule.from_dict(schedule)
+        for value in schedule.value:
+            _number(name, value, **_bounds(name))
+        out.append((name, schedule))
+    return tuple(sorted(out))
+
+
+class Scenario(NamedTuple):
+    r"""
+    Full set of inputs of a single model run.
+
+    Defaults are the initial values of the web application. Stage inputs are
+    stored as tuples so that a scenario is hashable and can be used as a key,
+    and ``schedules`` as sorted ``(field, Schedule)`` pairs.
+    """
+
+    N: int = 11000000
+    n_r0: int = 3
+    r0: float = 4.1
+    delta_r0: Tuple[float, ...] = (1.5, 1, 1)
+    pcont: Tuple[float, ...] = (0.1, 0.4, 0.6)
+    day: Tuple[int, ...] = (6, 20, 30)
+    date: str = "2021-05-01"
+    ndate: int = 300
+    hcap: int = 100000
+    hqar: int = 10000
+    tinc: float = 4.5
+    tinf: float = 2.9
+    ticu: float = 11
+    thsp: float = 21
+    tcrt: float = 7
+    trec: float = 21
+    tqar: float = 21
+    tqah: float = 2
+    pquar: float = 0.8
+    pcross: float = 0.01
+    pqhsp: float = 0.1
+    pj: float = 0.12
+    ph: float = 0.85
+    pc: float = 0.04
+    pf: float = 0.25
+    schedules: Tuple[Tuple[str, Schedule], ...] = ()
+
+    @classmethod
+    def from_dict(cls, d, strict=False):
+        r"""
+        Create a scenario from a dictionary in the JSON schema.
+
+        Parameters
+        ----------
+        d : `dict`
+            Scenario inputs. Unknown keys are ignored.
+        strict : `bool`
+            If set, every field but ``schedules`` must be present in ``d``.
+            Otherwise missing fields take their default value.
+
+        Returns
+        -------
+        scenario : :class:`Scenario`
+            The parsed scenario.
+
+        Raises
+        ------
+        ValueError
+            If a field is missing in strict mode, if an input is not a number
+            within its range, if the stage inputs do not have the same
+            length, or if a schedule is invalid.
+        """
+        if strict:
+            for i in cls._fields[:-1]:
+                if i not in d:
+                    raise ValueError(f'Input "{i}" not found!')
+
+        values = {k: d[k] for k in cls._fields if k in d}
+        _check(values)
+        if "schedules" in values:
+            values["schedules"] = _schedules(values["schedules"])
+
+        scenario = cls(**values)
+        if len(scenario.day) != len(scenario.delta_r0) or len(scenario.day) != len(
+            scenario.pcont
+        ):
+            raise ValueError("Number of stage inputs not consistent!")
+        if "n_r0" not in values:
+            scenario = scenario._replace(n_r0=len(scenario.day))
+        return scenario
+
+    @classmethod
+    def from_json(cls, s, strict=False):
+        r"""
+        Create a scenario from a JSON string or bytes, see :meth:`from_dict`.
+        """
+        return cls.from_dict(json.loads(s), strict=strict)
+
+    def to_dict(self):
+        r"""
+        Convert to a dictionary in the JSON schema, with stage inputs as lists.
+        ``schedules`` is only included if there are any.
+        """
+        d = self._asdict()
+        for i in STAGE_FIELDS:
+            d[i] = list(d[i])
+        if self.schedules:
+            d["schedules"] = {k: v.to_dict() for k, v in self.schedules}
+        else:
+            del d["schedules"]
+        return dict(d)
+
+    def to_json(self, indent=4):
+        r"""
+        Convert to a JSON string, in the same layout as the ``btn_ipt`` export.
+        """
+        return json.dumps(self.to_dict(), indent=indent)
+
+    def R0(self, t):
+        r"""
+        Effective reproduction number at time ``t``, see :func:`R0_dynamic`.
+        """
+        return R0_dynamic(t, self.r0, self.delta_r0, self.pcont, self.day)
+
+    def model_args(self):
+        r"""
+        Extra arguments of :func:`SEIQHCDRO_model` for this scenario.
+
+        Returns
+        -------
+        args : `tuple`
+            Arguments in the order expected by the model, after ``t`` and ``y``.
+            Scheduled parameters are given as functions of time.
+        """
+        scheduled = {k: v.lookup(getattr(self, k)) for k, v in self.schedules}
+        return (self.R0,) + tuple(
+            scheduled.get(f, getattr(self, f)) for f in MODEL_FIELDS
+        )
+
+    def initial_state(self, n_infected=1):
+        r"""
+        Initial state vector, as fractions of the population.
+        """
+        N = self.N
+        return [(N - n_infected) / N, 0, n_infected / N, 0, 0, 0, 0, 0, 0]
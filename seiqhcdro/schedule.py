@@ -0,0 +1,121 @@
+"""
+Schedules of model parameters over time.
+
+A :class:`Schedule` gives the values a parameter takes from given days on,
+either held until the next day (``"step"``) or interpolated linearly between
+days (``"linear"``, e.g. for tabulated values). Schedules are compiled into
+sorted breakpoints: a :class:`Lookup` evaluates one schedule with a binary
+search, for the solver of one scenario, and
+:class:`~seiqhcdro.batch.ScheduleTable` evaluates the schedules of many
+scenarios at once, for the stacked batch solver.
+
+This module only uses plain Python, like :mod:`seiqhcdro.model`.
+"""
+
+from bisect import bisect_right
+from typing import NamedTuple, Tuple
+
+# Interpolations between the days of a schedule
+INTERPOLATIONS = ("step", "linear")
+
+
+class Schedule(NamedTuple):
+    r"""
+    Values of a parameter from given days on, with ``day`` sorted.
+
+    Before the first day, a ``"step"`` schedule keeps the scalar value of the
+    parameter, and a ``"linear"`` schedule its first value. After the last
+    day, both keep their last value.
+    """
+
+    day: Tuple[float, ...]
+    value: Tuple[float, ...]
+    interp: str = "step"
+
+    @classmethod
+    def from_dict(cls, d):
+        r"""
+        Create a schedule from ``{"day": [...], "value": [...], "interp": ...}``,
+        with days in any order.
+
+        Raises
+        ------
+        ValueError
+            If the days and values are empty, of different lengths, or not
+            numbers, if a day is repeated, or if the interpolation is unknown.
+        """
+        try:
+            day = [float(i) for i in d["day"]]
+            value = [float(i) for i in d["value"]]
+        except (KeyError, TypeError, ValueError):
+            raise ValueError('A schedule needs numeric "day" and "value" lists')
+        if not day or len(day) != len(value):
+            raise ValueError("Number of schedule days and values not consistent!")
+        if len(set(day)) != len(day):
+            raise ValueError("Schedule days must be distinct")
+        interp = d.get("interp", "step")
+        if interp not in INTERPOLATIONS:
+            raise ValueError(f'Unknown schedule interpolation "{interp}"')
+        day, value = zip(*sorted(zip(day, value)))
+        return cls(tuple(day), tuple(value), interp)
+
+    def to_dict(self):
+        r"""
+        Convert to a dictionary, with lists of days and values.
+        """
+        return {"day": list(self.day), "value": list(self.value), "interp": self.interp}
+
+    def segments(self, base):
+        r"""
+        Piecewise linear form of the schedule, shared by the lookups.
+
+        Parameters
+        ----------
+        base : `float`
+            Scalar value of the parameter, used before the first step.
+
+        Returns
+        -------
+        values, slopes, left : :class:`list`
+            Value at the left edge, slope and left edge of each segment:
+            segment 0 is before the first day, segment ``i`` starts on
+            ``day[i - 1]``.
+        """
+        day, value = list(self.day), list(self.value)
+        values = [base if self.interp == "step" else value[0]] + value
+        slopes = [0.0] * len(values)
+        if self.interp == "linear":
+            for i in range(1, len(day)):
+                slopes[i] = (value[i] - value[i - 1]) / (day[i] - day[i - 1])
+        return values, slopes, [day[0]] + day
+
+    def lookup(self, base):
+        r"""
+        Compile the schedule of a parameter with scalar value ``base``.
+        """
+        return Lookup(self, base)
+
+
+class Lookup:
+    r"""
+    Compiled :class:`Schedule`, called with the time to get the value of the
+    parameter. Scalar times use a binary search of the breakpoints, arrays of
+    times a vectorized one.
+    """
+
+    __slots__ = ("days", "values", "slopes", "left")
+
+    def __init__(self, schedule, base):
+        self.days = list(schedule.day)
+        self.values, self.slopes, self.left = schedule.segments(base)
+
+    def __call__(self, t):
+        if isinstance(t, (int, float)):
+            i = bisect_right(self.days, t)
+            return self.values[i] + self.slopes[i] * (t - self.left[i])
+
+        import numpy as np
+
+        i = np.searchsorted(self.days, t, side="right")
+        values, slopes = np.take(self.values, i), np.take(self.slopes, i)
+        return values + slopes * (t - np.take(self.left, i))
@@ -0,0 +1,568 @@
+"""
+Numerical solution of a :class:`~seiqhcdro.scenario.Scenario`.
+
+SciPy is only imported when a scenario is actually solved.
+
+The horizon is integrated one policy stage at a time, and the state at the
+start of each stage is kept as a checkpoint. A :class:`SolveCache` uses these
+checkpoints to re-solve an edited scenario from the first stage it changes.
+The interpolants of the solver are kept as well, so that a trajectory can be
+sampled between days without integrating again.
+
+With ``method="auto"``, the solver is chosen for each scenario from the
+spectrum of the Jacobian of the model, see :func:`select_method`, and the
+choice is logged with its timing on the ``seiqhcdro.simulate`` logger.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from itertools import zip_longest
+from typing import NamedTuple
+
+import numpy as np
+
+from .compiler import compile_structure
+from .model import COMPARTMENTS
+from .scenario import STAGE_FIELDS, Scenario
+
+# Daily series available on a trajectory, as shown in the web application
+SERIES = (
+    "infected",
+    "daily_infected",
+    "hospitalised",
+    "daily_hospitalised",
+    "critical",
+    "deaths",
+    "active_icu",
+    "quarantined",
+    "r0",
+)
+
+# Integration tolerances. The absolute tolerance is given in people and scaled
+# by the population, since the state holds population fractions. Integration
+# restarts at every stage, so the SciPy defaults are too loose for the early,
+# single-case phase of the outbreak.
+RTOL = 1e-4
+ATOL_PEOPLE = 1e-2
+
+# Methods of solve_ivp that use the Jacobian
+IMPLICIT = ("Radau", "BDF", "LSODA")
+
+# Relative and absolute tolerances, in people, of the methods picked by
+# select_method. They give the same daily series as Radau at RTOL and
+# ATOL_PEOPLE, within the tolerance of benchmarks/golden.py.
+AUTO_TOLERANCES = {"LSODA": (1e-5, 1e-3), "Radau": (RTOL, ATOL_PEOPLE)}
+
+# Largest decay rate of the model, per day, up to which LSODA is picked. At the
+# tolerances above LSODA was the fastest method on every sample region and up
+# to rates of 1e7 per day, ahead of RK45, BDF and Radau: its stiffness
+# detection covers both regimes. Radau is kept beyond, and when LSODA fails.
+STIFF_LIMIT = 1e8
+
+logger = logging.getLogger(__name__)
+
+# Worst-day values reported by :meth:`Trajectory.summary`
+SUMMARY_FIELDS = ("infected", "quarantined", "hospitalised", "critical", "deaths")
+
+
+def _incidence(cumulative):
+    r"""
+    Daily increase of a cumulative series, with negative changes set to 0.
+    """
+    return np.append([0], np.maximum(np.diff(cumulative), 0))
+
+
+def _recumulate(cumulative, incidence):
+    r"""
+    Rebuild a cumulative series from its incidence, as done for the plots.
+    """
+    out = np.empty_like(cumulative)
+    out[0] = cumulative[0]
+    out[1:] = cumulative[0] + np.cumsum(incidence[:-1])
+    return out
+
+
+class Trajectory(NamedTuple):
+    r"""
+    Solution of a scenario, sampled once per day.
+
+    ``y`` has one row per compartment (see :data:`COMPARTMENTS`), as fractions
+    of the population. The properties give the case counts shown in the web
+    application. ``dense`` holds the solver interpolants of each stage, when
+    they were kept, for :meth:`state` and :meth:`resample`.
+    """
+
+    t: np.ndarray
+    y: np.ndarray
+    scenario: Scenario
+    dense: tuple = None
+
+    def state(self, t):
+        r"""
+        Compartments at any time of the horizon, from the solver interpolants.
+
+        Parameters
+        ----------
+        t : `float` or `numpy.ndarray`
+            Days since the beginning of the outbreak, between 0 and ``ndate``.
+
+        Returns
+        -------
+        y : `numpy.ndarray`
+            Compartments, with one column per time.
+
+        Raises
+        ------
+        ValueError
+            If the trajectory was solved without interpolants.
+        """
+        if self.dense is None:
+            raise ValueError("Trajectory has no dense output")
+        t = np.atleast_1d(np.asarray(t, dtype=float))
+        y = np.empty((len(COMPARTMENTS), len(t)))
+        starts = [a for a, b, sol in self.dense]
+        piece = np.clip(np.searchsorted(starts, t, side="right") - 1, 0, None)
+        for i in np.unique(piece):
+            mask = piece == i
+            y[:, mask] = self.dense[i][2](t[mask])
+        return y
+
+    def resample(self, t):
+        r"""
+        Trajectory sampled at other times, without integrating again.
+
+        Only the series read from the current state (``critical``, ``deaths``,
+        ``active_icu``, ``quarantined`` and ``r0``) are meaningful on a
+        non-daily grid.
+
+        Parameters
+        ----------
+        t : `numpy.ndarray`
+            Increasing days since the beginning of the outbreak.
+
+        Returns
+        -------
+        trajectory : :class:`Trajectory`
+            Same scenario, sampled at ``t``.
+        """
+        t = np.asarray(t, dtype=float)
+        return self._replace(t=t, y=self.state(t))
+
+    def compartment(self, name):
+        r"""
+        Fraction of the population in a compartment, e.g. ``"H"``.
+        """
+        return self.y[COMPARTMENTS.index(name)]
+
+    @property
+    def dates(self):
+        r"""
+        Calendar date of each sample, as `datetime64[D]`, or `datetime64[s]`
+        for sub-daily samples.
+        """
+        start = np.datetime64(self.scenario.date[:10], "D")
+        if np.all(np.mod(self.t, 1) == 0):
+            return start + self.t.astype(int)
+        return start + np.round(self.t * 86400).astype("timedelta64[s]")
+
+    @property
+    def infected(self):
+        r"""
+        Total infected cases.
+        """
+        S, E, I, Q, H, C, D, R, O = self.y
+        ift = np.round((I + H + C + D + R + O) * self.scenario.N)
+        return _recumulate(ift, _incidence(ift))
+
+    @property
+    def daily_infected(self):
+        r"""
+        Daily infected incidence.
+        """
+        S, E, I, Q, H, C, D, R, O = self.y
+        return _incidence(np.round((I + H + C + D + R + O) * self.scenario.N))
+
+    @property
+    def hospitalised(self):
+        r"""
+        Total hospitalised cases.
+        """
+        S, E, I, Q, H, C, D, R, O = self.y
+        hsp = np.round((H + C + D + R) * self.scenario.N)
+        return _recumulate(hsp, _incidence(hsp))
+
+    @property
+    def daily_hospitalised(self):
+        r"""
+        Daily hospital incidence.
+        """
+        S, E, I, Q, H, C, D, R, O = self.y
+        return _incidence(np.round((H + C + D + R) * self.scenario.N))
+
+    @property
+    def critical(self):
+        r"""
+        Total critical cases, including those who died.
+        """
+        S, E, I, Q, H, C, D, R, O = self.y
+        return np.round((C + D) * self.scenario.N)
+
+    @property
+    def deaths(self):
+        r"""
+        Total deaths.
+        """
+        return np.round(self.compartment("D") * self.scenario.N)
+
+    @property
+    def active_icu(self):
+        r"""
+        Active critical cases.
+        """
+        return self.critical - self.deaths
+
+    @property
+    def quarantined(self):
+        r"""
+        Total quarantined individuals.
+        """
+        S, E, I, Q, H, C, D, R, O = self.y
+        return np.round((E + I + Q + H + C + D) * self.scenario.N)
+
+    @property
+    def r0(self):
+        r"""
+        Effective reproduction number on each day.
+        """
+        return np.array([self.scenario.R0(t) for t in self.t])
+
+    def series(self, names=SERIES):
+        r"""
+        Daily series by name, see :data:`SERIES`.
+
+        Returns
+        -------
+        series : `dict`
+            Mapping of each name to its array.
+        """
+        return {name: getattr(self, name) for name in names}
+
+    def summary(self):
+        r"""
+        Worst-day values of the outbreak, as reported in the summary export.
+
+        Returns
+        -------
+        summary : `dict`
+            Peak infected, quarantined, hospitalised, critical and deceased
+            counts.
+        """
+        return {
+            "infected": np.max(self.infected),
+            "quarantined": np.max(self.quarantined),
+            "hospitalised": np.max(self.hospitalised),
+            "critical": np.max(self.critical),
+            "deaths": np.max(self.deaths),
+        }
+
+
+def _stage_days(scenario):
+    r"""
+    Stage start days within the horizon, sorted. Stages out of order have
+    none, and are integrated in a single piece.
+    """
+    s = scenario
+    if not s.delta_r0 or not s.pcont or not s.day or list(s.day) != sorted(s.day):
+        return ()
+    return tuple(sorted({d for d in s.day if 0 < d < s.ndate}))
+
+
+def stage_boundaries(scenario):
+    r"""
+    Days at which the integration is restarted: the stage start days and the
+    days of the parameter schedules, within the horizon.
+
+    Scenarios without stages, or with stages out of order, are integrated in a
+    single piece between schedule days.
+
+    Returns
+    -------
+    boundaries : `tuple`
+        Sorted days strictly between 0 and ``scenario.ndate``.
+    """
+    days = set(_stage_days(scenario))
+    for _, schedule in scenario.schedules:
+        days.update(d for d in schedule.day if 0 < d < scenario.ndate)
+    return tuple(sorted(days))
+
+
+def first_changed_day(old, new):
+    r"""
+    Earliest day from which two scenarios may have different solutions.
+
+    Only the stage inputs and the horizon are compared; every other input,
+    schedules included, is assumed equal.
+
+    Returns
+    -------
+    day : `float`
+        ``R0`` of both scenarios is identical before this day. ``inf`` if both
+        scenarios give the same solution.
+    """
+    changed = np.inf if old.ndate == new.ndate else min(old.ndate, new.ndate)
+    if not _stage_days(old) or not _stage_days(new):
+        same = all(getattr(old, i) == getattr(new, i) for i in STAGE_FIELDS)
+        return changed if same else 0
+    old_stages = zip(old.day, old.delta_r0, old.pcont)
+    new_stages = zip(new.day, new.delta_r0, new.pcont)
+    for a, b in zip_longest(old_stages, new_stages):
+        if a != b:
+            return min([changed] + [i[0] for i in (a, b) if i is not None])
+    return changed
+
+
+def stiffness(scenario):
+    r"""
+    Largest decay rate of the model linearised around the initial state, per
+    day, over the horizon of a scenario.
+
+    The eigenvalues of the Jacobian are probed at the start of the horizon,
+    at every stage boundary and at the end, so that every stage and schedule
+    value is seen. The fastest rates come from the shortest durations of the
+    model, which do not depend on the state, so the initial state is enough.
+    An explicit method needs steps shorter than about ``3 / rate`` to stay
+    stable, however smooth the solution is.
+
+    Returns
+    -------
+    rate : `float`
+        Largest negative real part of the eigenvalues, as a positive rate.
+    """
+    model = compile_structure()
+    y = np.array(scenario.initial_state(), dtype=float)
+    args = scenario.model_args()
+    rate = 0.0
+    for t in (0,) + stage_boundaries(scenario) + (scenario.ndate,):
+        jac = np.asarray(model.jac(t, y, *args))
+        if not np.all(np.isfinite(jac)):
+            return np.inf
+        eigenvalues = np.linalg.eigvals(jac)
+        rate = max(rate, -eigenvalues.real.min())
+    return float(rate)
+
+
+def select_method(scenario):
+    r"""
+    Integration method and tolerances of ``method="auto"`` for a scenario.
+
+    Returns
+    -------
+    method : `str`
+        Method passed to :func:`scipy.integrate.solve_ivp`.
+    rtol, atol : `float`
+        Relative tolerance, and absolute tolerance in people, giving the
+        daily series of the default Radau solve, see :data:`AUTO_TOLERANCES`.
+    """
+    method = "LSODA" if stiffness(scenario) <= STIFF_LIMIT else "Radau"
+    return (method,) + AUTO_TOLERANCES[method]
+
+
+def _integrate(scenario, method="Radau", start=0, state=None, y=None):
+    r"""
+    Integrate a scenario stage by stage, from day ``start`` onward.
+
+    Parameters
+    ----------
+    scenario : :class:`Scenario`
+        Scenario to solve.
+    method : `str`
+        Integration method passed to :func:`scipy.integrate.solve_ivp`, or
+        ``"auto"`` to use :func:`select_method`.
+    start : `float`
+        Day to resume from, either 0 or one of :func:`stage_boundaries`.
+    state : :class:`list`
+        State at ``start``. Defaults to the initial state.
+    y : `numpy.ndarray`
+        Earlier solution, whose samples before ``start`` are kept.
+
+    Returns
+    -------
+    y : `numpy.ndarray`
+        Daily solution from day 0 to ``scenario.ndate``.
+    checkpoints : `dict`
+        State at each stage boundary after ``start``.
+    dense : :class:`list`
+        ``(a, b, interpolant)`` of each stage segment after ``start``.
+    """
+    from scipy.integrate import solve_ivp
+
+    model = compile_structure()
+    auto = method == "auto"
+    rtol, atol = RTOL, ATOL_PEOPLE
+    if auto:
+        started = time.perf_counter()
+        method, rtol, atol = select_method(scenario)
+        probed = time.perf_counter()
+    ndate = scenario.ndate
+    t = np.arange(ndate + 1)
+    out = np.empty((len(COMPARTMENTS), ndate + 1))
+    n = int(np.searchsorted(t, start))
+    if n:
+        out[:, :n] = y[:, :n]
+    if state is None:
+        state = scenario.initial_state()
+
+    checkpoints = {}
+    dense = []
+    edges = [start] + [b for b in stage_boundaries(scenario) if b > start] + [ndate]
+    for a, b in zip(edges[:-1], edges[1:]):
+        t_eval = t[(t >= a) & (t < b)]
+        sol = solve_ivp(
+            model.rhs,
+            [a, b],
+            state,
+            args=scenario.model_args(),
+            t_eval=np.append(t_eval, b),
+            method=method,
+            rtol=rtol,
+            atol=atol / scenario.N,
+            dense_output=True,
+            jac=model.jac if method in IMPLICIT else None,
+        )
+        if auto and not sol.success and method != "Radau":
+            logger.warning("%s failed on days %s-%s: %s", method, a, b, sol.message)
+            method, rtol, atol = ("Radau",) + AUTO_TOLERANCES["Radau"]
+            sol = solve_ivp(
+                model.rhs,
+                [a, b],
+                state,
+                args=scenario.model_args(),
+                t_eval=np.append(t_eval, b),
+                method=method,
+                rtol=rtol,
+                atol=atol / scenario.N,
+                dense_output=True,
+                jac=model.jac,
+            )
+        out[:, n : n + len(t_eval)] = sol.y[:, :-1]
+        n += len(t_eval)
+        state = sol.y[:, -1]
+        checkpoints[b] = state
+        dense.append((a, b, sol.sol))
+    out[:, ndate] = state
+    if auto:
+        logger.info(
+            "Solved days %s-%s with %s: probe %.2f ms, solve %.1f ms",
+            start,
+            ndate,
+            method,
+            (probed - started) * 1000,
+            (time.perf_counter() - probed) * 1000,
+        )
+    return out, checkpoints, dense
+
+
+class SolveCache:
+    r"""
+    Recent solutions with their stage checkpoints, for incremental re-solves.
+
+    Solutions are grouped by every input except the stage inputs and the
+    horizon. When a scenario of a known group is solved again, integration
+    resumes from the last checkpoint before the first changed day, so a change
+    to a late stage only costs the remaining horizon.
+
+    Parameters
+    ----------
+    maxsize : `int`
+        Number of groups kept, least recently used first out.
+    """
+
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(scenario, method):
+        r"""
+        Inputs that must match for a cached solution to be reused.
+        """
+        ignored = dict.fromkeys(STAGE_FIELDS, ())
+        ignored.update(n_r0=0, ndate=0, date="", hcap=0, hqar=0)
+        return scenario._replace(**ignored), method
+
+    def solve(self, scenario, method="Radau"):
+        r"""
+        Solve a scenario, reusing the cached solution of its group.
+
+        Returns
+        -------
+        trajectory : :class:`Trajectory`
+            Same result as :func:`simulate`.
+        """
+        key = self._key(scenario, method)
+        with self._lock:
+            entry = self._entries.get(key)
+
+        if entry is None:
+            y, checkpoints, dense = _integrate(scenario, method)
+        else:
+            old, old_y, old_checkpoints, old_dense = entry
+            changed = first_changed_day(old, scenario)
+            if changed == np.inf:
+                y, checkpoints, dense = old_y, old_checkpoints, old_dense
+            else:
+                start = max([b for b in old_checkpoints if b < changed], default=0)
+                state = old_checkpoints.get(start)
+                y, checkpoints, dense = _integrate(
+                    scenario, method, start, state, old_y
+                )
+                checkpoints.update(
+                    {b: v for b, v in old_checkpoints.items() if b <= start}
+                )
+                dense = [p for p in old_dense if p[1] <= start] + dense
+
+        with self._lock:
+            self._entries[key] = (scenario, y, checkpoints, dense)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return Trajectory(np.arange(scenario.ndate + 1), y, scenario, tuple(dense))
+
+    def clear(self):
+        r"""
+        Drop every cached solution.
+        """
+        with self._lock:
+            self._entries.clear()
+
+
+def simulate(scenario, method="Radau", cache=None):
+    r"""
+    Solve the SEIQHCDRO model for a scenario.
+
+    Parameters
+    ----------
+    scenario : :class:`Scenario` or `dict`
+        Scenario to solve. Dictionaries are parsed with
+        :meth:`Scenario.from_dict`.
+    method : `str`
+        Integration method passed to :func:`scipy.integrate.solve_ivp`, or
+        ``"auto"`` to pick one from the stiffness of the scenario, see
+        :func:`select_method`.
+    cache : :class:`SolveCache`
+        Cache of earlier solutions to resume from, if any.
+
+    Returns
+    -------
+    trajectory : :class:`Trajectory`
+        Daily solution from day 0 to ``scenario.ndate``.
+    """
+    if not isinstance(scenario, Scenario):
+        scenario = Scenario.from_dict(scenario)
+    if cache is not None:
+        return cache.solve(scenario, method)
+    y, _, dense = _integrate(scenario, method)
+    return Trajectory(np.arange(scenario.ndate + 1), y, scenario, tuple(dense))
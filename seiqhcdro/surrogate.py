@@ -0,0 +1,479 @@
+"""
+Emulator of the model outputs, for instant previews.
+
+A Gaussian process per output is trained on scenarios solved in batches, and
+maps the scenario inputs to the worst-day counts of the summary and to the
+day of the infection peak, with an uncertainty estimate. Policy stages enter
+through the effective reproduction number sampled every 10 days. Scenarios
+with parameter schedules, or with a horizon outside the training horizons and
+:data:`HORIZON`, are not emulated, see :meth:`Surrogate.covers`, and are
+solved instead.
+
+A trained emulator is stored on disk under a fingerprint of the model source
+code and of the scikit-learn version. When the model changes, the stored
+emulator no longer matches and is trained again. Emulators are pickled, so
+they are only loaded from a directory and files of the current user that no
+one else can write to.
+"""
+
+import glob
+import hashlib
+import os
+import pickle
+import tempfile
+import warnings
+from functools import lru_cache
+from typing import NamedTuple
+
+import numpy as np
+
+from .scenario import Scenario
+from .simulate import SUMMARY_FIELDS
+
+# Where trained emulators are kept, shared by every server worker of the user
+SURROGATE_DIR = os.environ.get(
+    "SEIQHCDRO_SURROGATE_DIR",
+    os.path.join(
+        os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+        "seiqhcdro",
+        "surrogate",
+    ),
+)
+
+# Modules whose source defines the emulated outputs
+SOURCES = (
+    "model.py",
+    "compiler.py",
+    "scenario.py",
+    "schedule.py",
+    "simulate.py",
+    "batch.py",
+    "surrogate.py",
+)
+
+# Scalar inputs used as features
+PARAM_FIELDS = (
+    "N",
+    "r0",
+    "ndate",
+    "tinc",
+    "tinf",
+    "ticu",
+    "thsp",
+    "tcrt",
+    "trec",
+    "tqar",
+    "tqah",
+    "pquar",
+    "pcross",
+    "pqhsp",
+    "pj",
+    "ph",
+    "pc",
+    "pf",
+)
+
+# Days at which R0 is sampled as features
+R0_DAYS = tuple(range(0, 300, 10))
+
+# Longest horizon described by the features
+HORIZON = R0_DAYS[-1] + 10
+
+# Emulated outputs
+TARGETS = SUMMARY_FIELDS + ("peak_day",)
+
+# Width of the reported intervals, in standard deviations
+INTERVAL = 2
+
+# Emulator of this process, with the file and version it was loaded from
+_surrogate = (None, None)
+
+
+class Preview(NamedTuple):
+    r"""
+    Emulated outputs of a scenario, with a low and high estimate of each
+    (about a 95% interval).
+    """
+
+    value: dict
+    low: dict
+    high: dict
+
+
+def solved(trajectories):
+    r"""
+    Outputs of solved trajectories, as :class:`Preview` with no uncertainty.
+    """
+    previews = []
+    for traj in trajectories:
+        value = {k: float(v) for k, v in traj.summary().items()}
+        value["peak_day"] = float(np.argmax(traj.daily_infected))
+        previews.append(Preview(value, dict(value), dict(value)))
+    return previews
+
+
+@lru_cache(maxsize=None)
+def fingerprint():
+    r"""
+    Version of the emulated model, from its source code and the scikit-learn
+    version, as loaded by this process.
+
+    Returns
+    -------
+    fingerprint : `str`
+        Hexadecimal digest.
+    """
+    import sklearn
+
+    h = hashlib.sha256(sklearn.__version__.encode())
+    here = os.path.dirname(os.path.abspath(__file__))
+    for name in SOURCES:
+        with open(os.path.join(here, name), "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def _check_owner(filename):
+    r"""
+    Check that a file or directory belongs to the current user, and that no
+    one else can write to it.
+
+    Raises
+    ------
+    PermissionError
+        If it belongs to another user, or is writable by others.
+    """
+    if not hasattr(os, "getuid"):
+        return
+    st = os.stat(filename)
+    if st.st_uid != os.getuid() or st.st_mode & 0o022:
+        raise PermissionError(
+            f'"{filename}" must belong to the current user and not be writable '
+            "by others, refusing to load an emulator from it"
+        )
+
+
+def _stored(path):
+    r"""
+    File of the emulator of the current model version.
+    """
+    return os.path.join(path, f"surrogate-{fingerprint()}.pkl")
+
+
+def features(scenarios):
+    r"""
+    Feature matrix of a list of scenarios.
+
+    Returns
+    -------
+    X : `numpy.ndarray`
+        One row per scenario: scalar inputs, with the population in log
+        scale, then R0 on :data:`R0_DAYS`.
+    """
+    X = np.array(
+        [
+            [getattr(s, f) for f in PARAM_FIELDS] + [s.R0(t) for t in R0_DAYS]
+            for s in scenarios
+        ],
+        dtype=float,
+    )
+    X[:, 0] = np.log(X[:, 0])
+    return X
+
+
+def targets(trajectories):
+    r"""
+    Emulated outputs of solved trajectories, see :data:`TARGETS`.
+
+    Returns
+    -------
+    Y : `numpy.ndarray`
+        One row per trajectory. Counts are in ``log1p`` scale.
+    """
+    rows = []
+    for traj in trajectories:
+        summary = traj.summary()
+        rows.append(
+            [np.log1p(summary[k]) for k in SUMMARY_FIELDS]
+            + [float(np.argmax(traj.daily_infected))]
+        )
+    return np.array(rows)
+
+
+def draw_scenarios(bases, n, seed=None):
+    r"""
+    Draw training scenarios around some base scenarios.
+
+    Rates, durations and R0 vary by about 15%, proportions by about 20%, and
+    the stages as in :func:`seiqhcdro.optimize.optimize`.
+
+    Parameters
+    ----------
+    bases : :class:`list`
+        List of :class:`Scenario` to draw around, picked uniformly.
+    n : `int`
+        Number of scenarios.
+    seed : `int`
+        Seed of the random draws.
+
+    Returns
+    -------
+    scenarios : :class:`list`
+        Drawn :class:`Scenario`.
+    """
+    from .optimize import _propose
+
+    rng = np.random.RandomState(seed)
+    scenarios = []
+    for _ in range(n):
+        base = bases[rng.randint(len(bases))]
+        if base.day:
+            base = _propose(base, rng, 1, 0.15)[0]
+        values = {"r0": base.r0 * rng.lognormal(0, 0.15)}
+        for f in PARAM_FIELDS[3:]:
+            v = getattr(base, f)
+            if f.startswith("p"):
+                values[f] = float(np.clip(v * rng.lognormal(0, 0.2), 0, 1))
+            else:
+                values[f] = v * rng.lognormal(0, 0.15)
+        scenarios.append(base._replace(**values))
+    return scenarios
+
+
+class Surrogate:
+    r"""
+    Trained emulator of the model outputs.
+
+    Attributes
+    ----------
+    fingerprint : `str`
+        Model version it was trained on, see :func:`fingerprint`.
+    score : `dict`
+        Coefficient of determination of each output on held-out scenarios.
+    n_train : `int`
+        Number of training scenarios.
+    ndate : `tuple`
+        Shortest and longest horizon of the training scenarios.
+    """
+
+    def __init__(self, models, mean, scale, fingerprint, score, n_train, ndate):
+        self.models = models
+        self.mean = mean
+        self.scale = scale
+        self.fingerprint = fingerprint
+        self.score = score
+        self.n_train = n_train
+        self.ndate = ndate
+
+    @classmethod
+    def train(cls, scenarios, holdout=0.2, progress=None):
+        r"""
+        Solve scenarios and fit the emulator to them.
+
+        Parameters
+        ----------
+        scenarios : :class:`list`
+            Training scenarios, see :func:`draw_scenarios`.
+        holdout : `float`
+            Fraction of the scenarios kept aside to score the emulator.
+        progress : `callable`
+            Called with the completed fraction while solving.
+
+        Returns
+        -------
+        surrogate : :class:`Surrogate`
+            Fitted emulator.
+        """
+        from sklearn.exceptions import ConvergenceWarning
+        from sklearn.gaussian_process import GaussianProcessRegressor
+        from sklearn.gaussian_process.kernels import RBF, ConstantKernel, WhiteKernel
+        from sklearn.metrics import r2_score
+
+        from .batch import CHUNK_SIZE, simulate_batch
+
+        scenarios = [
+            s if isinstance(s, Scenario) else Scenario.from_dict(s) for s in scenarios
+        ]
+        trajectories = []
+        for k in range(0, len(scenarios), CHUNK_SIZE):
+            chunk = scenarios[k : k + CHUNK_SIZE]
+            trajectories += simulate_batch(chunk, parallel=False)
+            if progress is not None:
+                progress(0.9 * (k + len(chunk)) / len(scenarios))
+
+        X, Y = features(scenarios), targets(trajectories)
+        mean, scale = X.mean(axis=0), X.std(axis=0)
+        scale[scale == 0] = 1
+        X = (X - mean) / scale
+        n_fit = len(X) - int(len(X) * holdout)
+
+        models, score = [], {}
+        for j, name in enumerate(TARGETS):
+            kernel = ConstantKernel() * RBF(np.ones(X.shape[1])) + WhiteKernel()
+            gp = GaussianProcessRegressor(kernel, normalize_y=True)
+            with warnings.catch_warnings():
+                # Irrelevant features reach the largest length scale
+                warnings.simplefilter("ignore", ConvergenceWarning)
+                gp.fit(X[:n_fit], Y[:n_fit, j])
+            if n_fit < len(X):
+                score[name] = float(r2_score(Y[n_fit:, j], gp.predict(X[n_fit:])))
+            models.append(gp)
+        if progress is not None:
+            progress(1)
+        ndate = (min(s.ndate for s in scenarios), max(s.ndate for s in scenarios))
+        return cls(models, mean, scale, fingerprint(), score, n_fit, ndate)
+
+    def covers(self, scenario):
+        r"""
+        Whether the emulator describes a scenario: it has no parameter
+        schedules, which the features ignore, and its horizon is within those
+        of the training scenarios and :data:`HORIZON`.
+        """
+        low, high = self.ndate
+        return not scenario.schedules and low <= scenario.ndate <= min(high, HORIZON)
+
+    def predict(self, scenarios):
+        r"""
+        Emulate the outputs of scenarios, without solving them.
+
+        Parameters
+        ----------
+        scenarios : :class:`list`
+            List of :class:`Scenario` or dictionaries in the JSON schema.
+
+        Returns
+        -------
+        previews : :class:`list`
+            One :class:`Preview` per scenario, or `None` for the scenarios the
+            emulator does not cover, see :meth:`covers`.
+        """
+        scenarios = [
+            s if isinstance(s, Scenario) else Scenario.from_dict(s) for s in scenarios
+        ]
+        covered = [i for i, s in enumerate(scenarios) if self.covers(s)]
+        previews = [None] * len(scenarios)
+        if not covered:
+            return previews
+        X = (features([scenarios[i] for i in covered]) - self.mean) / self.scale
+        value, low, high = {}, {}, {}
+        for name, gp in zip(TARGETS, self.models):
+            mu, sd = gp.predict(X, return_std=True)
+            lo, hi = mu - INTERVAL * sd, mu + INTERVAL * sd
+            if name in SUMMARY_FIELDS:
+                mu, lo, hi = np.expm1(mu), np.expm1(lo), np.expm1(hi)
+            value[name], low[name], high[name] = (
+                np.maximum(mu, 0),
+                np.maximum(lo, 0),
+                np.maximum(hi, 0),
+            )
+        for j, i in enumerate(covered):
+            previews[i] = Preview(
+                {k: float(v[j]) for k, v in value.items()},
+                {k: float(v[j]) for k, v in low.items()},
+                {k: float(v[j]) for k, v in high.items()},
+            )
+        return previews
+
+    def save(self, path=SURROGATE_DIR):
+        r"""
+        Store the emulator under its fingerprint, replacing older versions.
+
+        Returns
+        -------
+        filename : `str`
+            Stored file.
+        """
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        _check_owner(path)
+        target = os.path.join(path, f"surrogate-{self.fingerprint}.pkl")
+        fd, tmp = tempfile.mkstemp(dir=path, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(self, f)
+        os.replace(tmp, target)
+        for old in glob.glob(os.path.join(path, "surrogate-*.pkl")):
+            if old != target:
+                os.remove(old)
+        return target
+
+    @staticmethod
+    def load(path=SURROGATE_DIR):
+        r"""
+        Load the emulator of the current model version.
+
+        Returns
+        -------
+        surrogate : :class:`Surrogate`
+            Stored emulator, or `None` if there is none for this version.
+
+        Raises
+        ------
+        PermissionError
+            If the directory or the file may have been written by another
+            user.
+        """
+        target = _stored(path)
+        if not os.path.exists(target):
+            return None
+        _check_owner(path)
+        _check_owner(target)
+        with open(target, "rb") as f:
+            return pickle.load(f)
+
+
+def ensure(n=400, seed=0, path=SURROGATE_DIR, force=False, progress=None):
+    r"""
+    Emulator of the current model version, trained and stored if needed.
+
+    Parameters
+    ----------
+    n : `int`
+        Number of training scenarios, drawn around the presets and the default
+        scenario.
+    seed : `int`
+        Seed of the training draws.
+    path : `str`
+        Directory of the stored emulators.
+    force : `bool`
+        Train again even if a stored emulator matches.
+    progress : `callable`
+        Called with the completed fraction while training.
+
+    Returns
+    -------
+    surrogate : :class:`Surrogate`
+        Up-to-date emulator.
+    """
+    surrogate = None if force else Surrogate.load(path)
+    if surrogate is None:
+        from .presets import get_registry
+
+        # Scheduled presets would train on inputs the features do not show
+        presets = [p.scenario for p in get_registry() if not p.scenario.schedules]
+        bases = [Scenario()] + presets
+        scenarios = draw_scenarios(bases, n, seed)
+        surrogate = Surrogate.train(scenarios, progress=progress)
+        surrogate.save(path)
+    return surrogate
+
+
+def get_surrogate(path=SURROGATE_DIR):
+    r"""
+    Emulator of this process, loaded on first use and again whenever the
+    stored file changes, e.g. after a forced training.
+
+    Returns
+    -------
+    surrogate : :class:`Surrogate`
+        Emulator of the current model version, or `None` if none is trained.
+    """
+    global _surrogate
+    target = _stored(path)
+    try:
+        version = (target, os.stat(target).st_mtime_ns)
+    except FileNotFoundError:
+        version = (target, None)
+    loaded, surrogate = _surrogate
+    if version != loaded or surrogate is None:
+        surrogate = Surrogate.load(path)
+        _surrogate = (version, surrogate)
+    return surrogate